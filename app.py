@@ -1,15 +1,4 @@
 import streamlit as st
-import yfinance as yf
-import pandas as pd
-from datetime import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import requests
-import xml.etree.ElementTree as ET
-import plotly.express as px
-import math
-import google.generativeai as genai # อย่าลืม import ข้างบนสุด
-import requests # อย่าลืม import requests ข้างบนสุดนะครับ
 # --- 0. AUTHENTICATION (ระบบล็อกอิน) ---
 def check_password():
     """Returns `True` if the user had the correct password."""
@@ -28,109 +17,182 @@ def check_password():
                 st.error("รหัสผ่านไม่ถูกต้อง")
     return False
 
+# หน้า login ใช้แค่ streamlit: ยังไม่ผ่านก็หยุดก่อน import pandas / plotly / core (cold start เร็วขึ้น)
+if not check_password():
+    st.stop()
+
+import pandas as pd
+import plotly.express as px
+import os
+import time
+import numpy as np
+from core.quotes import get_quotes, FX_THB
+from core.portfolios import FAMILY_PORTFOLIOS
+from core.config import DATA_DIR, data_path
+from core.ledger import LedgerReplica
+from core.sheet_writer import SheetWriter
+from core.gsheets import SheetsPool, authorize_service_account
+from core.rebalance import build_plan, ledger_rows, telegram_message
+from core import snowball
+from core.news import NewsFeeds
+from core.metadata import MetadataStore
+from core.statements import StatementsCache, financial_summary
+from core.analyst import GeminiAnalyst
+from core.ai_jobs import AnalysisQueue
+from core.notify import TelegramDispatcher
+from core.cache import ttl_from_env
+from core.ratelimit import rate_from_env
+from core.prefetch import Prefetch
+from core.history import HistoryStore, portfolio_monthly_returns
+from core.performance import PerformanceEngine, TOTAL
+from core.household import household_snapshot
+from core.valuation import resolve_currencies, fx_pairs_for, thb_multipliers, dividend_per_share, value_holdings
+from core.trace import TRACER, span, checkpoint
+from core import upstream
+
 # --- 1. CONFIGURATION ---
-FAMILY_PORTFOLIOS = {
-    "มินทร์": {
-        "currency": "USD",
-        "assets": {"SCHD": 0.40, "MSFT": 0.30, "AVGO": 0.30}
-    },
-    "ฟิวส์": {
-        "currency": "USD",
-        "assets": {"VOO": 0.50, "QQQ": 0.30, "VNM": 0.20}
-    },
-    "Test": {
-        "currency": "THB",
-        "assets": {"TDEX.BK": 0.60, "PTT.BK": 0.40}
-    }
-}
+# พอร์ตของแต่ละคน: แก้ที่ core/portfolios.py (FAMILY_PORTFOLIOS ใช้ร่วมกับ cli.py)
 
 # --- 2. HELPER FUNCTIONS ---
-def get_news_rss(ticker_symbol):
+@st.cache_resource
+def get_news_feeds():
+    """ตัวโหลดข่าว RSS กลาง (prefetch เบื้องหลัง + แคช 10 นาที) ใช้ร่วมกันทุก session"""
+    return NewsFeeds()
+
+def get_news_rss(ticker_symbol, wait=1.5):
+    """ข่าวจากแคช (None = กำลังโหลด)"""
     try:
-        url = f"https://finance.yahoo.com/rss/headline?s={ticker_symbol}"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=5)
-        root = ET.fromstring(response.content)
-        news_items = []
-        for item in root.findall('./channel/item')[:5]:
-            news_items.append({
-                'title': item.find('title').text,
-                'link': item.find('link').text,
-                'published': item.find('pubDate').text if item.find('pubDate') is not None else ""
-            })
-        return news_items
+        return get_news_feeds().get(ticker_symbol, wait=wait)
     except: return []
 
 def get_exchange_rate_safe():
-    try:
-        ticker = yf.Ticker("THB=X")
-        rate = ticker.fast_info['last_price']
-        return round(rate, 2) if rate and rate > 0 else None
-    except: return None
+    rate = get_quotes([], fx_pairs=(FX_THB,)).get(FX_THB)
+    return round(rate, 2) if rate else None
 
 def get_price_safe(ticker_symbol):
-    try:
-        stock = yf.Ticker(ticker_symbol)
-        price = stock.fast_info['last_price']
-        if price and price > 0: return price
-        hist = stock.history(period="1d")
-        return hist['Close'].iloc[-1] if not hist.empty else 0
-    except: return 0
+    # ดึงไม่ได้จะได้ราคาดีล่าสุดจากแคช, เป็น 0 เฉพาะตัวที่ไม่เคยดึงได้เลย
+    return get_quotes([ticker_symbol], fx_pairs=()).get(ticker_symbol) or 0
+
+def get_prices_safe(tickers, with_fx=False):
+    """ดึงราคาทุกตัวในคำขอเดียวผ่านแคช (ไม่เคยดึงได้เลย = 0) และเรทเงิน THB=X ถ้าขอมา"""
+    quotes = get_quotes(tickers, fx_pairs=(FX_THB,) if with_fx else ())
+    prices = {t: quotes.get(t) or 0 for t in tickers}
+    if with_fx:
+        rate = quotes.get(FX_THB)
+        return prices, (round(rate, 2) if rate else None)
+    return prices
 
 def get_gsheet_client():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds_dict = dict(st.secrets["gcp_service_account"])
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    return gspread.authorize(creds)
+    return authorize_service_account(dict(st.secrets["gcp_service_account"]))
+
+@st.cache_resource
+def get_sheets_pool():
+    """client + worksheet ที่ authorize แล้ว ใช้ร่วมกันทุก session (ไม่ต้องขอ token ใหม่ทุกครั้ง)"""
+    return SheetsPool(get_gsheet_client)
+
+@st.cache_resource
+def get_ledger():
+    """สำเนา AP_Wealth_DB ในเครื่อง (ใช้ร่วมกันทุก session)"""
+    pool = get_sheets_pool()  # จับไว้ตรงนี้ worker thread จะได้ไม่ต้องเรียก st.cache_resource เอง
+    return LedgerReplica(data_path("ledger.sqlite3"),
+                         open_sheet=lambda: pool.worksheet("AP_Wealth_DB"))
+
+@st.cache_resource
+def get_sheet_writer():
+    """คิวบันทึกลงชีตแบบ write-behind (worker เดียวทั้ง process)"""
+    return SheetWriter(get_ledger())
 
 def save_to_gsheet(data_rows):
     try:
-        client = get_gsheet_client()
-        sheet = client.open("AP_Wealth_DB").sheet1
-        for row in data_rows: sheet.append_row(row)
+        # เข้าคิวในเครื่องแล้วกลับทันที worker จะส่งทั้งแผนด้วย append_rows ครั้งเดียว
+        # และใส่ replica ตามไปด้วย (write-through) เมื่อส่งสำเร็จ
+        get_sheet_writer().enqueue(data_rows)
         return True
     except Exception as e:
         st.error(f"บันทึกไม่สำเร็จ: {e}")
         return False
 
+def get_synced_ledger(ledger=None):
+    ledger = ledger or get_ledger()
+    try:
+        ledger.sync()  # ดึงเฉพาะแถวใหม่ (เว้นช่วงทุก 30 วิ)
+    except Exception:
+        pass  # ต่อชีตไม่ได้ก็ยังอ่านจาก replica ได้
+    return ledger
+
 def load_history(user_filter=None):
     try:
-        client = get_gsheet_client()
-        sheet = client.open("AP_Wealth_DB").sheet1
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        # [เพิ่ม] แปลงตัวเลขให้เป็นตัวเลขจริงๆ (กัน Error)
-        if not df.empty:
-            df['Shares'] = pd.to_numeric(df['Shares'], errors='coerce').fillna(0)
-            df['Total_THB'] = pd.to_numeric(df['Total_THB'], errors='coerce').fillna(0)
-            
-            if user_filter:
-                df = df[df['User'] == user_filter]
-        return df
+        return get_synced_ledger().load(user_filter or None)
     except: return pd.DataFrame()
 
+@st.cache_resource
+def get_metadata_store():
+    """ข้อมูลปันผล/พื้นฐานบนดิสก์ + scheduler ไล่ refresh หุ้นทุกตัวของครอบครัวเบื้องหลัง"""
+    store = MetadataStore(data_path("metadata.sqlite3"))
+    ledger = get_ledger()
+    def all_tickers():
+        held = ledger.holdings()['Ticker'].tolist()
+        return list(dict.fromkeys([t for p in FAMILY_PORTFOLIOS.values() for t in p['assets']] + held))
+    store.start_scheduler(all_tickers)
+    return store
+
+@st.cache_resource
+def get_statements_cache():
+    """งบการเงินบนดิสก์ (โหลดใหม่เฉพาะเมื่อมีงวดใหม่)"""
+    return StatementsCache(os.path.join(DATA_DIR, "statements"))
+
+@st.cache_resource
+def get_history_store():
+    """ราคาย้อนหลังรายวันบนดิสก์ (ดึงเพิ่มเฉพาะแท่งใหม่)"""
+    return HistoryStore(os.path.join(DATA_DIR, "history"))
+
+@st.cache_resource
+def get_performance_engine():
+    """TWR/XIRR ของทุก user (คำนวณใหม่เบื้องหลังเฉพาะเมื่อ ledger หรือราคาเปลี่ยน)"""
+    return PerformanceEngine(get_ledger(), get_history_store(), get_metadata_store())
+
+def get_portfolio_monthly_returns(assets, years=20):
+    """ผลตอบแทนรายเดือนในอดีตของพอร์ตตามสัดส่วนเป้า จากคลังราคาย้อนหลัง ดึงไม่ได้คืน None"""
+    try:
+        start = pd.Timestamp.today().normalize() - pd.DateOffset(years=years)
+        return portfolio_monthly_returns(get_history_store().closes(list(assets), start=start), assets)
+    except Exception:
+        return None
+
+EMPTY_HOLDINGS = pd.DataFrame(columns=["Ticker", "Shares", "Total_THB", "Avg_Price_THB"])
+
+def load_holdings(user_name, ledger=None):
+    """ยอดถือรายหุ้นจาก holdings index (Ticker, Shares, Total_THB, Avg_Price_THB) ไม่ต้อง groupby ทั้ง ledger"""
+    try:
+        return get_synced_ledger(ledger).holdings(user_name)
+    except: return EMPTY_HOLDINGS
+
+def start_prefetch(user_name, user_data):
+    """เริ่มดึงข้อมูลภายนอกทุกอย่างของผู้ใช้นี้พร้อมกัน (ledger, ราคา+FX, ข่าว) แล้วคืน Prefetch ให้แท็บรอผล"""
+    # resource ต้องหยิบใน thread หลักของ Streamlit ก่อน ส่งเข้า worker เป็น object ธรรมดา
+    feeds, ledger = get_news_feeds(), get_ledger()
+    pf = Prefetch()
+    pf.submit("holdings", load_holdings, user_name, ledger)
+    try:
+        held = ledger.holdings(user_name)['Ticker'].tolist()  # อ่านจาก replica ในเครื่อง ไม่ยิงเน็ต
+    except Exception:
+        held = []
+    targets = list(user_data['assets'].keys())
+    pf.submit("quotes", get_quotes, list(dict.fromkeys(targets + held)))
+    feeds.prefetch(targets)  # ข่าวทุกตัวในพอร์ต แผงข่าวเลือกตัวไหนก็ได้โดยไม่ต้องรอใหม่
+    get_performance_engine().refresh_async()  # ราคาย้อนหลังของ TWR/XIRR อุ่นไว้ก่อนเปิดแท็บพอร์ต
+    return pf
+
+
+@st.cache_resource
+def get_telegram():
+    """คิวแจ้งเตือน Telegram เบื้องหลัง (รวมข้อความที่มาติดๆ กัน, retry เมื่อโดน 429/เน็ตล่ม)"""
+    return TelegramDispatcher(data_path("notify.sqlite3"), st.secrets["TELEGRAM_TOKEN"], st.secrets["TELEGRAM_CHAT_ID"])
 
 def send_telegram_msg(message):
-    """ส่งข้อความแจ้งเตือนเข้า Telegram (เวอร์ชันโชว์ Error)"""
+    """ฝากข้อความแจ้งเตือนเข้าคิว Telegram (ไม่รอเน็ต ผลการส่งดูได้ที่ sidebar)"""
     try:
-        token = st.secrets["TELEGRAM_TOKEN"]
-        chat_id = st.secrets["TELEGRAM_CHAT_ID"]
-        
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        payload = {
-            "chat_id": chat_id,
-            "text": message,
-            "parse_mode": "Markdown" 
-        }
-        
-        response = requests.post(url, json=payload)
-        
-        # เช็คว่าส่งสำเร็จไหม ถ้าไม่สำเร็จให้ฟ้องหน้าเว็บ
-        if response.status_code != 200:
-            st.error(f"❌ Telegram Error: {response.text}")
-            return False
-            
+        get_telegram().enqueue(message)
         return True
     except Exception as e:
         st.error(f"❌ ระบบส่ง Telegram ขัดข้อง: {e}")
@@ -138,472 +200,382 @@ def send_telegram_msg(message):
 def get_financial_summary(ticker_symbol):
     """ดึงงบการเงิน (สำหรับหุ้น) หรือ ข้อมูลกองทุน (สำหรับ ETF)"""
     try:
-        stock = yf.Ticker(ticker_symbol)
-        
-        # 1. ลองดึงงบการเงินก่อน (สำหรับหุ้นรายตัว)
-        balance = stock.balance_sheet
-        
-        if not balance.empty:
-            # --- กรณีเป็นหุ้น (Stock) ---
-            income = stock.income_stmt
-            cashflow = stock.cashflow
-            return f"""
-            Data Type: Individual Stock
-            Company: {ticker_symbol}
-            
-            --- Balance Sheet ---
-            {balance.iloc[:, :3].to_markdown()}
-            
-            --- Income Statement ---
-            {income.iloc[:, :3].to_markdown()}
-            
-            --- Cash Flow ---
-            {cashflow.iloc[:, :3].to_markdown()}
-            """
-        else:
-            # --- กรณีเป็นกองทุน (ETF) หรือไม่มีงบ ---
-            # ให้ดึงข้อมูลสรุป (Info) แทน
-            info = stock.info
-            
-            # ดึงเฉพาะข้อมูลสำคัญๆ ของ ETF
-            etf_data = {
-                "Name": info.get('longName', ticker_symbol),
-                "Summary": info.get('longBusinessSummary', 'No summary available'),
-                "Category": info.get('category', 'N/A'),
-                "PE Ratio": info.get('trailingPE', 'N/A'),
-                "Yield": info.get('dividendYield', 0) * 100 if info.get('dividendYield') else "N/A",
-                "Total Assets": info.get('totalAssets', 'N/A'),
-                "Top Holdings": "Please check sector allocation below" # yfinance ฟรีมักไม่โชว์ Top Holdings
-            }
-            
-            return f"""
-            Data Type: ETF / Fund
-            Ticker: {ticker_symbol}
-            Fund Name: {etf_data['Name']}
-            Category: {etf_data['Category']}
-            Dividend Yield: {etf_data['Yield']}%
-            
-            --- Fund Summary ---
-            {etf_data['Summary']}
-            """
-
+        return financial_summary(ticker_symbol, get_metadata_store(), get_statements_cache())
     except Exception as e:
         # st.error(f"ดึงข้อมูลไม่ได้: {e}") # ปิด error ไว้จะได้ไม่รก
         return None
 
-def ask_gemini_analyst(financial_data, ticker):
-    """ส่งข้อมูลให้ Gemini วิเคราะห์"""
-    try:
+@st.cache_resource
+def get_analyst():
+    """Gemini model handle ตัวเดียวทั้ง process + แคชคำตอบบนดิสก์ (อายุตั้งได้ด้วย AP_AI_TTL วินาที)"""
+    def make_model(model_name):
+        import google.generativeai as genai  # SDK หนัก: โหลดตอนเรียก AI ครั้งแรกเท่านั้น
         genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
-        
-        # [แก้ตรงนี้] ใช้ชื่อโมเดลที่มีในลิสต์ของคุณ
-        model = genai.GenerativeModel('gemini-2.5-flash') 
-        
-        prompt = f"""
-        คุณคือ AI นักวิเคราะห์การเงินระดับโลก (CFA Level 3)
-        กรุณาวิเคราะห์ข้อมูลงบการเงินของ {ticker} ต่อไปนี้แบบเจาะลึก:
-        {financial_data}
-        
-        สิ่งที่ต้องการ (ตอบภาษาไทย):
-        1. 📊 สรุปภาพรวม (แข็งแกร่ง/น่าห่วง)
-        2. 📈 แนวโน้มกำไรและรายได้
-        3. 🚩 ความเสี่ยงที่ต้องระวัง
-        4. 🎯 คำแนะนำ (DCA ได้ไหม?)
-        """
+        return genai.GenerativeModel(model_name)
+    return GeminiAnalyst(make_model, os.path.join(DATA_DIR, "ai", "responses"),
+                         ttl=ttl_from_env("AP_AI_TTL", 7 * 24 * 3600))
+
+@st.cache_resource
+def get_ai_jobs():
+    """คิววิเคราะห์ทั้งพอร์ตเบื้องหลัง (จำกัดงานพร้อมกันและอัตราเรียก Gemini ต่อนาทีด้วย AP_AI_RPM)"""
+    metadata, statements, analyst = get_metadata_store(), get_statements_cache(), get_analyst()
+    return AnalysisQueue(data_path("ai", "jobs.sqlite3"),
+                         summarize=lambda t: financial_summary(t, metadata, statements),
+                         analyze=analyst.analyze,
+                         rate_per_minute=rate_from_env("AP_AI_RPM", 10),
+                         ttl=analyst.ttl)
+
+def _stream_or_error(chunks):
+    try:
+        yield from chunks
+    except Exception as e:
+        yield f"\n\nเกิดข้อผิดพลาด: {e}"
+
+def ask_gemini_analyst(financial_data, ticker, stream=False):
+    """ส่งข้อมูลให้ Gemini วิเคราะห์ (stream=True คืน generator สำหรับ st.write_stream)"""
+    try:
+        analyst = get_analyst()
+        if stream:
+            return _stream_or_error(analyst.stream(ticker, financial_data))
         
         with st.spinner(f"🤖 AI รุ่น 2.5 Flash กำลังวิเคราะห์ {ticker}..."):
-            response = model.generate_content(prompt)
-            return response.text
+            return analyst.analyze(ticker, financial_data)
     except Exception as e:
         return f"เกิดข้อผิดพลาด: {e}"
+
+def is_admin():
+    """แผง debug แสดงเฉพาะเมื่อเปิดด้วย ?admin=<ADMIN_KEY ใน secrets>"""
+    key = st.secrets.get("ADMIN_KEY")
+    return bool(key) and st.query_params.get("admin") == key
 # --- 3. MAIN LOGIC & UI ---
-if check_password():
-    st.set_page_config(page_title="AP Wealth OS", page_icon="💰", layout="wide")
+st.set_page_config(page_title="AP Wealth OS", page_icon="💰", layout="wide")
+trace_run = TRACER.begin_run("rerun")  # None ถ้าปิด tracing อยู่
+
+# Sidebar: Profile & News
+with st.sidebar:
+    st.header("👤 Profile")
+    user_name = st.selectbox("เลือกผู้ใช้งาน", list(FAMILY_PORTFOLIOS.keys()))
+    user_data = FAMILY_PORTFOLIOS[user_name]
+    currency = user_data['currency']
+    is_usd_port = (currency == "USD")
+    
+    # สถานะคิวบันทึกลงชีต (write-behind)
+    q = get_sheet_writer().status()
+    if q['pending']:
+        st.divider()
+        st.caption(f"📤 คิวบันทึกรอส่งเข้าชีต: {q['pending']} แผน")
+        if q['last_error']:
+            st.warning(f"ส่งไม่สำเร็จ จะลองใหม่ใน {q['next_retry_in']:.0f} วิ: {q['last_error']}")
 
-    # Sidebar: Profile & News
-    with st.sidebar:
-        st.header("👤 Profile")
-        user_name = st.selectbox("เลือกผู้ใช้งาน", list(FAMILY_PORTFOLIOS.keys()))
-        user_data = FAMILY_PORTFOLIOS[user_name]
-        currency = user_data['currency']
-        is_usd_port = (currency == "USD")
-        
+    # สถานะคิวแจ้งเตือน Telegram
+    try:
+        tg = get_telegram().status()
+    except Exception:
+        tg = None  # ยังไม่ได้ตั้ง secrets ของ Telegram
+    if tg and (tg['pending'] or tg['failed']):
         st.divider()
-        st.subheader("📰 ข่าวหุ้นล่าสุด")
-        all_tickers = list(user_data['assets'].keys())
-        selected_news_ticker = st.selectbox("เลือกหุ้นเพื่ออ่านข่าว:", all_tickers, index=0)
-        
-        news_items = get_news_rss(selected_news_ticker)
-        if news_items:
-            for item in news_items:
-                st.markdown(f"➤ **[{item['title']}]({item['link']})**")
-                if item['published']:
-                    short_date = item['published'].replace(" +0000", "").replace(" GMT", "")
-                    st.caption(f"🕒 {short_date}")
-                st.markdown("---")
-            if st.button("🔄 รีเฟรชข่าว"): st.rerun()
-        else: st.info("ไม่พบข่าวใหม่")
-
-    tab_calc, tab_hist, tab_port, tab_ai = st.tabs(["🚀 แผนลงทุน", "📜 ประวัติย้อนหลัง", "📊 สรุปภาพรวม", "🤖 AI Analyst"])
+        if tg['pending']:
+            st.caption(f"✈️ แจ้งเตือน Telegram รอส่ง: {tg['pending']} ข้อความ")
+        if tg['last_error']:
+            st.warning(f"❌ Telegram Error: {tg['last_error']}")
+        if tg['failed'] and st.button("ส่งแจ้งเตือนที่ล้มเหลวใหม่"):
+            get_telegram().retry_failed()
+
+    # Yahoo จำกัดการเรียกอยู่: ราคา/ข่าวที่เห็นเป็นค่าล่าสุดจากแคช
+    for up in upstream.stats():
+        if up['backoff_s'] > 0:
+            st.caption(f"⏳ {up['name']} จำกัดการเรียกชั่วคราว พักอีก {up['backoff_s']:.0f} วิ (แสดงข้อมูลล่าสุดที่มี)")
+
+    # เริ่มดึงข้อมูลภายนอกทั้งหมดพร้อมกันตรงนี้ แต่ละแผงค่อยรอผลของตัวเอง
+    prefetch = start_prefetch(user_name, user_data)
+
+# แต่ละแผงด้านล่างเป็น st.fragment: widget ในแผงไหนเปลี่ยน rerun แค่แผงนั้น
+# (ค่าอย่าง user_name / prefetch มาจาก full rerun ล่าสุด ซึ่งเกิดเมื่อเปลี่ยนผู้ใช้ใน sidebar)
+@st.fragment
+@TRACER.run("fragment:news_panel")
+def news_panel():
+    st.divider()
+    st.subheader("📰 ข่าวหุ้นล่าสุด")
+    all_tickers = list(user_data['assets'].keys())
+    selected_news_ticker = st.selectbox("เลือกหุ้นเพื่ออ่านข่าว:", all_tickers, index=0, key=f"news_ticker_{user_name}")
+    
+    news_items = get_news_rss(selected_news_ticker, wait=prefetch.timeouts["news"])
+    if news_items is None:
+        st.caption("⏳ กำลังโหลดข่าว...")
+    elif news_items:
+        for item in news_items:
+            st.markdown(f"➤ **[{item['title']}]({item['link']})**")
+            if item['published']:
+                short_date = item['published'].replace(" +0000", "").replace(" GMT", "")
+                st.caption(f"🕒 {short_date}")
+            st.markdown("---")
+        if st.button("🔄 รีเฟรชข่าว"):
+            get_news_feeds().refresh(selected_news_ticker)
+            st.rerun(scope="fragment")
+    else: st.info("ไม่พบข่าวใหม่")
+
+with st.sidebar:
+    news_panel()
+
+checkpoint("ui.sidebar")
+tab_calc, tab_hist, tab_port, tab_home, tab_ai = st.tabs(["🚀 แผนลงทุน", "📜 ประวัติย้อนหลัง", "📊 สรุปภาพรวม", "🏠 ทั้งครอบครัว", "🤖 AI Analyst"])
 # --- TAB 1: CALCULATOR (SMART REBALANCING) ---
-    with tab_calc:
-        col1, col2 = st.columns(2)
-        with col1:
-            budget_thb = st.number_input("💵 เงินลงทุนเดือนนี้ (บาท)", value=10000, step=1000)
-        with col2:
-            if is_usd_port:
-                auto_rate = get_exchange_rate_safe()
-                exchange_rate = st.number_input("💱 เรทเงิน (บาท/$)", value=auto_rate if auto_rate else 34.50, step=0.01)
-                budget_in_currency = budget_thb / exchange_rate
-                st.info(f"คิดเป็นเงิน: **${budget_in_currency:,.2f}**")
-            else:
-                exchange_rate, budget_in_currency = 1.0, budget_thb
-                st.info(f"คิดเป็นเงิน: **{budget_in_currency:,.0f} บาท**")
-
-        if st.button("🚀 คำนวณแผนการซื้อ (Smart Rebalancing)", type="primary", use_container_width=True):
-            tickers = list(user_data['assets'].keys())
-            prices = {}
-            
-            # 1. ดึงราคาตลาดล่าสุด
-            my_bar = st.progress(0, text="⏳ กำลังเช็คราคาตลาด...")
-            for i, ticker in enumerate(tickers):
-                my_bar.progress((i + 1) / len(tickers), text=f"เช็คราคา: {ticker}")
-                prices[ticker] = get_price_safe(ticker)
-            my_bar.empty()
-
-            # 2. โหลดของเดิมที่มีอยู่ (Current Portfolio)
-            existing_shares = {t: 0.0 for t in tickers}
-            hist_df = load_history(user_name)
-            if not hist_df.empty:
-                # รวมจำนวนหุ้นที่เคยซื้อมาทั้งหมด
-                group = hist_df.groupby('Ticker')['Shares'].sum()
-                for t, s in group.items():
-                    if t in existing_shares:
-                        existing_shares[t] = s
-
-            # 3. คำนวณมูลค่าพอร์ตปัจจุบัน (Current Market Value)
-            current_port_value = 0
-            for t in tickers:
-                current_port_value += existing_shares[t] * prices.get(t, 0)
-            
-            # 4. เป้าหมายความมั่งคั่งรวม (ของเดิม + เงินใหม่)
-            total_wealth_target = current_port_value + budget_in_currency
-            
-            plan_data = []
-            total_spent_currency = 0
-            line_summary = f"📢 *แผนลงทุน {user_name} (Smart Rebalance)*\n🗓 {datetime.now().strftime('%d/%m/%Y')}\n💰 งบ: {budget_thb:,.0f} บาท\n"
+@st.fragment
+@TRACER.run("fragment:rebalance_planner")
+def rebalance_planner():
+    col1, col2 = st.columns(2)
+    with col1:
+        budget_thb = st.number_input("💵 เงินลงทุนเดือนนี้ (บาท)", value=10000, step=1000)
+    with col2:
+        if is_usd_port:
+            auto_rate = prefetch.result("quotes", {}).get(FX_THB)
+            auto_rate = round(auto_rate, 2) if auto_rate else None
+            exchange_rate = st.number_input("💱 เรทเงิน (บาท/$)", value=auto_rate if auto_rate else 34.50, step=0.01)
+            budget_in_currency = budget_thb / exchange_rate
+            st.info(f"คิดเป็นเงิน: **${budget_in_currency:,.2f}**")
+        else:
+            exchange_rate, budget_in_currency = 1.0, budget_thb
+            st.info(f"คิดเป็นเงิน: **{budget_in_currency:,.0f} บาท**")
 
-            # 5. วนลูปเช็คทีละตัว (Core Logic: Underweight vs Overweight)
-            for ticker, target_pct in user_data['assets'].items():
-                price = prices.get(ticker, 0)
-                
-                if price > 0:
-                    # มูลค่าที่ "ควรจะมี" ตามเป้าหมาย
-                    target_value = total_wealth_target * target_pct
-                    
-                    # มูลค่าที่ "มีอยู่จริง"
-                    current_value = existing_shares[ticker] * price
-                    
-                    # ส่วนต่างที่ต้องเติม (Deficit)
-                    shortfall = target_value - current_value
-                    
-                    shares_to_buy = 0
-                    status = "✅ พอดี"
-                    
-                    if shortfall > 0:
-                        # Case: Underweight (ขาด) -> ต้องซื้อเพิ่ม
-                        # แต่ห้ามซื้อเกินงบที่มี (budget_in_currency)
-                        amount_to_buy = min(shortfall, budget_in_currency - total_spent_currency)
-                        
-                        # ถ้าเหลือเศษงบน้อยมากให้ข้าม
-                        if amount_to_buy > (price * 0.1): 
-                            if is_usd_port:
-                                shares_to_buy = round(amount_to_buy / price, 4)
-                            else:
-                                shares_to_buy = int(amount_to_buy / price)
-                            
-                            status = "🟢 ซื้อเพิ่ม"
-                    else:
-                        # Case: Overweight (เกิน) -> ไม่ซื้อ
-                        status = "🔴 พักก่อน (Overweight)"
-                        shares_to_buy = 0
-
-                    cost_curr = shares_to_buy * price
-                    cost_thb = cost_curr * exchange_rate
-                    
-                    # บันทึกผล
-                    if shares_to_buy > 0:
-                        plan_data.append({
-                            "หุ้น": ticker, 
-                            "สถานะ": status,
-                            "ราคา": price, 
-                            "จำนวน": shares_to_buy, 
-                            f"รวม ({currency})": cost_curr, 
-                            "รวม (บาท)": cost_thb
-                        })
-                        # --- [แก้ไขจุดที่ 1] เพิ่มยอดเงินบาทใน line_summary สำหรับโชว์บนเว็บ ---
-                        line_summary += f"\n- {ticker}: {shares_to_buy} หุ้น ({status}) | 💸 {cost_thb:,.2f} บาท"
-                        total_spent_currency += cost_curr
-
-            # สรุปยอดเงินบาท
-            total_spent_thb = total_spent_currency * exchange_rate
-            remaining_thb = budget_thb - total_spent_thb
-
-            st.session_state['plan_result'] = {
-                'df': pd.DataFrame(plan_data), 'plan_data': plan_data,
-                'total_spent': total_spent_thb, 'remaining': remaining_thb,
-                'line_summary': line_summary + f"\n\n💡 เงินเหลือ: {remaining_thb:,.2f} บาท",
-                'user_name': user_name
-            }
-
-        # ส่วนแสดงผล (แก้ไขใหม่ แก้ Error format code 'f')
-        if 'plan_result' in st.session_state:
-            res = st.session_state['plan_result']
-            st.divider()
-            st.success("✅ คำนวณเสร็จเรียบร้อย!")
-            
-            m1, m2, m3 = st.columns(3)
-            m1.metric("💰 ยอดซื้อรวม", f"{res['total_spent']:,.0f} บาท")
-            m2.metric("🐷 เงินทอน", f"{res['remaining']:,.2f} บาท", delta_color="off")
-            m3.metric("🎯 รายการ", f"{len(res['df'])} ตัว")
-
-            col_chart, col_table = st.columns([1, 1])
-            with col_chart:
-                if not res['df'].empty:
+    if st.button("🚀 คำนวณแผนการซื้อ (Smart Rebalancing)", type="primary", use_container_width=True):
+        tickers = list(user_data['assets'].keys())
+        
+        # 1. ดึงราคาตลาดล่าสุด (ทุกตัวในคำขอเดียว)
+        with st.spinner("⏳ กำลังเช็คราคาตลาด..."):
+            prices = get_prices_safe(tickers)
+
+        # 2. โหลดของเดิมที่มีอยู่ (Current Portfolio) จาก holdings index
+        # อ่านจาก replica ตรงๆ: แผงนี้ rerun เองได้หลังกดบันทึก ผลของ prefetch (ตอน full rerun) อาจยังไม่มีแผนที่เพิ่งบันทึก
+        holdings = load_holdings(user_name)
+        existing_shares = dict(holdings[['Ticker', 'Shares']].itertuples(index=False))
+
+        # 3-5. คำนวณแผนซื้อทั้งพอร์ตพร้อมกัน (Core Logic: Underweight vs Overweight) ตัวเดียวกับ cli.py
+        plan = build_plan(user_name, user_data, budget_thb, prices, exchange_rate, existing_shares)
+        st.session_state['plan_result'] = {**plan, 'df': pd.DataFrame(plan['plan_data'])}
+
+    # ส่วนแสดงผล (แก้ไขใหม่ แก้ Error format code 'f')
+    if 'plan_result' in st.session_state:
+        res = st.session_state['plan_result']
+        st.divider()
+        st.success("✅ คำนวณเสร็จเรียบร้อย!")
+        
+        m1, m2, m3 = st.columns(3)
+        m1.metric("💰 ยอดซื้อรวม", f"{res['total_spent']:,.0f} บาท")
+        m2.metric("🐷 เงินทอน", f"{res['remaining']:,.2f} บาท", delta_color="off")
+        m3.metric("🎯 รายการ", f"{len(res['df'])} ตัว")
+
+        col_chart, col_table = st.columns([1, 1])
+        with col_chart:
+            if not res['df'].empty:
+                with span("plot.plan_pie"):
                     fig = px.pie(res['df'], values='รวม (บาท)', names='หุ้น', hole=0.4, title="สัดส่วนการกระจายเงิน")
                     st.plotly_chart(fig, use_container_width=True)
-            
-            with col_table:
-                 if not res['df'].empty:
-                    # [แก้ตรงนี้] กำหนด Format เฉพาะคอลัมน์ที่เป็นตัวเลขเท่านั้น
-                    format_dict = {
-                        "ราคา": "{:,.2f}",
-                        "จำนวน": "{:,.4f}",
-                        "รวม (บาท)": "{:,.2f}",
-                        # คอลัมน์สกุลเงินต่างประเทศ (Dynamic key)
-                        f"รวม ({currency})": "{:,.2f}"
-                    }
-                    
-                    # ใช้ format_dict แทนการ format ทั้งตาราง
-                    st.dataframe(
-                        res['df'].set_index("หุ้น").style.format(format_dict, na_rep="-"), 
-                        use_container_width=True
-                    )
-                 else:
-                    st.warning("พอร์ตสมดุลแล้ว ไม่ต้องซื้อเพิ่ม หรือ งบไม่พอซื้อหุ้นที่ขาด")
-
-            c_save, c_copy = st.columns([1, 2])
-            with c_save:
-                if st.button("💾 บันทึก (Save)", use_container_width=True):
-                    # แปลงข้อมูลก่อนบันทึกให้ชัวร์
-                    save_rows = []
-                    for i in res['plan_data']:
-                        save_rows.append([
-                            datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-                            res['user_name'], 
-                            i['หุ้น'], 
-                            float(i['จำนวน']), 
-                            float(i['ราคา']), 
-                            float(i['รวม (บาท)']), 
-                            f"V3-Rebalance ({i.get('สถานะ', '')})" # บันทึกสถานะไปด้วย
-                        ])
-                        
-                    if save_to_gsheet(save_rows):
-                        st.success("บันทึกแล้ว!"); st.balloons()
-                        
-                        # ==========================================
-                        # --- [ส่วนที่เพิ่มใหม่] แจ้งเตือนเข้า Telegram ---
-                        # ==========================================
-                        msg_telegram = f"📢 *อัปเดตพอร์ต {res['user_name']}*\n"
-                        msg_telegram += f"📅 {datetime.now().strftime('%d/%m/%Y')}\n"
-                        msg_telegram += f"💰 ยอดซื้อ: `{res['total_spent']:,.0f}` บาท\n\n"
-                        msg_telegram += "🛒 *สรุปรายการ:*\n"
-                        
-                        # วนลูปเอาเฉพาะตัวที่ได้ซื้อจริงๆ (จำนวน > 0)
-                        for item in res['plan_data']:
-                            if item['จำนวน'] > 0:
-                                # --- [แก้ไขจุดที่ 2] เพิ่มยอดเงินบาทในข้อความ msg_telegram ---
-                                msg_telegram += f"• {item['หุ้น']}: {item['จำนวน']} หุ้น ({item['สถานะ']}) | 💸 {item['รวม (บาท)']:,.2f} บาท\n"
-                                
-                        msg_telegram += "\n✅ *บันทึกเข้าระบบเรียบร้อย*"
-                        
-                        # สั่งรันฟังก์ชันส่ง Telegram
-                        send_telegram_msg(msg_telegram)
-                        st.toast("ส่งแจ้งเตือนเข้า Telegram แล้ว ✈️")
-                        # ==========================================
-            
-            with c_copy: st.code(res['line_summary'], language="text")
-        # Snowball Graph (อยู่ด้านล่างสุดของ Tab 1)
-        st.divider()
-        with st.expander("📈 พลังของดอกเบี้ยทบต้น (Snowball Effect) - แบบสมจริง", expanded=False):
-            
-            # 1. ส่วนปรับแต่งตัวแปร (Simulation)
-            c_sim1, c_sim2, c_sim3 = st.columns(3)
-            with c_sim1:
-                years = st.slider("ระยะเวลาลงทุน (ปี)", 5, 40, 20)
-            with c_sim2:
-                # ค่า Default: หุ้นนอก 8%, หุ้นไทย 6% (ปรับลดลงมาให้ Conservative)
-                default_return = 8.0 if is_usd_port else 6.0
-                exp_return = st.number_input("ผลตอบแทนคาดหวัง (% ต่อปี)", value=default_return, step=0.5) / 100
-            with c_sim3:
-                inflation = st.number_input("เงินเฟ้อ (% ต่อปี)", value=3.0, step=0.5, help="เฉลี่ย 3% เพื่อดูมูลค่าเงินจริง") / 100
-    
-            # 2. คำนวณ (DCA Logic รายเดือน)
-            months = years * 12
-            monthly_invest = budget_thb # ใช้ค่าบาทในการคำนวณเพื่อให้เห็นภาพ
-            
-            data_wealth = []
-            data_invested = []
-            
-            current_wealth = 0
-            total_invested = 0
-            
-            # สูตร Real Return (ผลตอบแทนที่แท้จริงหลังหักเงินเฟ้อ)
-            real_return_rate = ((1 + exp_return) / (1 + inflation)) - 1
-            monthly_rate = real_return_rate / 12
-    
-            for m in range(1, months + 1):
-                total_invested += monthly_invest
-                # สูตรทบต้นรายเดือน: (เงินเก่า + เงินใหม่) * ดอกเบี้ยเดือนนี้
-                current_wealth = (current_wealth + monthly_invest) * (1 + monthly_rate)
+        
+        with col_table:
+             if not res['df'].empty:
+                # [แก้ตรงนี้] กำหนด Format เฉพาะคอลัมน์ที่เป็นตัวเลขเท่านั้น
+                format_dict = {
+                    "ราคา": "{:,.2f}",
+                    "จำนวน": "{:,.4f}",
+                    "รวม (บาท)": "{:,.2f}",
+                    # คอลัมน์สกุลเงินต่างประเทศ (Dynamic key)
+                    f"รวม ({currency})": "{:,.2f}"
+                }
                 
-                # เก็บข้อมูลทุกๆ สิ้นปี เพื่อมาพล็อต (จะได้ไม่ถี่เกินไป)
-                if m % 12 == 0:
-                    data_wealth.append(current_wealth)
-                    data_invested.append(total_invested)
-    
-            # 3. แสดงผลกราฟเปรียบเทียบ
+                # ใช้ format_dict แทนการ format ทั้งตาราง
+                st.dataframe(
+                    res['df'].set_index("หุ้น").style.format(format_dict, na_rep="-"), 
+                    use_container_width=True
+                )
+             else:
+                st.warning("พอร์ตสมดุลแล้ว ไม่ต้องซื้อเพิ่ม หรือ งบไม่พอซื้อหุ้นที่ขาด")
+
+        c_save, c_copy = st.columns([1, 2])
+        with c_save:
+            if st.button("💾 บันทึก (Save)", use_container_width=True):
+                # แปลงข้อมูลก่อนบันทึกให้ชัวร์ (บันทึกสถานะไปด้วย)
+                if save_to_gsheet(ledger_rows(res)):
+                    st.success("บันทึกแล้ว! (กำลังส่งเข้าชีตเบื้องหลัง)"); st.balloons()
+                    
+                    # ==========================================
+                    # --- [ส่วนที่เพิ่มใหม่] แจ้งเตือนเข้า Telegram ---
+                    # ==========================================
+                    # สั่งรันฟังก์ชันส่ง Telegram (เฉพาะตัวที่ได้ซื้อจริง)
+                    if send_telegram_msg(telegram_message(res)):
+                        st.toast("ฝากแจ้งเตือนเข้าคิว Telegram แล้ว ✈️")
+                    # ==========================================
+        
+        with c_copy: st.code(res['line_summary'], language="text")
+    snowball_simulator(budget_thb)
+
+# Snowball Graph (อยู่ด้านล่างสุดของ Tab 1) ซ้อนใน planner: เปลี่ยนงบคำนวณใหม่ทั้งคู่ ขยับ slider คำนวณใหม่แค่ส่วนนี้
+@st.fragment
+@TRACER.run("fragment:snowball_simulator")
+def snowball_simulator(monthly_invest):
+    st.divider()
+    with st.expander("📈 พลังของดอกเบี้ยทบต้น (Snowball Effect) - แบบสมจริง", expanded=False):
+        
+        # 1. ส่วนปรับแต่งตัวแปร (Simulation)
+        c_sim1, c_sim2, c_sim3 = st.columns(3)
+        with c_sim1:
+            years = st.slider("ระยะเวลาลงทุน (ปี)", 5, 40, 20)
+        with c_sim2:
+            # ค่า Default: หุ้นนอก 8%, หุ้นไทย 6% (ปรับลดลงมาให้ Conservative)
+            default_return = 8.0 if is_usd_port else 6.0
+            exp_return = st.number_input("ผลตอบแทนคาดหวัง (% ต่อปี)", value=default_return, step=0.5) / 100
+        with c_sim3:
+            inflation = st.number_input("เงินเฟ้อ (% ต่อปี)", value=3.0, step=0.5, help="เฉลี่ย 3% เพื่อดูมูลค่าเงินจริง") / 100
+
+        sim_mode = st.radio("รูปแบบการจำลอง", ["📏 แบบคงที่ (สูตร)", "🎲 Monte Carlo (สุ่มจากราคาย้อนหลัง)"], horizontal=True)
+
+        # 2. คำนวณ (DCA Logic รายเดือน) monthly_invest = งบเดือนนี้เป็นบาท เพื่อให้เห็นภาพ
+        data_invested = monthly_invest * 12 * np.arange(1, years + 1)
+        
+        # สูตร Real Return (ผลตอบแทนที่แท้จริงหลังหักเงินเฟ้อ) -> ใช้สูตรปิดแทนการวนทีละเดือน
+        monthly_rate = snowball.real_monthly_rate(exp_return, inflation)
+        data_wealth = snowball.deterministic(monthly_invest, years, monthly_rate)
+
+        # 3. แสดงผลกราฟเปรียบเทียบ
+        df_chart = pd.DataFrame({
+            "เงินต้นที่ใส่ไป (Principal)": data_invested,
+            "มูลค่าพอร์ตจริง (Wealth)": data_wealth
+        }, index=range(1, years + 1))
+
+        if sim_mode.startswith("🎲"):
+            # สุ่ม 10,000 เส้นทางจากผลตอบแทนรายเดือนจริงของพอร์ต (ถ้าดึงไม่ได้ใช้ค่าคาดหวัง + ผันผวน 15%/ปี)
+            hist_returns = get_portfolio_monthly_returns(user_data['assets'])
+            if hist_returns is None:
+                st.warning("ดึงราคาย้อนหลังไม่ได้ ใช้ผลตอบแทนคาดหวัง ± ความผันผวน 15%/ปี แทน")
+            bands = snowball.monte_carlo(monthly_invest, years, hist_returns, mean=exp_return / 12,
+                                        vol=0.15 / np.sqrt(12), inflation=inflation, seed=42)
             df_chart = pd.DataFrame({
                 "เงินต้นที่ใส่ไป (Principal)": data_invested,
-                "มูลค่าพอร์ตจริง (Wealth)": data_wealth
+                "แย่ (P10)": bands[0], "กลางๆ (P50)": bands[1], "ดี (P90)": bands[2]
             }, index=range(1, years + 1))
-    
+            data_wealth = bands[1]
+            st.line_chart(df_chart, color=["#FF4B4B", "#FFA15A", "#00CC96", "#636EFA"])
+            st.caption(f"🎲 ปีที่ {years}: แย่ (P10) {bands[0][-1]:,.0f} บ. | กลางๆ (P50) {bands[1][-1]:,.0f} บ. | ดี (P90) {bands[2][-1]:,.0f} บ.")
+        else:
             st.line_chart(df_chart, color=["#FF4B4B", "#00CC96"]) # สีแดง=เงินต้น, สีเขียว=กำไร
+
+        # 4. สรุปตัวเลขปลายทาง
+        final_wealth = data_wealth[-1]
+        final_principal = data_invested[-1]
+        profit = final_wealth - final_principal
+        
+        # จัด Format ให้ดูง่าย
+        st.markdown(f"### 🏁 บทสรุปในอีก {years} ปีข้างหน้า")
+        c_res1, c_res2, c_res3 = st.columns(3)
+        c_res1.metric("เงินต้นสะสม (จ่ายจริง)", f"{final_principal:,.0f} บ.")
+        c_res2.metric("มูลค่าพอร์ต (หลังหักเงินเฟ้อ)", f"{final_wealth:,.0f} บ.", delta=f"+กำไร {profit:,.0f}")
+        c_res3.metric("โตขึ้น", f"{final_wealth/final_principal:.1f} เท่า")
+
+        st.caption(f"💡 หมายเหตุ: คำนวณโดยหักเงินเฟ้อ {inflation*100}% แล้ว เพื่อแสดง 'มูลค่าเงินที่แท้จริง' (Purchasing Power) ณ ปัจจุบัน")
+
+with tab_calc:
+    rebalance_planner()
+checkpoint("ui.tab_calc")
+# --- TAB 2: HISTORY ---
+@st.fragment
+@TRACER.run("fragment:history_panel")
+def history_panel():
+    if st.button("🔄 โหลดประวัติล่าสุด"):
+        hist_df = load_history(user_name)
+        if not hist_df.empty:
+            st.metric("💸 เงินสะสมรวม", f"{load_holdings(user_name)['Total_THB'].sum():,.0f} บาท")
+            st.dataframe(hist_df.sort_values("Date", ascending=False), use_container_width=True)
+# เพิ่ม "Portfolio" เข้าไปใน List ของ Tabs
+
+with tab_hist:
+    history_panel()
+checkpoint("ui.tab_hist")
+# --- TAB 3: PORTFOLIO ---
+@st.fragment
+@TRACER.run("fragment:portfolio_summary")
+def portfolio_summary():
+    st.header(f"📊 วิเคราะห์พอร์ตของ {user_name}")
     
-            # 4. สรุปตัวเลขปลายทาง
-            final_wealth = data_wealth[-1]
-            final_principal = data_invested[-1]
-            profit = final_wealth - final_principal
-            
-            # จัด Format ให้ดูง่าย
-            st.markdown(f"### 🏁 บทสรุปในอีก {years} ปีข้างหน้า")
-            c_res1, c_res2, c_res3 = st.columns(3)
-            c_res1.metric("เงินต้นสะสม (จ่ายจริง)", f"{final_principal:,.0f} บ.")
-            c_res2.metric("มูลค่าพอร์ต (หลังหักเงินเฟ้อ)", f"{final_wealth:,.0f} บ.", delta=f"+กำไร {profit:,.0f}")
-            c_res3.metric("โตขึ้น", f"{final_wealth/final_principal:.1f} เท่า")
+    # 1. ยอดรวมรายหุ้นจาก holdings index (อัปเดตทีละแถวตอน sync ไม่ต้อง groupby ใหม่)
+    summary = prefetch.result("holdings", EMPTY_HOLDINGS)
+    
+    # กรองเฉพาะหุ้นที่ยังมีของอยู่ (จำนวน > 0)
+    summary = summary[summary['Shares'] > 0].reset_index(drop=True)
     
-            st.caption(f"💡 หมายเหตุ: คำนวณโดยหักเงินเฟ้อ {inflation*100}% แล้ว เพื่อแสดง 'มูลค่าเงินที่แท้จริง' (Purchasing Power) ณ ปัจจุบัน")
-    # --- TAB 2: HISTORY ---
-    with tab_hist:
-        if st.button("🔄 โหลดประวัติล่าสุด"):
-            hist_df = load_history(user_name)
-            if not hist_df.empty:
-                st.metric("💸 เงินสะสมรวม", f"{hist_df['Total_THB'].sum():,.0f} บาท")
-                st.dataframe(hist_df.sort_values("Date", ascending=False), use_container_width=True)
-   # เพิ่ม "Portfolio" เข้าไปใน List ของ Tabs
-
-
-   # --- TAB 3: PORTFOLIO ---
-    with tab_port:
-        st.header(f"📊 วิเคราะห์พอร์ตของ {user_name}")
+    if not summary.empty:
+     # 2. ดึงราคาตลาดปัจจุบันและข้อมูลปันผล (อัปเกรดความแม่นยำ)
+        tickers_held = list(summary['Ticker'])
         
-        # 1. โหลดข้อมูลจาก Sheet มาคำนวณต้นทุน
-        df_all = load_history(user_name)
+        # ข้อมูลปันผล/สกุลเงินจาก metadata store บนดิสก์ (ตัวที่เก่าจะ refresh เบื้องหลังเอง)
+        infos = get_metadata_store().get_many(tickers_held)
+        if any(not info for info in infos.values()):
+            st.caption("⚠️ ข้อมูลปันผลบางตัวกำลังโหลดเบื้องหลัง แสดงเป็น 0 ไปก่อน")
         
-        if not df_all.empty:
-            # คำนวณยอดรวมรายหุ้น (Group By Ticker)
-            summary = df_all.groupby('Ticker').agg({
-                'Shares': 'sum',
-                'Total_THB': 'sum'
-            }).reset_index()
-            
-            # กรองเฉพาะหุ้นที่ยังมีของอยู่ (จำนวน > 0)
-            summary = summary[summary['Shares'] > 0]
-            
-            summary['Avg_Price_THB'] = summary['Total_THB'] / summary['Shares']
-            
-         # 2. ดึงราคาตลาดปัจจุบันและข้อมูลปันผล (อัปเกรดความแม่นยำ)
-            current_prices = []
-            div_per_share_thb_list = [] # เปลี่ยนมาเก็บค่าปันผล "ต่อหุ้น" แทน
-            
-            # ดึงเรทเงินมาก่อนเลย
-            rate = get_exchange_rate_safe() or 34.50 
-            
-            my_bar = st.progress(0, text="⏳ กำลังคำนวณราคาและปันผลล่าสุด...")
-            for i, t in enumerate(summary['Ticker']):
-                my_bar.progress((i + 1) / len(summary['Ticker']), text=f"กำลังอัปเดต: {t}")
-                
-                # ดึงราคา
-                p = get_price_safe(t)
-                current_prices.append(p)
-                
-                # ดึงข้อมูลปันผล (แบบแม่นยำ)
-                try:
-                    info = yf.Ticker(t).info
-                    # 1. พยายามหา "จำนวนเงินปันผลต่อหุ้น" ตรงๆ ก่อน (เช่น SCHD จ่าย $2.66/หุ้น)
-                    div_rate = info.get('dividendRate') or info.get('trailingAnnualDividendRate')
-                    
-                    if div_rate is None:
-                        # 2. ถ้าไม่มี (API ไม่ส่งมา) ค่อยเอา % Yield ไปคูณราคา
-                        dy = info.get('dividendYield') or info.get('yield') or info.get('trailingAnnualDividendYield') or 0.0
-                        if dy > 1: dy = dy / 100 # กันเหนียวกรณี API บัคส่งมาเป็น 3.5 แทน 0.035
-                        div_rate = p * dy
-                        
-                    # แปลงเป็นเงินบาท (ถ้าเป็นหุ้นนอก)
-                    div_rate_thb = (div_rate * rate) if ".BK" not in t else div_rate
-                    div_per_share_thb_list.append(div_rate_thb)
-                except:
-                    div_per_share_thb_list.append(0.0)
-                    
-            my_bar.empty()
-            
-            summary['Current_Price'] = current_prices
-            summary['Div_Per_Share_THB'] = div_per_share_thb_list
-            
-            # คำนวณมูลค่าตลาด (Market Value THB)
-            summary['Market_Value_THB'] = summary.apply(
-                lambda x: (x['Shares'] * x['Current_Price'] * rate) if ".BK" not in x['Ticker'] 
-                else (x['Shares'] * x['Current_Price']), axis=1
-            )
-            
-            # คำนวณเงินปันผลคาดหวังต่อปี (จำนวนหุ้น * เงินปันผลต่อหุ้น)
-            summary['Expected_Div_THB'] = summary['Shares'] * summary['Div_Per_Share_THB']
-            
-            # คำนวณ Yield on Cost (YoC) = ปันผล / ต้นทุนจริง
-            summary['YoC_%'] = (summary['Expected_Div_THB'] / summary['Total_THB']) * 100
-            
-            # 3. คำนวณ P/L
-            summary['P/L_Amount'] = summary['Market_Value_THB'] - summary['Total_THB']
-            summary['P/L_Percent'] = (summary['P/L_Amount'] / summary['Total_THB']) * 100
-            
-            # --- ส่วนแสดงผล Metric รวมของพอร์ต ---
-            total_cost = summary['Total_THB'].sum()
-            total_value = summary['Market_Value_THB'].sum()
-            total_pl = total_value - total_cost
-            
-            col_p1, col_p2, col_p3 = st.columns(3)
-            col_p1.metric("💰 มูลค่าพอร์ตปัจจุบัน", f"{total_value:,.0f} บ.")
-            col_p2.metric("📈 กำไร/ขาดทุนรวม", f"{total_pl:,.0f} บ.", f"{ (total_pl/total_cost)*100 :.2f}%")
-            col_p3.metric("💵 ต้นทุนทั้งหมด", f"{total_cost:,.0f} บ.")
-            
-            st.divider()
-            
-            # ==========================================
-            # --- 🚀 ฟีเจอร์ใหม่: DIVIDEND TRACKER ---
-            # ==========================================
-            st.subheader("💸 Dividend Tracker (กระแสเงินสดคาดหวัง)")
-            st.caption("ประมาณการเงินปันผลรายปีจากจำนวนหุ้นที่ถืออยู่ ณ ปัจจุบัน (Passive Income)")
-            
-            total_div = summary['Expected_Div_THB'].sum()
-            avg_monthly_div = total_div / 12
-            port_yoc = (total_div / total_cost) * 100 if total_cost > 0 else 0
-            
-            d1, d2, d3 = st.columns(3)
-            d1.metric("🗓️ ปันผลรวมทั้งปี (คาดการณ์)", f"{total_div:,.0f} บาท/ปี")
-            d2.metric("🍰 เฉลี่ยตกเดือนละ (เงินกินขนม)", f"{avg_monthly_div:,.0f} บาท", "Passive Income")
-            d3.metric("🎯 Yield on Cost (พอร์ตรวม)", f"{port_yoc:.2f}%", "ผลตอบแทนจากทุนจริง")
-            
-            # กราฟแท่งแสดงปันผลแต่ละตัว (ให้เห็นว่าตัวไหนเป็นพระเอก)
+        # สกุลเงินของแต่ละตัว -> ดึงราคาทุกตัว + ทุกคู่เงินที่ต้องใช้ในคำขอเดียว
+        currencies = resolve_currencies(tickers_held, infos)
+        with st.spinner("⏳ กำลังดึงราคาตลาด..."):
+            quotes = get_quotes(tickers_held, fx_pairs=fx_pairs_for(currencies.values()))
+        price_map = {t: quotes.get(t) or 0 for t in tickers_held}
+        fx_mult = thb_multipliers(currencies.values(), quotes)
+        
+        # ปันผลต่อหุ้น: ใช้ "จำนวนเงินปันผลต่อหุ้น" ตรงๆ ก่อน (เช่น SCHD จ่าย $2.66/หุ้น) ไม่มีค่อยเอา % Yield คูณราคา
+        div_native = {t: dividend_per_share(infos[t], price_map[t]) for t in tickers_held}
+        
+        # คำนวณมูลค่าตลาด, ปันผล, Yield on Cost (YoC) และ P/L เป็นบาททั้งคอลัมน์
+        summary = value_holdings(summary, price_map, currencies, fx_mult, div_native)
+        
+        # --- ส่วนแสดงผล Metric รวมของพอร์ต ---
+        total_cost = summary['Total_THB'].sum()
+        total_value = summary['Market_Value_THB'].sum()
+        total_pl = total_value - total_cost
+        
+        col_p1, col_p2, col_p3 = st.columns(3)
+        col_p1.metric("💰 มูลค่าพอร์ตปัจจุบัน", f"{total_value:,.0f} บ.")
+        col_p2.metric("📈 กำไร/ขาดทุนรวม", f"{total_pl:,.0f} บ.", f"{ (total_pl/total_cost)*100 :.2f}%")
+        col_p3.metric("💵 ต้นทุนทั้งหมด", f"{total_cost:,.0f} บ.")
+        
+        st.divider()
+        
+        # --- ผลตอบแทนตามเวลา: ตัดผลจังหวะเติมเงิน (TWR) และคิดตามวันที่ DCA จริง (XIRR) ---
+        st.subheader("📈 ผลตอบแทนตามเวลา (TWR / XIRR)")
+        # คำนวณเบื้องหลัง: แสดงผลล่าสุดที่มีไปก่อน ไม่ให้แท็บค้างรอโหลดราคาย้อนหลัง
+        engine = get_performance_engine()
+        perf = engine.latest()
+        if engine.refreshing:
+            st.caption("⏳ กำลังอัปเดตผลตอบแทนย้อนหลังเบื้องหลัง กดรีเฟรชเพื่อดูผลล่าสุด")
+        if perf is not None and (user_name, TOTAL) in perf['summary'].index:
+            perf_total = perf['summary'].loc[(user_name, TOTAL)]
+            t1, t2, t3 = st.columns(3)
+            t1.metric("⏱️ TWR (ไม่นับผลจังหวะเติมเงิน)", f"{perf_total['TWR_%']:.2f}%")
+            t2.metric("💼 XIRR (ต่อปี ตามจังหวะเติมเงิน)", f"{perf_total['XIRR_%']:.2f}%")
+            t3.metric("💰 ปันผลที่ได้รับสะสม", f"{perf_total['Dividends_THB']:,.0f} บ.")
+            st.line_chart(pd.DataFrame({
+                "มูลค่าพอร์ต (รวมปันผล)": perf['value'][(user_name, TOTAL)],
+                "เงินลงทุนสะสม": perf['invested'][(user_name, TOTAL)],
+            }), color=["#00CC96", "#FF4B4B"])
+            per_ticker = perf['summary'].loc[user_name].drop(index=TOTAL)
+            st.dataframe(per_ticker.style.format("{:,.2f}"), use_container_width=True)
+        elif not engine.refreshing:
+            st.caption("ยังคำนวณผลตอบแทนย้อนหลังไม่ได้ (ไม่มีราคาย้อนหลัง หรือวันที่ใน ledger อ่านไม่ออก)")
+        
+        st.divider()
+        
+        # ==========================================
+        # --- 🚀 ฟีเจอร์ใหม่: DIVIDEND TRACKER ---
+        # ==========================================
+        st.subheader("💸 Dividend Tracker (กระแสเงินสดคาดหวัง)")
+        st.caption("ประมาณการเงินปันผลรายปีจากจำนวนหุ้นที่ถืออยู่ ณ ปัจจุบัน (Passive Income)")
+        
+        total_div = summary['Expected_Div_THB'].sum()
+        avg_monthly_div = total_div / 12
+        port_yoc = (total_div / total_cost) * 100 if total_cost > 0 else 0
+        
+        d1, d2, d3 = st.columns(3)
+        d1.metric("🗓️ ปันผลรวมทั้งปี (คาดการณ์)", f"{total_div:,.0f} บาท/ปี")
+        d2.metric("🍰 เฉลี่ยตกเดือนละ (เงินกินขนม)", f"{avg_monthly_div:,.0f} บาท", "Passive Income")
+        d3.metric("🎯 Yield on Cost (พอร์ตรวม)", f"{port_yoc:.2f}%", "ผลตอบแทนจากทุนจริง")
+        
+        # กราฟแท่งแสดงปันผลแต่ละตัว (ให้เห็นว่าตัวไหนเป็นพระเอก)
+        with span("plot.dividend_bar"):
             fig_div = px.bar(
                 summary, x='Ticker', y='Expected_Div_THB', 
                 text=summary['Expected_Div_THB'].apply(lambda x: f"{x:,.0f} บ."),
@@ -613,59 +585,192 @@ if check_password():
             )
             fig_div.update_traces(textposition='outside')
             st.plotly_chart(fig_div, use_container_width=True)
-            
-            # ==========================================
-    
-            # แสดงตารางวิเคราะห์
-            st.subheader("🔍 รายละเอียดรายสินทรัพย์")
-            
-            # จัดรูปแบบตารางให้ดูสวยงามและเข้าใจง่าย
-            display_df = summary[['Ticker', 'Shares', 'Avg_Price_THB', 'Total_THB', 'Market_Value_THB', 'P/L_Amount', 'Expected_Div_THB', 'YoC_%']].copy()
-            display_df.rename(columns={
-                'Shares': 'จำนวนหุ้น',
-                'Avg_Price_THB': 'ทุนเฉลี่ย (บ.)',
-                'Total_THB': 'ต้นทุนรวม (บ.)',
-                'Market_Value_THB': 'มูลค่าปัจจุบัน (บ.)',
-                'P/L_Amount': 'กำไร/ขาดทุน (บ.)',
-                'Expected_Div_THB': 'ปันผล/ปี (บ.)',
-                'YoC_%': 'YoC (%)'
-            }, inplace=True)
-            
-            st.dataframe(display_df.set_index('Ticker').style.format("{:,.2f}"), use_container_width=True)
-        else:
-            st.info("ยังไม่มีข้อมูลสำหรับวิเคราะห์ กรุณาบันทึกการลงทุนก่อน")
-# --- TAB 4: AI ANALYST ---
-    with tab_ai:
-        st.header("🤖 ให้ AI ช่วยแกะงบการเงิน")
-        st.caption("Powered by Google Gemini Pro")
         
-        col_ai1, col_ai2 = st.columns([1, 3])
+        # ==========================================
+
+        # แสดงตารางวิเคราะห์
+        st.subheader("🔍 รายละเอียดรายสินทรัพย์")
         
-        with col_ai1:
-            # เลือกหุ้นจากในพอร์ต หรือพิมพ์เองก็ได้
-            all_tickers = list(user_data['assets'].keys())
-            selected_stock = st.selectbox("เลือกหุ้นที่จะวิเคราะห์", all_tickers)
-            
-            analyze_btn = st.button("🔍 เริ่มวิเคราะห์", type="primary", use_container_width=True)
+        # จัดรูปแบบตารางให้ดูสวยงามและเข้าใจง่าย
+        display_df = summary[['Ticker', 'Shares', 'Avg_Price_THB', 'Total_THB', 'Market_Value_THB', 'P/L_Amount', 'Expected_Div_THB', 'YoC_%']].copy()
+        display_df.rename(columns={
+            'Shares': 'จำนวนหุ้น',
+            'Avg_Price_THB': 'ทุนเฉลี่ย (บ.)',
+            'Total_THB': 'ต้นทุนรวม (บ.)',
+            'Market_Value_THB': 'มูลค่าปัจจุบัน (บ.)',
+            'P/L_Amount': 'กำไร/ขาดทุน (บ.)',
+            'Expected_Div_THB': 'ปันผล/ปี (บ.)',
+            'YoC_%': 'YoC (%)'
+        }, inplace=True)
+        
+        st.dataframe(display_df.set_index('Ticker').style.format("{:,.2f}"), use_container_width=True)
+    else:
+        st.info("ยังไม่มีข้อมูลสำหรับวิเคราะห์ กรุณาบันทึกการลงทุนก่อน")
+
+with tab_port:
+    portfolio_summary()
+checkpoint("ui.tab_port")
+# --- TAB 4: HOUSEHOLD ---
+with tab_home:
+    st.header("🏠 ภาพรวมทั้งครอบครัว")
+    st.caption("อ่าน ledger ครั้งเดียว + ดึงราคาหุ้นของทุกคนในคำขอเดียว (หุ้นที่ถือร่วมกันตีราคาครั้งเดียว)")
+    with st.spinner("⏳ กำลังรวมพอร์ตทุกคน..."):
+        try:
+            home = household_snapshot(get_synced_ledger(), FAMILY_PORTFOLIOS, get_metadata_store())
+        except Exception as e:
+            home = None
+            st.error(f"รวมพอร์ตไม่สำเร็จ: {e}")
+    if home is not None and home['users']['Market_Value_THB'].sum() > 0:
+        users_df = home['users']
+        h_cost, h_value = users_df['Total_THB'].sum(), users_df['Market_Value_THB'].sum()
+        h1, h2, h3, h4 = st.columns(4)
+        h1.metric("💰 มูลค่ารวมทั้งบ้าน", f"{h_value:,.0f} บ.")
+        h2.metric("📈 กำไร/ขาดทุนรวม", f"{h_value - h_cost:,.0f} บ.", f"{(h_value / h_cost - 1) * 100 if h_cost else 0:.2f}%")
+        h3.metric("💵 ต้นทุนรวม", f"{h_cost:,.0f} บ.")
+        h4.metric("🗓️ ปันผลรวม/ปี (คาดการณ์)", f"{users_df['Expected_Div_THB'].sum():,.0f} บ.")
+
+        st.subheader("👨‍👩‍👧 แยกตามคน")
+        st.dataframe(users_df.rename(columns={
+            'Total_THB': 'ต้นทุน (บ.)', 'Market_Value_THB': 'มูลค่า (บ.)', 'P/L_Amount': 'กำไร/ขาดทุน (บ.)',
+            'Expected_Div_THB': 'ปันผล/ปี (บ.)', 'P/L_Percent': 'P/L (%)', 'Max_Drift_%': 'เบี้ยวจากเป้าสูงสุด (%)'
+        }).style.format("{:,.2f}"), use_container_width=True)
+
+        c_exp1, c_exp2 = st.columns(2)
+        with c_exp1, span("plot.household_pies"):
+            by_ticker = home['by_ticker'][home['by_ticker']['Market_Value_THB'] > 0].reset_index()
+            st.plotly_chart(px.pie(by_ticker, names='Ticker', values='Market_Value_THB',
+                                   title="สัดส่วนหุ้นทั้งบ้าน", hole=0.4), use_container_width=True)
+        with c_exp2, span("plot.household_pies"):
+            by_cur = home['by_currency'][home['by_currency']['Market_Value_THB'] > 0].reset_index()
+            st.plotly_chart(px.pie(by_cur, names='Currency', values='Market_Value_THB',
+                                   title="สัดส่วนตามสกุลเงิน", hole=0.4), use_container_width=True)
+
+        st.subheader("🎯 สัดส่วนจริง vs เป้า")
+        drift_df = home['positions'][['User', 'Ticker', 'Shares', 'Market_Value_THB', 'Weight_%', 'Target_%', 'Drift_%']]
+        st.dataframe(drift_df.set_index(['User', 'Ticker']).style.format("{:,.2f}"), use_container_width=True)
+    elif home is not None:
+        st.info("ยังไม่มีข้อมูลการลงทุนของครอบครัว")
+checkpoint("ui.tab_home")
+# --- TAB 5: AI ANALYST ---
+@st.fragment
+@TRACER.run("fragment:ai_analyst")
+def ai_analyst():
+    st.header("🤖 ให้ AI ช่วยแกะงบการเงิน")
+    st.caption("Powered by Google Gemini Pro")
     
-        with col_ai2:
-            if analyze_btn:
-                # 1. ดึงข้อมูล
-                financial_text = get_financial_summary(selected_stock)
+    col_ai1, col_ai2 = st.columns([1, 3])
+    
+    with col_ai1:
+        # เลือกหุ้นจากในพอร์ต หรือพิมพ์เองก็ได้
+        all_tickers = list(user_data['assets'].keys())
+        selected_stock = st.selectbox("เลือกหุ้นที่จะวิเคราะห์", all_tickers)
+        stock_meta = get_metadata_store().get(selected_stock)
+        if stock_meta:
+            st.caption(f"{stock_meta.get('longName') or stock_meta.get('shortName') or selected_stock} · {stock_meta.get('quoteType', '-')} · {stock_meta.get('currency', '-')}")
+        
+        stream_ai = st.toggle("⚡ แสดงผลทันทีระหว่าง AI พิมพ์ (Streaming)", value=True)
+        analyze_btn = st.button("🔍 เริ่มวิเคราะห์", type="primary", use_container_width=True)
+
+    with col_ai2:
+        if analyze_btn:
+            # 1. ดึงข้อมูล
+            financial_text = get_financial_summary(selected_stock)
+            
+            if financial_text:
+                # 2. ส่งให้ AI (ข้อมูลเดิม + prompt เดิม ได้คำตอบจากแคชทันที)
+                ai_result = ask_gemini_analyst(financial_text, selected_stock, stream=stream_ai)
                 
-                if financial_text:
-                    # 2. ส่งให้ AI
-                    ai_result = ask_gemini_analyst(financial_text, selected_stock)
-                    
-                    # 3. แสดงผล
-                    st.markdown(f"### 📄 ผลการวิเคราะห์หุ้น {selected_stock}")
-                    st.info("ข้อมูลจากงบการเงินย้อนหลัง 3 ปีล่าสุด")
-                    st.markdown(ai_result) # AI จะตอบกลับมาเป็น Markdown สวยๆ
-                    
+                # 3. แสดงผล
+                st.markdown(f"### 📄 ผลการวิเคราะห์หุ้น {selected_stock}")
+                st.info("ข้อมูลจากงบการเงินย้อนหลัง 3 ปีล่าสุด")
+                if stream_ai:
+                    st.write_stream(ai_result) # โชว์ทีละช่วงตามที่ AI พิมพ์ออกมา
                 else:
-                    st.warning(f"ไม่พบข้อมูลงบการเงินของ {selected_stock} (อาจเป็น ETF หรือดึงข้อมูลไม่ได้)")
+                    st.markdown(ai_result) # AI จะตอบกลับมาเป็น Markdown สวยๆ
+                
+            else:
+                st.warning(f"ไม่พบข้อมูลงบการเงินของ {selected_stock} (อาจเป็น ETF หรือดึงข้อมูลไม่ได้)")
+
+    # วิเคราะห์ทั้งพอร์ตเบื้องหลัง: กดครั้งเดียว ปิดหน้าไปก่อนได้ กลับมาดูผลทีหลัง
+    st.divider()
+    st.subheader("📚 วิเคราะห์ทั้งพอร์ต")
+    jobs = get_ai_jobs()
+    batch_scope = st.radio("ขอบเขต", [f"พอร์ตของ {user_name}", "ทุกพอร์ตในครอบครัว"], horizontal=True)
+    if batch_scope == "ทุกพอร์ตในครอบครัว":
+        batch_tickers = list(dict.fromkeys(t for p in FAMILY_PORTFOLIOS.values() for t in p['assets']))
+    else:
+        batch_tickers = list(user_data['assets'].keys())
+
+    col_b1, col_b2, col_b3 = st.columns(3)
+    if col_b1.button("🚀 ส่งเข้าคิววิเคราะห์", use_container_width=True):
+        n = jobs.submit(batch_tickers)
+        st.toast(f"ส่งเข้าคิว {n} ตัว (ตัวที่วิเคราะห์แล้วข้ามไป)")
+    if col_b2.button("♻️ วิเคราะห์ใหม่ทั้งหมด", use_container_width=True):
+        jobs.submit(batch_tickers, force=True)
+    col_b3.button("🔄 อัปเดตสถานะ", use_container_width=True)
+
+    batch = jobs.reports(batch_tickers)
+    if batch:
+        finished = sum(1 for r in batch.values() if r['status'] in ("done", "no_data", "error"))
+        st.progress(finished / len(batch_tickers), text=f"เสร็จแล้ว {finished}/{len(batch_tickers)} ตัว")
+        for t in batch_tickers:
+            r = batch.get(t)
+            if not r: continue
+            if r['status'] == "done":
+                with st.expander(f"📄 {t}"):
+                    st.markdown(r['report'])
+            elif r['status'] == "no_data":
+                st.caption(f"⚪ {t}: ไม่พบข้อมูลงบการเงิน")
+            elif r['status'] == "error":
+                st.caption(f"🔴 {t}: {r['error']}")
+            else:
+                st.caption(f"⏳ {t}: {'กำลังวิเคราะห์' if r['status'] == 'running' else 'รอคิว'}...")
+
+with tab_ai:
+    ai_analyst()
+checkpoint("ui.tab_ai")
+
+# Debug: เวลาแต่ละ span ของ rerun/fragment ล่าสุด + สถิติสะสม (เฉพาะแอดมิน)
+TRACER.end_run(trace_run)
+
+
+@st.fragment
+def latency_panel():
+    # เป็น fragment เอง กด "รีเฟรช" ดู run ของ fragment ที่เพิ่ง rerun ได้โดยไม่ต้องรันทั้งหน้า
+    with st.expander("🛠️ Debug: latency"):
+        tracing = st.toggle("เปิด tracing", value=TRACER.enabled, help="มีผลทั้ง process เริ่มเก็บตั้งแต่ rerun ถัดไป")
+        if tracing != TRACER.enabled:
+            TRACER.enabled = tracing
+            st.rerun()
+        if st.button("🔄 รีเฟรช", key="latency_refresh"):
+            st.rerun(scope="fragment")
+        runs = list(reversed(TRACER.runs))  # ใหม่สุดก่อน
+        run = None
+        if runs:
+            pick = st.selectbox("run", range(len(runs)), format_func=lambda i: (
+                f"{time.strftime('%H:%M:%S', time.localtime(runs[i].started_at))} · {runs[i].label} · "
+                f"{runs[i].duration * 1000:,.0f} ms"))
+            run = runs[pick]
+            st.dataframe(pd.DataFrame(run.breakdown()), hide_index=True, use_container_width=True)
+        st.caption("Upstream (คิว / throttle / รวมคำขอซ้ำ)")
+        st.dataframe(pd.DataFrame(upstream.stats()), hide_index=True, use_container_width=True)
+        stats = TRACER.summary()
+        if stats:
+            st.caption("สถิติสะสมต่อ span (p50/p95 จากครั้งล่าสุด)")
+            st.dataframe(pd.DataFrame(stats), hide_index=True, use_container_width=True)
+            c_j, c_p, c_r = st.columns(3)
+            c_j.download_button("JSON", TRACER.to_json(run), file_name="trace.json", mime="application/json")
+            c_p.download_button("Prometheus", TRACER.to_prometheus(), file_name="metrics.txt", mime="text/plain")
+            if c_r.button("ล้างสถิติ"):
+                TRACER.reset()
+                st.rerun()
+
+
+if is_admin():
+    with st.sidebar:
+        latency_panel()
 
-     
+ 
 
 
 
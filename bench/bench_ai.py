@@ -0,0 +1,39 @@
+"""วัด time-to-first-output ของ AI Analyst: เรียกแบบเดิม vs streaming vs แคชบนดิสก์ (ใช้โมเดลปลอม)
+
+รัน: python -m bench.bench_ai
+"""
+import tempfile
+import time
+
+from bench.fake_gemini import FakeModel
+from core.analyst import GeminiAnalyst
+
+DATA = "Data Type: Individual Stock\nCompany: MSFT\n" + "| row | 1 | 2 | 3 |\n" * 50
+
+
+def main():
+    model = FakeModel(first_token=0.8, per_chunk=0.03)
+    analyst = GeminiAnalyst(lambda name: model, tempfile.mkdtemp())
+
+    t0 = time.perf_counter()
+    model.generate_content(analyst.prompt("MSFT", DATA))
+    blocking = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    stream = analyst.stream("MSFT", DATA)
+    next(stream)
+    first = time.perf_counter() - t0
+    for _ in stream: pass
+    total = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    analyst.analyze("MSFT", DATA)
+    cached = time.perf_counter() - t0
+
+    print(f"blocking generate_content : {blocking*1000:7.1f} ms until anything is shown")
+    print(f"streaming                 : {first*1000:7.1f} ms to first chunk, {total*1000:7.1f} ms total")
+    print(f"cached repeat             : {cached*1000:7.3f} ms ({analyst.counters})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Benchmark ทั้งแอปแบบ end-to-end: ขับ app.py ด้วย Streamlit AppTest โดยไม่ต่อบริการจริงเลย
+
+ของปลอมที่ใช้: yfinance (fake_yfinance), gspread + ledger N แถว (fake_gspread), Gemini (fake_gemini)
+และ HTTP server ในเครื่องแทน Yahoo RSS + Telegram (fake_http)
+
+แต่ละขนาด (จำนวนแถว ledger x จำนวนหุ้นต่อพอร์ต) รันใน process แยก เพื่อให้แคช/หน่วยความจำไม่ปนกัน
+รายงานเวลา rerun ของแต่ละการกระทำ, จำนวน call ไปบริการภายนอก และหน่วยความจำสูงสุด
+
+    python -m bench.bench_app                                    # ขนาดตั้งต้น
+    python -m bench.bench_app --rows 1000 20000 --tickers 3 15 --json out.json
+    python -m bench.bench_app --baseline out.json --tolerance 0.25   # ช้ากว่าเดิมเกิน 25% -> exit 1
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "apmotor2026"
+
+# (ชื่อ, แท็บ, การกระทำ) ทำตามลำดับนี้ทุกขนาด แต่ละอันคือ rerun หนึ่งรอบ
+STEPS = [
+    ("login", "all", lambda at: _button(at, "เข้าสู่ระบบ").click()),
+    ("warm rerun", "all", lambda at: at),
+    ("rebalance", "tab_calc", lambda at: _button(at, "🚀 คำนวณแผนการซื้อ").click()),
+    ("save plan", "tab_calc", lambda at: _button(at, "💾 บันทึก").click()),
+    ("load history", "tab_hist", lambda at: _button(at, "🔄 โหลดประวัติล่าสุด").click()),
+    ("ai analyze", "tab_ai", lambda at: _button(at, "🔍 เริ่มวิเคราะห์").click()),
+    ("switch user", "sidebar", lambda at: _select_next_user(at)),
+]
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label.startswith(label))
+
+
+def _select_next_user(at):
+    box = next(s for s in at.selectbox if s.label == "เลือกผู้ใช้งาน")
+    return box.select(box.options[1])
+
+
+def _portfolios(n_tickers):
+    """พอร์ตจำลอง: ทุกคนถือ n_tickers ตัว น้ำหนักเท่ากัน (ครึ่งหนึ่งเป็นหุ้นไทย)"""
+    from core.portfolios import FAMILY_PORTFOLIOS
+    out = {}
+    for u, (name, p) in enumerate(FAMILY_PORTFOLIOS.items()):
+        suffix = ".BK" if p['currency'] == "THB" else ""
+        tickers = [f"U{u}T{i:02d}{suffix}" for i in range(n_tickers)]
+        out[name] = {"currency": p['currency'], "assets": {t: 1.0 / n_tickers for t in tickers}}
+    return out
+
+
+def run_worker(n_rows, n_tickers, latency, server):
+    """รันหนึ่งขนาดใน process นี้ (server = FakeHTTPServer ที่ AP_NEWS_RSS / AP_TELEGRAM_API ชี้อยู่) คืน dict ผลลัพธ์"""
+    from streamlit.testing.v1 import AppTest  # import ก่อนติดตั้งของปลอม ให้ streamlit เจอ google.protobuf ตัวจริง
+
+    from bench import fake_gemini, fake_gspread, fake_yfinance
+
+    fake_yfinance.install()
+    fake_yfinance.reset(latency=latency)
+    model = fake_gemini.FakeModel(first_token=latency * 10, per_chunk=latency / 10)
+    fake_gemini.install(model)
+
+    from core import portfolios
+    family = _portfolios(n_tickers)
+    portfolios.FAMILY_PORTFOLIOS.clear()
+    portfolios.FAMILY_PORTFOLIOS.update(family)
+    users = list(family)
+    tickers = tuple(t for p in family.values() for t in p['assets'])
+    ws = fake_gspread.FakeWorksheet(fake_gspread.seed_rows(n_rows, users=users, tickers=tickers), latency=latency)
+    fake_gspread.install(ws)
+
+    server.latency = latency
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.secrets["gcp_service_account"] = {"type": "service_account"}
+    at.secrets["GOOGLE_API_KEY"] = "fake"
+    at.secrets["TELEGRAM_TOKEN"] = "TOKEN"
+    at.secrets["TELEGRAM_CHAT_ID"] = "chat"
+    at.run()
+    at.text_input[0].input(PASSWORD)
+
+    steps = []
+    for name, tab, action in STEPS:
+        before = {"yfinance": sum(fake_yfinance.calls.values()), "sheets": sum(ws.calls.values()),
+                  "gemini": model.calls, "http": len(server.requests)}
+        try:
+            action(at)
+        except StopIteration:
+            # ปุ่ม/ช่องที่ขั้นนี้ต้องใช้หายไป: ถือว่าพัง ไม่ใช่ข้ามเงียบๆ (baseline จะขาดตัวเลขของขั้นนี้)
+            steps.append({"step": name, "tab": tab, "missing": True, "errors": [f"{name}: ไม่พบ widget ของขั้นนี้"]})
+            continue
+        t0 = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - t0
+        steps.append({
+            "step": name, "tab": tab, "ms": round(elapsed * 1000, 1),
+            "yfinance_calls": sum(fake_yfinance.calls.values()) - before["yfinance"],
+            "sheet_calls": sum(ws.calls.values()) - before["sheets"],
+            "gemini_calls": model.calls - before["gemini"],
+            "http_requests": len(server.requests) - before["http"],
+            "errors": [str(e.value) for e in at.exception],
+        })
+        if name == "ai analyze" and not steps[-1]["gemini_calls"]:
+            # ถ้าไม่ถึง Gemini แปลว่าวัดแค่ทาง "ไม่พบข้อมูลงบ" ตัวเลขของขั้นนี้ใช้ไม่ได้
+            steps[-1]["errors"].append("ai analyze: ไม่ได้เรียก Gemini เลย")
+
+    return {"rows": n_rows, "tickers": n_tickers, "steps": steps,
+            "sheet_cells_read": ws.cells_read,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def run_scenario(n_rows, n_tickers, latency):
+    """รันหนึ่งขนาดใน process ใหม่ (data dir แยก) แล้วอ่านผล JSON กลับมา"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, AP_DATA_DIR=data_dir)
+        cmd = [sys.executable, "-m", "bench.bench_app", "--worker", str(n_rows), str(n_tickers), "--latency", str(latency)]
+        out = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def print_report(results):
+    print(f"{'rows':>7} {'tickers':>7}  {'step':<14} {'tab':<9} {'ms':>9} {'yf':>4} {'sheet':>5} {'ai':>3} {'http':>5}")
+    for r in results:
+        for s in r["steps"]:
+            if s.get("missing"):
+                print(f"{r['rows']:>7} {r['tickers']:>7}  {s['step']:<14} {s['tab']:<9} {'missing':>9}  ⚠️ "
+                      + "; ".join(s["errors"]))
+                continue
+            flag = "  ⚠️ " + "; ".join(s["errors"]) if s["errors"] else ""
+            print(f"{r['rows']:>7} {r['tickers']:>7}  {s['step']:<14} {s['tab']:<9} {s['ms']:>9.1f} "
+                  f"{s['yfinance_calls']:>4} {s['sheet_calls']:>5} {s['gemini_calls']:>3} {s['http_requests']:>5}{flag}")
+        print(f"{'':>17}  max RSS {r['max_rss_mb']} MB, sheet cells read {r['sheet_cells_read']:,}")
+
+
+def regressions(results, baseline, tolerance):
+    """ขั้นที่ช้ากว่า baseline เกิน tolerance (เทียบขนาดเดียวกัน)"""
+    old = {(r["rows"], r["tickers"], s["step"]): s.get("ms") for r in baseline for s in r["steps"]}
+    out = []
+    for r in results:
+        for s in r["steps"]:
+            before = old.get((r["rows"], r["tickers"], s["step"]))
+            if before and s.get("ms") and s["ms"] > before * (1 + tolerance):
+                out.append(f"{r['rows']} rows / {r['tickers']} tickers / {s['step']}: {before:.0f} -> {s['ms']:.0f} ms")
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[3, 15])
+    parser.add_argument("--latency", type=float, default=0.05, help="หน่วงต่อ call ของบริการปลอม (วินาที)")
+    parser.add_argument("--json", help="บันทึกผลเป็น JSON (ใช้เป็น baseline รอบหน้า)")
+    parser.add_argument("--baseline", help="JSON ผลรอบก่อน สำหรับจับ regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--worker", type=int, nargs=2, metavar=("ROWS", "TICKERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        # server ปลอมเริ่มใน worker: ต้องรู้ port ก่อน import core.news / core.notify
+        from bench.fake_http import FakeHTTPServer
+        server = FakeHTTPServer()
+        os.environ["AP_NEWS_RSS"] = server.url + "/rss/headline?s={ticker}"
+        os.environ["AP_TELEGRAM_API"] = server.url
+        with server:
+            print(json.dumps(run_worker(*args.worker, args.latency, server), ensure_ascii=False))
+        return 0
+
+    results = [run_scenario(rows, tickers, args.latency) for rows in args.rows for tickers in args.tickers]
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    failed = any(s.get("errors") for r in results for s in r["steps"])
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            slow = regressions(results, json.load(f), args.tolerance)
+        for line in slow:
+            print(f"REGRESSION {line}")
+        failed = failed or bool(slow)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
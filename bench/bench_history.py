@@ -0,0 +1,50 @@
+"""เทียบดึงราคาย้อนหลังเต็มทุกครั้ง กับ HistoryStore (โหลดครั้งแรกเต็ม แล้วดึงเฉพาะแท่งใหม่)
+
+รัน: python -m bench.bench_history
+"""
+import tempfile
+import time
+
+from bench import fake_yfinance
+fake_yfinance.install()
+
+import pandas as pd
+
+from core.history import HistoryStore, download_bars
+
+TICKERS = [f"T{i:03d}" for i in range(40)]
+
+
+def main(latency=0.3):
+    fake_yfinance.reset(latency=latency)
+    t0 = time.perf_counter()
+    for t in TICKERS:  # แบบไม่มีคลัง: ทุกตัวดึงเต็มเส้นใหม่ทุกครั้ง
+        download_bars([t])
+    legacy = time.perf_counter() - t0
+
+    store = HistoryStore(tempfile.mkdtemp())
+    fake_yfinance.reset(latency=latency)
+    t0 = time.perf_counter()
+    store.update(TICKERS)
+    cold = time.perf_counter() - t0
+    cold_calls = fake_yfinance.calls["download"]
+
+    fake_yfinance.TODAY = pd.Timestamp("2026-01-09")  # ผ่านไป 1 สัปดาห์
+    fake_yfinance.reset(latency=latency)
+    t0 = time.perf_counter()
+    store.update(TICKERS, force=True)
+    delta = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    matrix = store.closes(TICKERS, start="2021-01-01", update=False)
+    read = time.perf_counter() - t0
+
+    print(f"legacy full re-download : {legacy*1000:8.1f} ms ({len(TICKERS)} requests)")
+    print(f"store cold load         : {cold*1000:8.1f} ms ({cold_calls} request)")
+    print(f"store weekly delta      : {delta*1000:8.1f} ms ({fake_yfinance.calls['download']} request, "
+          f"{store.stats()['bars_added']} new bars)")
+    print(f"aligned adj-close matrix: {read*1000:8.1f} ms for {matrix.shape[0]} days x {matrix.shape[1]} tickers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""งบเวลา import ตอน cold start: จับด้วย python -X importtime ใน process ใหม่ทุกครั้ง (ไม่มีแคชของ sys.modules)
+
+เช็ค 3 อย่าง แล้ว exit 1 ถ้าข้อไหนไม่ผ่าน (ใช้ใน CI/ก่อน deploy ได้):
+- หน้า login: คำสั่ง import ใน app.py ก่อน `if not check_password(): st.stop()` ต้องมีแค่ streamlit
+- แต่ละ module ใช้เวลา import (ไม่นับตัว interpreter เอง) ไม่เกินงบใน BUDGETS_MS
+- core / cli ต้องไม่พ่วง SDK หนัก (yfinance, plotly, Gemini, gspread, streamlit) มาตั้งแต่ import
+
+    python -m bench.bench_imports
+    python -m bench.bench_imports --budget core.valuation=900 --repeat 5 --json imports.json
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ms (ค่าที่น้อยที่สุดจาก --repeat รอบ) ตั้งเผื่อไว้ ~2 เท่าของที่วัดได้บนเครื่อง dev
+BUDGETS_MS = {
+    "streamlit": 2500,           # ข้ามถ้าไม่ได้ติดตั้ง (ตัวเดียวที่ยอมให้ import ไม่ได้)
+    "core.portfolios": 50,
+    "core.quotes": 150,
+    "core.rebalance": 400,
+    "core.snowball": 400,
+    "core.ledger": 1200,
+    "core.valuation": 1200,
+    "core.performance": 1200,
+    "core.household": 1300,
+    "cli": 1300,
+}
+HEAVY = ("yfinance", "plotly", "google.generativeai", "gspread", "oauth2client", "streamlit")
+LOGIN_IMPORTS = {"streamlit"}
+OPTIONAL = {"streamlit"}   # เครื่อง CI ที่รันแค่ core/cli อาจไม่ได้ติดตั้ง
+
+
+def _importtime(statement):
+    """[(module, self_us, cumulative_us, depth)] จาก -X importtime ของ process ใหม่ (import ไม่ได้ raise ImportError)"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        errors = [line for line in out.stderr.splitlines() if not line.startswith("import time:")]
+        raise ImportError(errors[-1] if errors else f"exit {out.returncode}")
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        head, cumulative_us, name = line.split("|")
+        self_us = head.rsplit(":", 1)[1]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # ชั้นบนสุดเว้น 1 ช่อง ลึกลงไปทีละ 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(module, startup, repeat):
+    """เวลา import module (ms, ค่าน้อยสุด) และรายชื่อ module ที่ถูกพ่วงมา (import ไม่ได้ raise ImportError)"""
+    best, loaded = None, set()
+    for _ in range(repeat):
+        rows = _importtime(f"import {module}")
+        total = sum(cum for name, _, cum, depth in rows if depth == 0 and name not in startup) / 1000
+        best = total if best is None else min(best, total)
+        loaded = {name for name, *_ in rows} - startup
+    return best, loaded
+
+
+def login_imports(path=os.path.join(ROOT, "app.py")):
+    """module ที่ app.py import ก่อนถึงด่าน login (None = ไม่เจอ `if not check_password(): st.stop()`)"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    found = set()
+    for node in tree.body:
+        if isinstance(node, ast.If) and "check_password" in ast.unparse(node.test) \
+                and isinstance(node.test, ast.UnaryOp) and "st.stop" in ast.unparse(node.body):
+            return found
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            found.add(node.module)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS", help="แก้งบของ module (ใส่ซ้ำได้)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="บันทึกผลเป็น JSON")
+    args = parser.parse_args(argv)
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        name, _, ms = item.partition("=")
+        budgets[name] = float(ms)
+
+    failures = []
+    before_gate = login_imports()
+    if before_gate is None:
+        failures.append("app.py: ไม่เจอด่าน `if not check_password(): st.stop()`")
+    elif before_gate - LOGIN_IMPORTS:
+        failures.append(f"app.py: หน้า login import {sorted(before_gate - LOGIN_IMPORTS)} ก่อนด่าน login")
+    print(f"login screen imports: {sorted(before_gate or [])}")
+
+    startup = {name for name, *_ in _importtime("pass")}
+    results = []
+    print(f"{'module':<18} {'ms':>8} {'budget':>8}  heavy deps")
+    for module, budget in budgets.items():
+        try:
+            ms, loaded = measure(module, startup, args.repeat)
+        except ImportError as e:
+            if module in OPTIONAL:
+                print(f"{module:<18} {'skipped (ไม่ได้ติดตั้ง)':>18}")
+            else:
+                failures.append(f"{module}: import ไม่ได้ ({e})")
+                print(f"{module:<18} {'import ไม่ได้':>18}  ⚠️ {e}")
+            continue
+        heavy = sorted(h for h in HEAVY if h != module and (h in loaded or any(m.startswith(h + ".") for m in loaded)))
+        flag = ""
+        if ms > budget:
+            failures.append(f"{module}: {ms:.0f} ms > งบ {budget:.0f} ms")
+            flag = "  ⚠️ เกินงบ"
+        if heavy and module != "streamlit":
+            failures.append(f"{module}: import พ่วง {', '.join(heavy)}")
+            flag += "  ⚠️ พ่วง SDK หนัก"
+        print(f"{module:<18} {ms:>8.1f} {budget:>8.0f}  {', '.join(heavy) or '-'}{flag}")
+        results.append({"module": module, "ms": round(ms, 1), "budget_ms": budget, "heavy": heavy})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"login_imports": sorted(before_gate or []), "modules": results}, f, ensure_ascii=False, indent=2)
+    for line in failures:
+        print(f"FAIL {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""เทียบ get_news_rss เดิม (ยิงทีละฟีดทุก rerun) กับ NewsFeeds (prefetch พร้อมกัน + 304 + แคช)
+
+รัน: python -m bench.bench_news
+"""
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+
+from bench.fake_http import FakeHTTPServer
+from core.news import NewsFeeds
+
+TICKERS = ["SCHD", "MSFT", "AVGO", "VOO", "QQQ", "VNM"]
+RERUNS = 5
+
+
+def legacy_get_news_rss(base, ticker_symbol):
+    # สำเนาของ get_news_rss เดิม (เปลี่ยนแค่ host)
+    try:
+        url = f"{base}/rss/headline?s={ticker_symbol}"
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        response = requests.get(url, headers=headers, timeout=5)
+        root = ET.fromstring(response.content)
+        return [item.find('title').text for item in root.findall('./channel/item')[:5]]
+    except: return []
+
+
+def main(latency=0.3):
+    with FakeHTTPServer(latency=latency) as server:
+        t0 = time.perf_counter()
+        for i in range(RERUNS):
+            # ผู้ใช้สลับดูข่าวทีละตัว -> ทุก rerun ยิงใหม่หนึ่งฟีด
+            legacy_get_news_rss(server.url, TICKERS[i % len(TICKERS)])
+        legacy = (time.perf_counter() - t0) / RERUNS
+        legacy_calls = len(server.requests)
+
+        server.requests.clear()
+        feeds = NewsFeeds(url_template=server.url + "/rss/headline?s={ticker}", ttl=0.5)
+        t0 = time.perf_counter()
+        feeds.prefetch(TICKERS)
+        feeds.get(TICKERS[0], wait=5)  # rerun แรก: รอเฉพาะฟีดที่กำลังดู
+        first = time.perf_counter() - t0
+        time.sleep(latency * 2)
+
+        t0 = time.perf_counter()
+        for i in range(RERUNS):
+            feeds.prefetch(TICKERS)
+            feeds.get(TICKERS[i % len(TICKERS)])
+        warm = (time.perf_counter() - t0) / RERUNS
+
+        time.sleep(0.6)  # เลย ttl -> revalidate ด้วย ETag
+        feeds.prefetch(TICKERS)
+        time.sleep(latency * 2)
+
+    print(f"legacy : {legacy*1000:7.1f} ms/rerun ({legacy_calls} requests for {RERUNS} reruns)")
+    print(f"feeds  : first rerun {first*1000:7.1f} ms, warm {warm*1000:6.3f} ms/rerun")
+    print(f"         {len(server.requests)} requests total, {server.counters['rss_304']} answered 304, stats={feeds.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""เทียบความเร็ว: ลูป get_price_safe ทีละตัว (แบบเดิม) vs fetch_quotes แบบ bulk
+
+รัน: python -m bench.bench_quotes
+"""
+import time
+
+from bench import fake_yfinance
+
+fake_yfinance.install()
+import yfinance as yf  # noqa: E402  (ตัวปลอมจาก fake_yfinance)
+from core.quotes import fetch_quotes, FX_THB  # noqa: E402
+
+
+def legacy_price(ticker_symbol):
+    # สำเนาของ get_price_safe เดิมก่อนมี quote engine
+    try:
+        stock = yf.Ticker(ticker_symbol)
+        price = stock.fast_info['last_price']
+        if price and price > 0: return price
+        hist = stock.history(period="1d")
+        return hist['Close'].iloc[-1] if not hist.empty else 0
+    except: return 0
+
+
+def legacy_loop(tickers):
+    prices = {t: legacy_price(t) for t in tickers}
+    rate = legacy_price(FX_THB)
+    return prices, rate
+
+
+def run(n_tickers, latency, failing_ratio=0.1):
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    failing = tickers[:int(n_tickers * failing_ratio)]
+
+    fake_yfinance.reset(latency, failing)
+    t0 = time.perf_counter()
+    legacy_loop(tickers)
+    t_legacy = time.perf_counter() - t0
+    legacy_calls = sum(fake_yfinance.calls.values())
+
+    fake_yfinance.reset(latency, failing)
+    t0 = time.perf_counter()
+    fetch_quotes(tickers)
+    t_bulk = time.perf_counter() - t0
+    bulk_calls = sum(fake_yfinance.calls.values())
+
+    print(f"{n_tickers:>4} tickers | legacy {t_legacy*1000:8.1f} ms ({legacy_calls:3d} calls) "
+          f"| bulk {t_bulk*1000:8.1f} ms ({bulk_calls:3d} calls) | x{t_legacy/t_bulk:5.1f}")
+
+
+if __name__ == "__main__":
+    for n in (3, 10, 30, 100):
+        run(n, latency=0.02)
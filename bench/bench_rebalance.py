@@ -0,0 +1,64 @@
+"""เทียบลูป Smart Rebalancing เดิม (greedy ตามลำดับ dict) กับ core.rebalance แบบเวกเตอร์
+
+วัดเวลา, เงินเหลือ และ drift (ระยะ L2 ระหว่างสัดส่วนหลังซื้อกับเป้า)
+รัน: python -m bench.bench_rebalance
+"""
+import time
+
+import numpy as np
+
+from core.rebalance import compute_buys
+
+
+def legacy_buys(prices, holdings, targets, budget, whole_shares):
+    # สำเนาลูปเดิมใน tab_calc (ตัดส่วนสร้างข้อความออก)
+    shares = np.zeros(len(prices))
+    total_target = (holdings * prices).sum() + budget
+    spent = 0.0
+    for i in range(len(prices)):
+        price = prices[i]
+        if price > 0:
+            shortfall = total_target * targets[i] - holdings[i] * price
+            if shortfall > 0:
+                amount = min(shortfall, budget - spent)
+                if amount > price * 0.1:
+                    shares[i] = int(amount / price) if whole_shares else round(amount / price, 4)
+            spent += shares[i] * price
+    return shares
+
+
+def score(shares, prices, holdings, targets, budget):
+    value = (holdings + shares) * prices
+    spent = (shares * prices).sum()
+    drift = np.sqrt(((value / value.sum() - targets) ** 2).sum())
+    return budget - spent, drift
+
+
+def run(n, whole_shares, repeat=20, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = rng.uniform(5, 400, n)
+    targets = rng.dirichlet(np.ones(n))
+    # พอร์ตที่ DCA มาสักพัก: มูลค่าเดิม ~20 เท่าของงบเดือนนี้ และถือไม่ตรงเป้า
+    budget = 10000.0 * max(1, n // 10)
+    holdings = np.floor(budget * 20 * rng.dirichlet(np.ones(n)) / prices)
+
+    results = {}
+    for name, fn in (("legacy", lambda: legacy_buys(prices, holdings, targets, budget, whole_shares)),
+                     ("numpy", lambda: compute_buys(prices, holdings, targets, budget, whole_shares)[0])):
+        t0 = time.perf_counter()
+        for _ in range(repeat): shares = fn()
+        elapsed = (time.perf_counter() - t0) / repeat
+        left, drift = score(shares, prices, holdings, targets, budget)
+        results[name] = (elapsed, left / budget, drift)
+
+    kind = "whole" if whole_shares else "fract"
+    line = f"{n:>5} assets {kind} |"
+    for name, (elapsed, left, drift) in results.items():
+        line += f" {name}: {elapsed*1000:7.2f} ms, cash left {left:6.2%}, drift {drift:.4f} |"
+    print(line)
+
+
+if __name__ == "__main__":
+    for whole in (False, True):
+        for n in (3, 10, 100, 500):
+            run(n, whole)
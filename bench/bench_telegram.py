@@ -0,0 +1,62 @@
+"""เทียบ send_telegram_msg เดิม (requests.post ใน click handler) กับ TelegramDispatcher (เข้าคิวแล้วส่งเบื้องหลัง)
+
+รัน: python -m bench.bench_telegram
+"""
+import os
+import tempfile
+import time
+
+import requests
+
+from bench.fake_http import FakeHTTPServer
+from core.notify import TelegramDispatcher
+
+MESSAGES = 5
+
+
+def legacy_send(base, message):
+    # สำเนาของ send_telegram_msg เดิม (เปลี่ยนแค่ host, ไม่มี st.error)
+    url = f"{base}/botTOKEN/sendMessage"
+    response = requests.post(url, json={"chat_id": "chat", "text": message, "parse_mode": "Markdown"})
+    return response.status_code == 200
+
+
+def wait_idle(bot, limit=30):
+    t0 = time.perf_counter()
+    while bot.status()["pending"] and time.perf_counter() - t0 < limit:
+        time.sleep(0.05)
+
+
+def main(latency=0.5):
+    with FakeHTTPServer(latency=latency) as server:
+        t0 = time.perf_counter()
+        for i in range(MESSAGES):
+            legacy_send(server.url, f"plan {i}")
+        legacy = (time.perf_counter() - t0) / MESSAGES
+        legacy_posts = len(server.telegram_messages)
+
+        server.telegram_messages.clear()
+        bot = TelegramDispatcher(os.path.join(tempfile.mkdtemp(), "notify.sqlite3"), "TOKEN", "chat",
+                                 api_base=server.url, coalesce_window=0.3, base_delay=0.2)
+        t0 = time.perf_counter()
+        for i in range(MESSAGES):
+            bot.enqueue(f"plan {i}")
+        queued = (time.perf_counter() - t0) / MESSAGES
+        wait_idle(bot)
+        coalesced_posts = len(server.telegram_messages)
+
+        # Telegram ตอบ 429 แล้ว 500 ก่อนจะผ่าน: ต้องไม่ทิ้งข้อความ
+        server.telegram_failures = [429, 500]
+        server.telegram_retry_after = 0.5
+        t0 = time.perf_counter()
+        bot.enqueue("after outage")
+        wait_idle(bot)
+        recovered = time.perf_counter() - t0
+
+    print(f"legacy     : {legacy*1000:7.1f} ms blocked per save, {legacy_posts} posts for {MESSAGES} messages")
+    print(f"dispatcher : {queued*1000:7.3f} ms blocked per save, {coalesced_posts} post(s) for {MESSAGES} messages")
+    print(f"retry      : delivered after 429 + 500 in {recovered:.1f} s, status={bot.status()}")
+
+
+if __name__ == "__main__":
+    main()
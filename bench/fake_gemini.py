@@ -0,0 +1,53 @@
+"""GenerativeModel ปลอม: ตอบช้าแบบ Gemini (รอก่อนได้ token แรก แล้วทยอยส่งทีละ chunk)
+
+install(model) แทนที่ `google.generativeai` ใน sys.modules ให้ GenerativeModel(...) คืน model ตัวนี้
+ถ้ามี namespace package `google` จริงอยู่ (เช่น google.protobuf ที่ streamlit ใช้) จะเติมเข้าไปในตัวนั้น ไม่บังทิ้ง
+"""
+import importlib
+import sys
+import time
+import types
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, model_name="fake", first_token=1.0, per_chunk=0.05, chunks=20):
+        self.model_name = model_name
+        self.first_token = first_token
+        self.per_chunk = per_chunk
+        self.chunks = chunks
+        self.calls = 0
+
+    def _pieces(self, prompt):
+        return [f"ส่วนที่ {i} ของบทวิเคราะห์ ({len(prompt)} chars)\n" for i in range(self.chunks)]
+
+    def _stream(self, prompt):
+        time.sleep(self.first_token)
+        for piece in self._pieces(prompt):
+            yield _Chunk(piece)
+            time.sleep(self.per_chunk)
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if stream:
+            return self._stream(prompt)
+        time.sleep(self.first_token + self.per_chunk * self.chunks)
+        return _Chunk("".join(self._pieces(prompt)))
+
+
+def install(model):
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = lambda name: model
+    try:
+        google = importlib.import_module("google")
+    except ImportError:
+        google = sys.modules["google"] = types.ModuleType("google")
+        google.__path__ = []
+    google.generativeai = genai
+    sys.modules["google.generativeai"] = genai
+    return genai
@@ -0,0 +1,104 @@
+"""gspread ปลอมแบบ in-memory: worksheet ที่มีแค่เมธอดที่แอปใช้ และนับจำนวน API call
+
+install(ws) แทนที่ `gspread` และ `oauth2client.service_account` ใน sys.modules ให้ทุกไฟล์ชีตเปิดได้ ws ตัวนี้
+"""
+import re
+import sys
+import time
+import types
+
+HEADER = ["Date", "User", "Ticker", "Shares", "Price", "Total_THB", "Note"]
+
+
+def _row_of(a1):
+    m = re.match(r"[A-Z]+(\d+)", a1)
+    return int(m.group(1)) if m else None
+
+
+class FakeWorksheet:
+    def __init__(self, rows=(), header=HEADER, latency=0.0, title="Sheet1"):
+        self.title = title
+        self.latency = latency
+        self.values = [list(header)] + [list(r) for r in rows]
+        self.calls = {"get_values": 0, "get_all_records": 0, "append_row": 0, "append_rows": 0}
+        self.cells_read = 0
+
+    def _request(self, kind):
+        self.calls[kind] += 1
+        if self.latency: time.sleep(self.latency)
+
+    def get_values(self, range_name=None):
+        self._request("get_values")
+        if range_name is None:
+            out = self.values
+        else:
+            start = _row_of(range_name.split(":")[0]) or 1
+            out = self.values[start - 1:]
+        out = [[str(v) for v in r] for r in out]
+        self.cells_read += sum(len(r) for r in out)
+        return out
+
+    def get_all_records(self):
+        self._request("get_all_records")
+        header, rows = self.values[0], self.values[1:]
+        self.cells_read += sum(len(r) for r in self.values)
+        return [dict(zip(header, r)) for r in rows]
+
+    def _append(self, rows):
+        first = len(self.values) + 1
+        self.values.extend(list(r) for r in rows)
+        last = len(self.values)
+        return {"updates": {"updatedRange": f"{self.title}!A{first}:G{last}", "updatedRows": len(rows)}}
+
+    def append_row(self, row, **kwargs):
+        self._request("append_row")
+        return self._append([row])
+
+    def append_rows(self, rows, **kwargs):
+        self._request("append_rows")
+        return self._append(rows)
+
+
+class _Spreadsheet:
+    def __init__(self, ws):
+        self.ws = ws
+
+    def get_worksheet(self, index):
+        return self.ws
+
+    @property
+    def sheet1(self):
+        return self.ws
+
+
+class FakeClient:
+    def __init__(self, ws):
+        self.ws = ws
+        self.opens = 0
+
+    def open(self, name):
+        self.opens += 1
+        return _Spreadsheet(self.ws)
+
+
+def install(ws):
+    gspread = types.ModuleType("gspread")
+    gspread.authorize = lambda creds: FakeClient(ws)
+    creds = types.ModuleType("oauth2client.service_account")
+    creds.ServiceAccountCredentials = types.SimpleNamespace(from_json_keyfile_dict=lambda info, scope: object())
+    sys.modules["gspread"] = gspread
+    sys.modules.setdefault("oauth2client", types.ModuleType("oauth2client")).service_account = creds
+    sys.modules["oauth2client.service_account"] = creds
+    return gspread
+
+
+def seed_rows(n, users=("มินทร์", "ฟิวส์", "Test"), tickers=("SCHD", "MSFT", "AVGO", "VOO", "QQQ", "PTT.BK")):
+    """สร้างแถว ledger ปลอม n แถว (วันที่ไล่ทีละวัน)"""
+    rows = []
+    for i in range(n):
+        day = time.strftime("%Y-%m-%d", time.gmtime(1_600_000_000 + i * 86400))
+        price = 10.0 + i % 90
+        shares = 1.0 + i % 5
+        rows.append([f"{day} 09:00:00", users[i % len(users)], tickers[i % len(tickers)],
+                     shares, price, round(shares * price * 34.5, 2), "seed"])
+    return rows
@@ -0,0 +1,89 @@
+"""HTTP server ในเครื่องแทน Yahoo RSS และ Telegram Bot API สำหรับ benchmark
+
+    with FakeHTTPServer(latency=0.2) as server:
+        feeds = NewsFeeds(url_template=server.url + "/rss/headline?s={ticker}")
+        bot = TelegramDispatcher(path, "TOKEN", "chat", api_base=server.url)
+        server.telegram_failures = [429, 500]  # 2 ครั้งแรกตอบ error ตามนี้ แล้วค่อยผ่าน
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RSS_TEMPLATE = """<?xml version="1.0"?><rss version="2.0"><channel><title>{ticker}</title>{items}</channel></rss>"""
+ITEM_TEMPLATE = "<item><title>{ticker} headline {i}</title><link>https://example.com/{ticker}/{i}</link><pubDate>Fri, 02 Jan 2026 09:0{i}:00 +0000</pubDate></item>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for k, v in headers: self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body: self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server.owner
+        server.record(self.path)
+        time.sleep(server.latency)
+        url = urlparse(self.path)
+        if url.path == "/rss/headline":
+            ticker = parse_qs(url.query).get("s", [""])[0]
+            etag = f'"{ticker}-v{server.feed_version}"'
+            if self.headers.get("If-None-Match") == etag:
+                server.counters["rss_304"] += 1
+                return self._send(304, headers=[("ETag", etag)])
+            items = "".join(ITEM_TEMPLATE.format(ticker=ticker, i=i) for i in range(8))
+            body = RSS_TEMPLATE.format(ticker=ticker, items=items).encode()
+            return self._send(200, body, [("ETag", etag), ("Content-Type", "application/rss+xml")])
+        self._send(404)
+
+    def do_POST(self):
+        server = self.server.owner
+        server.record(self.path)
+        time.sleep(server.latency)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/bot") and self.path.endswith("/sendMessage"):
+            status = server.telegram_failures.pop(0) if server.telegram_failures else 200
+            if status == 200:
+                server.telegram_messages.append(json.loads(body))
+                reply = {"ok": True, "result": {"message_id": len(server.telegram_messages)}}
+            elif status == 429:
+                reply = {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                         "parameters": {"retry_after": server.telegram_retry_after}}
+            else:
+                reply = {"ok": False, "error_code": status, "description": "Fake error"}
+            return self._send(status, json.dumps(reply).encode(), [("Content-Type", "application/json")])
+        self._send(404)
+
+
+class FakeHTTPServer:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.feed_version = 1
+        self.requests = []
+        self.counters = {"rss_304": 0}
+        self.telegram_messages = []
+        self.telegram_failures = []
+        self.telegram_retry_after = 1
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def record(self, path):
+        with self._lock:
+            self.requests.append(path)
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,118 @@
+"""yfinance ปลอมสำหรับ benchmark: ตอบราคาแบบ deterministic และหน่วงเวลาเหมือนยิง HTTP จริง
+
+ใช้ install() เพื่อแทนที่ `yfinance` ใน sys.modules ก่อน import โค้ดของแอป
+"""
+import sys
+import time
+import types
+import zlib
+
+import numpy as np
+import pandas as pd
+
+TODAY = pd.Timestamp("2026-01-02")   # เลื่อนได้เพื่อจำลองว่ามีแท่งราคาใหม่
+LATENCY = 0.05        # วินาทีต่อ 1 HTTP request
+FAILING = set()       # ticker ที่จะดึงราคาไม่ได้
+calls = {"download": 0, "fast_info": 0, "history": 0, "info": 0, "statements": 0}
+
+
+def price_of(symbol):
+    if symbol == "THB=X":
+        return 34.25
+    return 10 + zlib.crc32(symbol.encode()) % 500
+
+
+def _request(kind):
+    calls[kind] += 1
+    time.sleep(LATENCY)
+
+
+def reset(latency=0.05, failing=()):
+    global LATENCY
+    LATENCY = latency
+    FAILING.clear()
+    FAILING.update(failing)
+    for k in calls: calls[k] = 0
+
+
+def daily_bars(symbol, start=None):
+    """แท่งราคารายวันจำลอง (random walk ที่ได้ค่าเดิมทุกครั้ง + ปันผลทุกไตรมาส) ตั้งแต่ 2015 ถึง TODAY"""
+    dates = pd.date_range("2015-01-01", TODAY)
+    dates = dates[dates.dayofweek < 5]  # เร็วกว่า bdate_range มาก
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    close = price_of(symbol) * np.exp(np.cumsum(rng.normal(0.0003, 0.012, len(dates))))
+    dividends = np.where((dates.month % 3 == 0) & (dates.day <= 7) & (dates.dayofweek == 0), close * 0.005, 0.0)
+    df = pd.DataFrame({"Open": close * 0.998, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                       "Adj Close": close, "Volume": 1e6, "Dividends": dividends, "Stock Splits": 0.0}, index=dates)
+    return df.loc[pd.Timestamp(start):] if start else df
+
+
+def download(tickers, period="5d", interval="1d", start=None, **kwargs):
+    _request("download")
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+    if interval == "1d" and (start or period == "max"):  # ราคาย้อนหลังสำหรับ HistoryStore
+        frames = {s: daily_bars(s, start) for s in symbols if s not in FAILING}
+        if not frames:
+            return pd.DataFrame()
+        data = pd.concat(frames, axis=1).swaplevel(0, 1, axis=1)
+        return data.sort_index(axis=1, level=0)
+    dates = pd.date_range(end=pd.Timestamp("2026-01-02"), periods=3, freq="D")
+    cols = pd.MultiIndex.from_product([["Close", "Open"], symbols])
+    data = {}
+    for field, s in cols:
+        data[(field, s)] = [float("nan") if s in FAILING else price_of(s)] * len(dates)
+    return pd.DataFrame(data, index=dates, columns=cols)
+
+
+class _FastInfo(dict):
+    def __init__(self, symbol):
+        _request("fast_info")
+        super().__init__(last_price=None if symbol in FAILING else price_of(symbol))
+
+
+class Ticker:
+    def __init__(self, symbol):
+        self.ticker = symbol
+
+    @property
+    def fast_info(self):
+        return _FastInfo(self.ticker)
+
+    def history(self, period="1d", **kwargs):
+        _request("history")
+        if self.ticker in FAILING:
+            return pd.DataFrame()
+        return pd.DataFrame({"Close": [price_of(self.ticker)]}, index=[pd.Timestamp("2026-01-02")])
+
+    @property
+    def info(self):
+        _request("info")
+        return {"dividendRate": price_of(self.ticker) * 0.03, "currency": "THB" if self.ticker.endswith(".BK") else "USD"}
+
+    def _statement(self, rows):
+        """งบรายปีจำลอง 4 งวด (คอลัมน์ = วันปิดงวด ใหม่สุดก่อน) ตัวเลขคงที่ต่อ ticker"""
+        _request("statements")
+        periods = pd.to_datetime([f"{TODAY.year - i}-06-30" for i in range(1, 5)])
+        base = price_of(self.ticker) * 1e6
+        return pd.DataFrame([[base * (i + 1) * (1 - 0.05 * j) for j in range(len(periods))] for i in range(len(rows))],
+                            index=rows, columns=periods)
+
+    @property
+    def balance_sheet(self):
+        return self._statement(["Total Assets", "Total Debt", "Stockholders Equity"])
+
+    @property
+    def income_stmt(self):
+        return self._statement(["Total Revenue", "Operating Income", "Net Income"])
+
+    @property
+    def cashflow(self):
+        return self._statement(["Operating Cash Flow", "Capital Expenditure", "Free Cash Flow"])
+
+
+def install():
+    mod = types.ModuleType("yfinance")
+    for name in ("download", "Ticker"):
+        setattr(mod, name, globals()[name])
+    sys.modules["yfinance"] = mod
+    return mod
@@ -0,0 +1,151 @@
+"""AP Wealth OS แบบไม่ต้องเปิดเว็บ: คำนวณแผน DCA ของทุกคน (หรือบางคน) ในรอบเดียว เหมาะกับ cron รายเดือน
+
+    python cli.py                                  # แผนของทุกคน งบคนละ 10,000 บาท แสดงเป็นข้อความ
+    python cli.py --users มินทร์ ฟิวส์ --budget 15000 --format csv --out plan.csv
+    python cli.py --budget-for มินทร์=20000 --save --notify   # บันทึกลงชีต + แจ้ง Telegram
+
+ราคาทุกตัวของทุกคน + ค่าเงินดึงใน yf.download ครั้งเดียว จำนวนหุ้นที่ถืออยู่อ่านจาก ledger replica
+(sync แถวใหม่จากชีตก่อน เว้นแต่ --offline) secrets อ่านจาก .streamlit/secrets.toml แบบเดียวกับหน้าเว็บ
+ไม่ import streamlit / plotly / google.generativeai
+"""
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from core.config import data_path, load_secrets
+from core.gsheets import SheetsPool, authorize_service_account
+from core.ledger import LedgerReplica
+from core.portfolios import FAMILY_PORTFOLIOS
+from core.quotes import FX_THB, fetch_quotes
+from core.rebalance import build_plan, ledger_rows, telegram_message
+from core.valuation import FALLBACK_FX
+
+CSV_COLUMNS = {"หุ้น": "Ticker", "สถานะ": "Status", "ราคา": "Price", "จำนวน": "Shares", "รวม (บาท)": "Total_THB"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="คำนวณแผน Smart Rebalancing ของ FAMILY_PORTFOLIOS")
+    parser.add_argument("--users", nargs="+", choices=list(FAMILY_PORTFOLIOS), help="เฉพาะบางคน (ค่าเริ่มต้น: ทุกคน)")
+    parser.add_argument("--budget", type=float, default=10000, help="งบต่อคน (บาท)")
+    parser.add_argument("--budget-for", action="append", default=[], metavar="ชื่อ=บาท", help="งบเฉพาะคน (ใส่ซ้ำได้)")
+    parser.add_argument("--fx", type=float, help="เรทบาท/$ (ค่าเริ่มต้น: ดึงจากตลาด)")
+    parser.add_argument("--format", choices=("text", "csv", "json"), default="text")
+    parser.add_argument("--out", help="เขียนผลลงไฟล์แทน stdout")
+    parser.add_argument("--save", action="store_true", help="ต่อท้ายแผนลงชีต AP_Wealth_DB")
+    parser.add_argument("--notify", action="store_true", help="ส่งสรุปเข้า Telegram")
+    parser.add_argument("--offline", action="store_true", help="ไม่ sync ledger จากชีต ใช้ replica ในเครื่อง")
+    parser.add_argument("--secrets", help="path ของ secrets.toml")
+    parser.add_argument("--timeout", type=float, default=120, help="รอส่งชีต/Telegram ได้นานสุดกี่วินาที")
+    return parser.parse_args(argv)
+
+
+def budgets_for(args, users):
+    budgets = {u: args.budget for u in users}
+    for item in args.budget_for:
+        name, _, amount = item.partition("=")
+        if name not in budgets:
+            raise SystemExit(f"--budget-for: ไม่รู้จัก {name!r}")
+        try:
+            budgets[name] = float(amount)
+        except ValueError:
+            raise SystemExit(f"--budget-for: งบของ {name!r} ต้องเป็นตัวเลข (ได้ {amount!r})")
+        if budgets[name] < 0:
+            raise SystemExit(f"--budget-for: งบของ {name!r} ติดลบไม่ได้")
+    return budgets
+
+
+def open_ledger(secrets):
+    pool = SheetsPool(lambda: authorize_service_account(dict(secrets["gcp_service_account"])))
+    return LedgerReplica(data_path("ledger.sqlite3"), open_sheet=lambda: pool.worksheet("AP_Wealth_DB"))
+
+
+def make_plans(users, budgets, holdings, fx_override=None):
+    """แผนของทุกคนจากราคาชุดเดียว (หุ้นที่หลายคนถือดึงราคาครั้งเดียว) คืน (plans, ตัวที่ไม่มีราคา)"""
+    tickers = list(dict.fromkeys(t for u in users for t in FAMILY_PORTFOLIOS[u]['assets']))
+    quotes = fetch_quotes(tickers, fx_pairs=(FX_THB,))
+    rate = fx_override or quotes.get(FX_THB) or FALLBACK_FX["USD"]
+    prices = {t: quotes.get(t) or 0 for t in tickers}
+    plans = []
+    for user in users:
+        held = holdings[holdings['User'] == user] if 'User' in holdings.columns else holdings.iloc[0:0]
+        existing = dict(held[['Ticker', 'Shares']].itertuples(index=False))
+        plans.append(build_plan(user, FAMILY_PORTFOLIOS[user], budgets[user], prices, round(rate, 2), existing))
+    return plans, [t for t in tickers if not prices[t]]
+
+
+def render(plans, fmt):
+    if fmt == "json":
+        return json.dumps(plans, ensure_ascii=False, indent=2)
+    if fmt == "csv":
+        rows = [{"User": p['user_name'], "Currency": p['currency'], "Exchange_Rate": p['exchange_rate'],
+                 **{CSV_COLUMNS[k]: v for k, v in item.items() if k in CSV_COLUMNS},
+                 "Total_Currency": item[f"รวม ({p['currency']})"]}
+                for p in plans for item in p['plan_data']]
+        columns = ["User", "Ticker", "Status", "Price", "Shares", "Currency", "Total_Currency", "Exchange_Rate", "Total_THB"]
+        return pd.DataFrame(rows, columns=columns).to_csv(index=False, float_format="%.4f")
+    return "\n\n".join(p['line_summary'] for p in plans)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    users = args.users or list(FAMILY_PORTFOLIOS)
+    budgets = budgets_for(args, users)
+    secrets = load_secrets(args.secrets) if (args.save or args.notify or not args.offline) else {}
+    if args.notify:
+        missing = [k for k in ("TELEGRAM_TOKEN", "TELEGRAM_CHAT_ID") if not secrets.get(k)]
+        if missing:
+            raise SystemExit(f"--notify ต้องมี {' และ '.join(missing)} ใน secrets")
+
+    ledger = None
+    if "gcp_service_account" in secrets or args.offline:
+        ledger = open_ledger(secrets)
+        if not args.offline:
+            try:
+                ledger.sync(force=True)
+            except Exception as e:
+                print(f"⚠️ sync ledger ไม่ได้ ใช้ replica เดิม: {e}", file=sys.stderr)
+    else:
+        print("⚠️ ไม่พบ gcp_service_account ใน secrets: คำนวณเหมือนยังไม่เคยถือหุ้น", file=sys.stderr)
+    holdings = ledger.holdings() if ledger is not None else pd.DataFrame(columns=["User", "Ticker", "Shares"])
+
+    plans, missing = make_plans(users, budgets, holdings, args.fx)
+    if missing:
+        print(f"⚠️ ดึงราคาไม่ได้: {', '.join(missing)} (ไม่ถูกซื้อในแผนนี้)", file=sys.stderr)
+
+    output = render(plans, args.format)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    ok = True
+    if args.save:
+        if ledger is None:
+            raise SystemExit("--save ต้องมี gcp_service_account ใน secrets")
+        from core.sheet_writer import SheetWriter
+        writer = SheetWriter(ledger)
+        jobs = [writer.enqueue(ledger_rows(plan)) for plan in plans if plan['plan_data']]
+        ok &= writer.drain(args.timeout, ids=jobs)
+        status = writer.status()
+        print(f"📤 บันทึกลงชีต: ค้าง {status['pending']} แผน" + (f" ({status['last_error']})" if status['last_error'] else ""),
+              file=sys.stderr)
+    if args.notify:
+        from core.notify import TelegramDispatcher
+        bot = TelegramDispatcher(data_path("notify.sqlite3"), secrets["TELEGRAM_TOKEN"], secrets["TELEGRAM_CHAT_ID"],
+                                 coalesce_window=0)
+        messages = [bot.enqueue(telegram_message(plan) if args.save else plan['line_summary'])
+                    for plan in plans if plan['plan_data']]
+        ok &= bot.drain(args.timeout, ids=messages)
+        # นับเฉพาะข้อความของรอบนี้ (notify.sqlite3 ใช้ร่วมกับหน้าเว็บ ของที่ล้มเหลวเก่าๆ ไม่เกี่ยว)
+        sent = list(bot.statuses(messages).values())
+        ok &= all(s == "sent" for s in sent)
+        print(f"✈️ Telegram: ส่งแล้ว {sent.count('sent')} ค้าง {len(sent) - sent.count('sent') - sent.count('failed')} ล้มเหลว {sent.count('failed')}",
+              file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""AP Wealth OS core: ส่วนคำนวณ/ดึงข้อมูลที่ไม่ผูกกับ Streamlit"""
@@ -0,0 +1,107 @@
+"""คิววิเคราะห์ AI ทั้งพอร์ตเบื้องหลัง: ทำ financial summary + ถาม Gemini ทีละหลายตัว
+
+- จำกัดจำนวนงานพร้อมกัน (max_workers) และอัตราเรียก Gemini (token bucket ต่อนาที)
+- ผลลัพธ์เก็บลง SQLite แท็บ AI เปิดมาเห็นรายงานที่เสร็จแล้วทันที และเห็นความคืบหน้าของที่เหลือ
+  รายงานหมดอายุตาม ttl (ให้เท่ากับแคชของ GeminiAnalyst) ส่งเข้าคิวรอบหน้าจะวิเคราะห์ใหม่
+- force: ถาม Gemini ใหม่จริงๆ ไม่เอาคำตอบจากแคช (จำไว้ในตาราง งานที่ค้างตอนปิดแอปก็ยัง force อยู่)
+- งานที่ค้างตอนแอปปิด จะถูกส่งเข้าคิวใหม่ตอนเปิด
+"""
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.ratelimit import TokenBucket
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    ticker TEXT PRIMARY KEY,
+    status TEXT NOT NULL,          -- queued / running / done / no_data / error
+    report TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    force INTEGER NOT NULL DEFAULT 0
+);
+"""
+# ตารางที่สร้างก่อนมี force
+MIGRATIONS = {"force": "ALTER TABLE ai_jobs ADD COLUMN force INTEGER NOT NULL DEFAULT 0"}
+
+
+class AnalysisQueue:
+    def __init__(self, db_path, summarize, analyze, max_workers=2, rate_per_minute=10, ttl=None):
+        """summarize(ticker) -> ข้อความงบ หรือ None
+        analyze(ticker, text, force=False) -> รายงาน (เช่น GeminiAnalyst.analyze)
+        ttl: อายุรายงานที่เสร็จแล้ว (วินาที, None = ไม่หมดอายุ)
+        """
+        self.db_path = db_path
+        self.summarize = summarize
+        self.analyze = analyze
+        self.ttl = ttl
+        self.bucket = TokenBucket(rate_per_minute / 60.0, capacity=max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+        self._active = set()
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(ai_jobs)")}
+            for column, ddl in MIGRATIONS.items():
+                if column not in columns:
+                    db.execute(ddl)
+            pending = db.execute("SELECT ticker, force FROM ai_jobs WHERE status IN ('queued', 'running')").fetchall()
+        for force in (False, True):
+            self._dispatch([t for t, f in pending if bool(f) == force], force=force)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _set(self, ticker, status, report=None, error=None, force=False):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO ai_jobs (ticker, status, report, error, updated_at, force) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", (ticker, status, report, error, time.time(), int(force)))
+
+    def _run(self, ticker, force=False):
+        try:
+            self._set(ticker, "running", force=force)
+            text = self.summarize(ticker)
+            if not text:
+                self._set(ticker, "no_data")
+                return
+            self.bucket.acquire()  # คุมอัตราเรียก Gemini ไม่ให้โดน quota
+            self._set(ticker, "done", report=self.analyze(ticker, text, force=force))
+        except Exception as e:
+            self._set(ticker, "error", error=str(e)[:500])
+        finally:
+            with self._lock:
+                self._active.discard(ticker)
+
+    def _dispatch(self, tickers, force=False):
+        with self._lock:
+            todo = [t for t in tickers if t not in self._active]
+            self._active.update(todo)
+        for t in todo:
+            self._pool.submit(self._run, t, force)
+
+    def submit(self, tickers, force=False):
+        """ส่งหุ้นเข้าคิว (ตัวที่เสร็จแล้วและยังไม่หมดอายุข้าม เว้นแต่ force) คืนจำนวนที่เข้าคิวจริง"""
+        tickers = list(dict.fromkeys(tickers))
+        done = {t for t, r in self.reports(tickers).items() if r["status"] == "done"}
+        todo = [t for t in tickers if force or t not in done]
+        with self._lock:
+            todo = [t for t in todo if t not in self._active]
+        for t in todo:
+            self._set(t, "queued", force=force)
+        self._dispatch(todo, force=force)
+        return len(todo)
+
+    def reports(self, tickers):
+        """{ticker: {'status', 'report', 'error', 'updated_at'}} (ยังไม่เคยสั่งหรือรายงานหมดอายุแล้วจะไม่มีใน dict)"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        marks = ",".join("?" * len(tickers))
+        with self._connect() as db:
+            rows = db.execute(f"SELECT ticker, status, report, error, updated_at FROM ai_jobs WHERE ticker IN ({marks})",
+                              tickers).fetchall()
+        expired = time.time() - self.ttl if self.ttl is not None else None
+        return {t: {"status": s, "report": r, "error": e, "updated_at": u} for t, s, r, e, u in rows
+                if not (s == "done" and expired is not None and u < expired)}
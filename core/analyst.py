@@ -0,0 +1,132 @@
+"""AI Analyst: ใช้ model handle ตัวเดียวซ้ำ, แคชคำตอบบนดิสก์ และรองรับ streaming
+
+คีย์แคช = sha256 ของ (ชื่อโมเดล, prompt template, ticker, financial_data)
+ข้อมูลงบเหมือนเดิม + prompt เหมือนเดิม = ได้คำตอบเดิมทันทีไม่ต้องรอ Gemini
+แก้ template หรือเปลี่ยนโมเดลเมื่อไหร่ คีย์เปลี่ยนเองอัตโนมัติ
+ไฟล์คำตอบที่เลย TTL ถูกลบทิ้งตอนเริ่ม และทุกครั้งที่เขียนแคช (ไม่เกินชั่วโมงละรอบ) ไม่ให้โฟลเดอร์โตไม่หยุด
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from core.trace import span
+
+MODEL_NAME = 'gemini-2.5-flash'
+DAY = 24 * 3600
+PRUNE_EVERY = 3600
+
+PROMPT_TEMPLATE = """
+        คุณคือ AI นักวิเคราะห์การเงินระดับโลก (CFA Level 3)
+        กรุณาวิเคราะห์ข้อมูลงบการเงินของ {ticker} ต่อไปนี้แบบเจาะลึก:
+        {financial_data}
+        
+        สิ่งที่ต้องการ (ตอบภาษาไทย):
+        1. 📊 สรุปภาพรวม (แข็งแกร่ง/น่าห่วง)
+        2. 📈 แนวโน้มกำไรและรายได้
+        3. 🚩 ความเสี่ยงที่ต้องระวัง
+        4. 🎯 คำแนะนำ (DCA ได้ไหม?)
+        """
+
+
+class GeminiAnalyst:
+    def __init__(self, model_factory, cache_dir, ttl=7 * DAY, model_name=MODEL_NAME, template=PROMPT_TEMPLATE):
+        """model_factory(model_name) -> model ที่มี generate_content (สร้างครั้งแรกครั้งเดียว)"""
+        self.model_factory = model_factory
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.model_name = model_name
+        self.template = template
+        self._model = None
+        self._lock = threading.Lock()
+        self.counters = {"cache_hits": 0, "generations": 0, "streams": 0, "pruned": 0}
+        self._pruned_at = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self.model_factory(self.model_name)
+            return self._model
+
+    def cache_key(self, ticker, financial_data):
+        raw = json.dumps([self.model_name, self.template, ticker, financial_data], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def cached(self, ticker, financial_data):
+        """คำตอบจากแคชที่ยังไม่หมดอายุ (ไม่มีคืน None)"""
+        try:
+            with open(self._path(self.cache_key(ticker, financial_data)), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created_at", 0) >= self.ttl:
+            return None
+        with self._lock:
+            self.counters["cache_hits"] += 1
+        return entry["text"]
+
+    def _store(self, ticker, financial_data, text):
+        path = self._path(self.cache_key(ticker, financial_data))
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "model": self.model_name, "ticker": ticker, "text": text},
+                      f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        if time.time() - self._pruned_at >= PRUNE_EVERY:
+            self.prune()
+
+    def prune(self):
+        """ลบคำตอบที่เลย TTL แล้ว (ดูจากเวลาแก้ไขไฟล์ = เวลาที่เขียนแคช) คืนจำนวนไฟล์ที่ลบ"""
+        now = time.time()
+        self._pruned_at = now
+        removed = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                if now - entry.stat().st_mtime >= self.ttl:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass  # session อื่นลบ/เขียนทับไปพร้อมกัน
+        with self._lock:
+            self.counters["pruned"] += removed
+        return removed
+
+    def prompt(self, ticker, financial_data):
+        return self.template.format(ticker=ticker, financial_data=financial_data)
+
+    def analyze(self, ticker, financial_data, force=False):
+        """คำตอบทั้งก้อน (จากแคชถ้ามี) force=True ถาม Gemini ใหม่แล้วเขียนทับแคช"""
+        text = None if force else self.cached(ticker, financial_data)
+        if text is not None:
+            return text
+        with span("gemini.generate", ticker=ticker):
+            response = self.model.generate_content(self.prompt(ticker, financial_data))
+        with self._lock:
+            self.counters["generations"] += 1
+        self._store(ticker, financial_data, response.text)
+        return response.text
+
+    def stream(self, ticker, financial_data):
+        """generator คืนข้อความทีละช่วงตามที่โมเดลส่งมา (แคชมีแล้วคืนก้อนเดียว) ครบแล้วเก็บลงแคช"""
+        text = self.cached(ticker, financial_data)
+        if text is not None:
+            yield text
+            return
+        with self._lock:
+            self.counters["streams"] += 1
+        parts = []
+        with span("gemini.stream", ticker=ticker) as s:  # นับรวมเวลาที่หน้าเว็บแสดงแต่ละช่วงด้วย
+            for chunk in self.model.generate_content(self.prompt(ticker, financial_data), stream=True):
+                piece = getattr(chunk, "text", "") or ""
+                parts.append(piece)
+                yield piece
+            s.tag(chunks=len(parts))
+        self._store(ticker, financial_data, "".join(parts))
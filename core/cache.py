@@ -0,0 +1,111 @@
+"""แคชกลางระดับ process (ใช้ร่วมกันทุก session ของ Streamlit)
+
+- TTL: ค่าที่อายุไม่เกิน ttl ถือว่าสด ตอบเลย
+- stale-while-revalidate: ค่าที่เก่าแล้วยังตอบทันที แล้วค่อยไปโหลดใหม่เบื้องหลัง
+- last-known-good: ถ้าโหลดใหม่ได้ None/Error จะไม่ทับค่าดีตัวล่าสุด
+- LRU: เกิน maxsize จะเตะตัวที่ไม่ได้ใช้นานสุดออก
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+def ttl_from_env(name, default):
+    """อ่านค่า TTL (วินาที) จาก environment เช่น AP_QUOTE_TTL=30"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return float(default)
+
+
+class TTLCache:
+    def __init__(self, name, ttl, maxsize=1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()   # key -> (value, loaded_at)
+        self._refreshing = set()
+        self._lock = threading.RLock()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0,
+                         "refreshes": 0, "load_errors": 0, "evictions": 0}
+
+    # --- ภายใน ---
+    def _count(self, key, n=1):
+        self.counters[key] += n
+
+    def _store(self, key, value):
+        """เก็บค่าใหม่ (เฉพาะค่าที่ไม่ใช่ None) แล้วเตะตัวเก่าถ้าเกิน maxsize"""
+        if value is None:
+            self._count("load_errors")
+            return
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._count("evictions")
+
+    def _load(self, keys, loader):
+        try:
+            loaded = loader(keys) or {}
+        except Exception:
+            loaded = {}
+        with self._lock:
+            for key in keys:
+                self._store(key, loaded.get(key))
+
+    def _refresh(self, keys, loader):
+        try:
+            self._load(keys, loader)
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keys)
+
+    # --- ใช้งาน ---
+    def get_many(self, keys, loader):
+        """คืน {key: value} โดย loader(list_of_keys) -> dict ใช้โหลดตัวที่ไม่มีในแคช
+
+        ตัวที่ไม่เคยโหลดได้เลยจะคืน None
+        """
+        now = time.monotonic()
+        missing, stale = [], []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    missing.append(key)
+                    self._count("misses")
+                    continue
+                self._data.move_to_end(key)
+                if now - entry[1] < self.ttl:
+                    self._count("hits")
+                else:
+                    self._count("stale_hits")
+                    if key not in self._refreshing:
+                        stale.append(key)
+            self._refreshing.update(stale)
+            if stale: self._count("refreshes")
+
+        if stale:
+            _REFRESH_POOL.submit(self._refresh, stale, loader)
+        if missing:
+            self._load(missing, loader)
+
+        with self._lock:
+            return {key: self._data[key][0] if key in self._data else None for key in keys}
+
+    def get(self, key, loader):
+        """เหมือน get_many แต่ทีละ key โดย loader(key) -> value"""
+        return self.get_many([key], lambda ks: {ks[0]: loader(ks[0])})[key]
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None: self._data.clear()
+            else: self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"name": self.name, "size": len(self._data), "ttl": self.ttl, **self.counters}
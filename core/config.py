@@ -0,0 +1,32 @@
+"""ค่าตั้งต้นที่ใช้ร่วมกันใน core"""
+import os
+
+# โฟลเดอร์เก็บข้อมูล local (replica, แคชบนดิสก์) เปลี่ยนได้ด้วย AP_DATA_DIR
+DATA_DIR = os.environ.get("AP_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".ap_data"))
+
+
+def data_path(*parts):
+    """คืน path ใต้ DATA_DIR (สร้างโฟลเดอร์ให้ถ้ายังไม่มี)"""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def load_secrets(path=None):
+    """อ่าน secrets แบบเดียวกับ st.secrets (.streamlit/secrets.toml) สำหรับงานที่รันนอก Streamlit
+
+    ลำดับ: path ที่ส่งมา -> AP_SECRETS -> .streamlit/secrets.toml ของโปรเจกต์ -> ~/.streamlit/secrets.toml
+    ไม่เจอไฟล์คืน {}
+    """
+    try:
+        import tomllib
+    except ModuleNotFoundError:  # Python < 3.11
+        import tomli as tomllib
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    candidates = [path, os.environ.get("AP_SECRETS"), os.path.join(root, ".streamlit", "secrets.toml"),
+                  os.path.expanduser(os.path.join("~", ".streamlit", "secrets.toml"))]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            with open(candidate, "rb") as f:
+                return tomllib.load(f)
+    return {}
@@ -0,0 +1,89 @@
+"""Pool ของ Google Sheets client: authorize ครั้งเดียวต่อ process แล้วใช้ client/worksheet เดิมซ้ำ
+
+client ของ gspread ถือ HTTP session ตัวเดียว (AuthorizedSession) อยู่แล้ว
+เราแค่ต้องไม่สร้างใหม่ทุกครั้ง และต่ออายุ token เองก่อนมันจะหมด
+"""
+import datetime
+import threading
+
+SCOPES = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+
+def authorize_service_account(creds_dict):
+    """gspread client จาก service account (dict แบบใน secrets ของ Streamlit)"""
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPES)
+    return gspread.authorize(creds)
+
+
+def _credentials_of(client):
+    # gspread 5 เก็บไว้ที่ client.auth, gspread 6 ย้ายไป client.http_client.auth
+    return getattr(client, "auth", None) or getattr(getattr(client, "http_client", None), "auth", None)
+
+
+class SheetsPool:
+    def __init__(self, authorize, refresh_margin=300):
+        """authorize: ฟังก์ชันที่คืน gspread client ใหม่ (เรียกเฉพาะตอนยังไม่มี หรือ token ใช้ต่อไม่ได้)"""
+        self.authorize = authorize
+        self.refresh_margin = refresh_margin
+        self._client = None
+        self._worksheets = {}
+        self._lock = threading.RLock()
+        self.counters = {"auths": 0, "token_refreshes": 0, "client_reuses": 0,
+                         "opens": 0, "worksheet_reuses": 0}
+
+    def _expires_soon(self, creds):
+        expiry = getattr(creds, "expiry", None)  # google-auth: naive UTC
+        if expiry is None:
+            return False
+        left = expiry - datetime.datetime.utcnow()
+        return left.total_seconds() < self.refresh_margin
+
+    def _refresh(self, creds):
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+        self.counters["token_refreshes"] += 1
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self.authorize()
+                self._worksheets.clear()
+                self.counters["auths"] += 1
+                return self._client
+
+            creds = _credentials_of(self._client)
+            if creds is not None and getattr(creds, "token", None) and self._expires_soon(creds):
+                try:
+                    self._refresh(creds)  # ต่ออายุ token ใน session เดิม handle เดิมยังใช้ได้
+                except Exception:
+                    self.invalidate()
+                    return self.client()
+            else:
+                self.counters["client_reuses"] += 1
+            return self._client
+
+    def worksheet(self, spreadsheet, index=0):
+        """worksheet ของไฟล์ spreadsheet (เปิดครั้งแรกครั้งเดียว แล้วใช้ handle เดิม)"""
+        client = self.client()
+        key = (spreadsheet, index)
+        with self._lock:
+            ws = self._worksheets.get(key)
+            if ws is None:
+                ws = client.open(spreadsheet).get_worksheet(index)
+                self._worksheets[key] = ws
+                self.counters["opens"] += 1
+            else:
+                self.counters["worksheet_reuses"] += 1
+            return ws
+
+    def invalidate(self):
+        """ทิ้ง client/handle ทั้งหมด (เช่นโดน 401) รอบหน้าจะ authorize ใหม่"""
+        with self._lock:
+            self._client = None
+            self._worksheets.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
@@ -0,0 +1,261 @@
+"""คลังราคาย้อนหลังรายวัน (OHLCV) บนดิสก์: โหลดครั้งแรกเต็ม หลังจากนั้นดึงเฉพาะแท่งที่ยังไม่มี
+
+    .ap_data/history/manifest.json           {ticker: {first_date, last_date, fetched_at}}
+    .ap_data/history/MSFT.parquet            Open, High, Low, Close, Volume, Dividends, Splits
+
+- ดึงหลายตัวใน yf.download ครั้งเดียว (จัดกลุ่มตามวันที่ต้องเริ่มดึง)
+- ดึงซ้อนย้อนหลัง overlap_days วัน เพื่อทับแท่งล่าสุดที่อาจยังไม่ปิด และเช็คว่าราคาเดิมยังตรง
+  ถ้าไม่ตรงหรือมี split ใหม่ (Yahoo ปรับราคาย้อนหลังทั้งเส้น) จะโหลดตัวนั้นใหม่ทั้งหมด
+- เก็บ Close ดิบ + ปันผล แล้วคำนวณ adjusted close เอง ปันผลใหม่จึงไม่ทำให้ไฟล์เก่าผิด
+"""
+import datetime
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.cache import ttl_from_env
+from core.trace import span
+from core.upstream import YAHOO, load_yfinance
+
+FIELDS = ("Open", "High", "Low", "Close", "Volume", "Dividends", "Splits")
+
+
+def download_bars(symbols, start=None):
+    """ยิง yf.download ครั้งเดียว คืน {symbol: DataFrame[FIELDS]} (start=None = ทั้งหมดเท่าที่มี)"""
+    kwargs = {"start": start.isoformat()} if start is not None else {"period": "max"}
+    with span("yf.history", symbols=len(symbols), full=start is None):
+        data = YAHOO.call(("history", tuple(symbols), start), load_yfinance().download, list(symbols), interval="1d",
+                          group_by="column", auto_adjust=False, actions=True, progress=False, threads=True, **kwargs)
+    if data is None or data.empty:
+        return {}
+    if not isinstance(data.columns, pd.MultiIndex):  # yfinance รุ่นเก่า: ตัวเดียวไม่มีชั้น symbol
+        data = data.set_axis(pd.MultiIndex.from_product([data.columns, [symbols[0]]]), axis=1)  # ไม่แก้ของที่แชร์
+    data = data.rename(columns={"Stock Splits": "Splits"}, level=0)
+
+    bars = {}
+    for symbol in symbols:
+        cols = {f: data[(f, symbol)] for f in FIELDS if (f, symbol) in data.columns}
+        if "Close" not in cols:
+            continue
+        df = pd.DataFrame(cols).dropna(subset=["Close"])
+        if df.empty:
+            continue
+        for f in FIELDS:
+            if f not in df.columns:
+                df[f] = 0.0 if f in ("Dividends", "Splits", "Volume") else df["Close"]
+        df.index = pd.DatetimeIndex(df.index).tz_localize(None).normalize()
+        df.index.name = "Date"
+        bars[symbol] = df[list(FIELDS)].fillna({"Dividends": 0.0, "Splits": 0.0, "Volume": 0.0}).astype(float)
+    return bars
+
+
+def adjusted_close(bars):
+    """adjusted close แบบเดียวกับ Yahoo: ปันผลแต่ละครั้งคูณตัวปรับ (1 - ปันผล / ราคาปิดวันก่อน) ให้ทุกวันก่อนหน้า"""
+    close = bars["Close"].to_numpy(dtype=float)
+    if len(close) < 2:
+        return pd.Series(close, index=bars.index)
+    div = bars["Dividends"].to_numpy(dtype=float)
+    ratio = np.ones_like(close)
+    ratio[1:] = np.where(div[1:] > 0, 1.0 - div[1:] / close[:-1], 1.0)
+    factor = np.ones_like(close)
+    factor[:-1] = np.cumprod(ratio[::-1])[::-1][1:]
+    return pd.Series(close * factor, index=bars.index)
+
+
+def portfolio_monthly_returns(closes, weights):
+    """ผลตอบแทนรายเดือนของพอร์ตตามสัดส่วนเป้า จาก adjusted close รายวัน (ไม่มีข้อมูลคืน None)
+
+    ถ่วงน้ำหนักเฉพาะตัวที่มีข้อมูลในเดือนนั้น (หุ้นที่เพิ่งเข้าตลาดไม่ตัดประวัติทั้งพอร์ตทิ้ง)
+    """
+    if closes is None or closes.empty:
+        return None
+    monthly = closes.resample("ME").last()
+    rets = monthly.pct_change(fill_method=None).iloc[1:]
+    r = rets.to_numpy(dtype=float)
+    w = np.array([weights.get(t, 0.0) for t in rets.columns], dtype=float)
+    active = np.where(np.isnan(r), 0.0, w)
+    total = active.sum(axis=1)
+    ok = total > 0
+    port = (np.nan_to_num(r) * active).sum(axis=1)[ok] / total[ok]
+    return port if len(port) else None
+
+
+class HistoryStore:
+    def __init__(self, root, download=download_bars, ttl=None, overlap_days=7, batch_size=50):
+        self.root = root
+        self.download = download
+        self.ttl = ttl if ttl is not None else ttl_from_env("AP_HISTORY_TTL", 6 * 3600)
+        self.overlap_days = overlap_days
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._frames = {}   # ticker -> (mtime, DataFrame)
+        self.counters = {"requests": 0, "full_loads": 0, "delta_loads": 0, "bars_added": 0, "reloads": 0}
+        os.makedirs(root, exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    # ---------- ไฟล์ ----------
+    def _path(self, ticker):
+        return os.path.join(self.root, ticker.replace("/", "_") + ".parquet")
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.root, "manifest.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        path = os.path.join(self.root, "manifest.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def bars(self, ticker):
+        """แท่งราคารายวันทั้งหมดที่เก็บไว้ (ไม่มีคืน None) อ่านแบบ memory-map และจำไว้จนไฟล์เปลี่ยน"""
+        path = self._path(ticker)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._frames.get(ticker)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        df = pd.read_parquet(path, memory_map=True)
+        self._frames[ticker] = (mtime, df)
+        return df
+
+    def _save(self, ticker, df):
+        path = self._path(ticker)
+        df.to_parquet(path + ".tmp", engine="pyarrow")
+        os.replace(path + ".tmp", path)
+        self._manifest[ticker] = {"first_date": df.index[0].date().isoformat(),
+                                  "last_date": df.index[-1].date().isoformat(), "fetched_at": time.time()}
+
+    # ---------- อัปเดต ----------
+    def _merge(self, ticker, new):
+        """รวมแท่งใหม่เข้ากับของเดิม คืน False ถ้าราคาช่วงที่ซ้อนกันไม่ตรง (ต้องโหลดใหม่ทั้งเส้น)"""
+        old = self.bars(ticker)
+        if old is None or old.empty:
+            self._save(ticker, new)
+            return True
+        overlap = new.index.intersection(old.index)
+        fresh = new.loc[new.index > old.index[-1]]
+        if len(overlap) > 1:
+            # เทียบเฉพาะแท่งที่ปิดแล้ว (แท่งสุดท้ายของเดิมอาจเป็นราคาระหว่างวัน)
+            a = old.loc[overlap[:-1], "Close"].to_numpy()
+            b = new.loc[overlap[:-1], "Close"].to_numpy()
+            if not np.allclose(a, b, rtol=1e-3):
+                return False
+        if (fresh["Splits"] > 0).any():
+            return False
+        merged = pd.concat([old.loc[old.index < new.index[0]], new])
+        self.counters["bars_added"] += len(fresh)
+        self._save(ticker, merged)
+        return True
+
+    def _fetch(self, tickers, start):
+        loaded = {}
+        for i in range(0, len(tickers), self.batch_size):
+            chunk = tickers[i:i + self.batch_size]
+            self.counters["requests"] += 1
+            try:
+                loaded.update(self.download(chunk, start=start))
+            except Exception:
+                pass  # ดึงไม่ได้ใช้ของเดิมไปก่อน รอบหน้าค่อยลองใหม่
+        return loaded
+
+    def update(self, tickers, force=False):
+        """ดึงแท่งที่ยังไม่มีของ tickers (ตัวที่เพิ่งอัปเดตภายใน ttl ข้าม) คืนจำนวนตัวที่อัปเดตได้"""
+        with self._lock:
+            now = time.time()
+            groups = {}   # วันเริ่มดึง -> [ticker] (None = โหลดเต็ม)
+            for t in dict.fromkeys(tickers):
+                entry = self._manifest.get(t)
+                if entry and os.path.exists(self._path(t)):
+                    if not force and now - entry["fetched_at"] < self.ttl:
+                        continue
+                    start = datetime.date.fromisoformat(entry["last_date"]) - datetime.timedelta(days=self.overlap_days)
+                else:
+                    start = None
+                groups.setdefault(start, []).append(t)
+
+            updated, reload = 0, []
+            for start, group in sorted(groups.items(), key=lambda kv: (kv[0] is not None, kv[0] or datetime.date.min)):
+                loaded = self._fetch(group, start)
+                for t in group:
+                    new = loaded.get(t)
+                    if new is None or new.empty:
+                        continue
+                    if start is None:
+                        self.counters["full_loads"] += 1
+                        self._save(t, new)
+                    elif self._merge(t, new):
+                        self.counters["delta_loads"] += 1
+                    else:
+                        reload.append(t)
+                        continue
+                    updated += 1
+            if reload:
+                self.counters["reloads"] += len(reload)
+                loaded = self._fetch(reload, None)
+                for t in reload:
+                    if t in loaded and not loaded[t].empty:
+                        self._save(t, loaded[t])
+                        updated += 1
+            if groups:
+                self._write_manifest()
+            return updated
+
+    # ---------- อ่าน ----------
+    def closes(self, tickers, start=None, end=None, adjusted=True, update=True):
+        """ราคาปิดรายวันของหลายตัวเรียงเป็นตารางเดียว (แถว = วันทำการรวมของทุกตัว, คอลัมน์ = ticker)
+
+        วันที่ตลาดของบางตัวปิด (คนละประเทศ) ใช้ราคาล่าสุดก่อนหน้า ช่วงก่อนมีข้อมูลเป็น NaN
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if update:
+            self.update(tickers)
+        series = {}
+        for t in tickers:
+            df = self.bars(t)
+            if df is None or df.empty:
+                continue
+            series[t] = adjusted_close(df) if adjusted else df["Close"]
+        if not series:
+            return pd.DataFrame(columns=tickers, dtype=float)
+        table = pd.DataFrame(series).sort_index().ffill().reindex(columns=tickers)
+        return table.loc[pd.Timestamp(start) if start else None:pd.Timestamp(end) if end else None]
+
+    def dividends(self, tickers, start=None, end=None, update=True):
+        """เงินปันผลต่อหุ้นในวัน XD ของหลายตัว เรียงแบบเดียวกับ closes (วันที่ไม่มีปันผลเป็น 0)"""
+        tickers = list(dict.fromkeys(tickers))
+        if update:
+            self.update(tickers)
+        series = {t: df["Dividends"] for t in tickers if (df := self.bars(t)) is not None and not df.empty}
+        if not series:
+            return pd.DataFrame(columns=tickers, dtype=float)
+        table = pd.DataFrame(series).sort_index().fillna(0.0).reindex(columns=tickers, fill_value=0.0)
+        return table.loc[pd.Timestamp(start) if start else None:pd.Timestamp(end) if end else None]
+
+    def splits(self, tickers, start=None, end=None, update=True):
+        """อัตราแตกหุ้นในวันที่แตก (เช่น 10 = 1 หุ้นเป็น 10) เรียงแบบเดียวกับ closes วันที่ไม่แตกเป็น 0"""
+        tickers = list(dict.fromkeys(tickers))
+        if update:
+            self.update(tickers)
+        series = {t: df["Splits"] for t in tickers if (df := self.bars(t)) is not None and not df.empty}
+        if not series:
+            return pd.DataFrame(columns=tickers, dtype=float)
+        table = pd.DataFrame(series).sort_index().fillna(0.0).reindex(columns=tickers, fill_value=0.0)
+        return table.loc[pd.Timestamp(start) if start else None:pd.Timestamp(end) if end else None]
+
+    def version(self, tickers):
+        """ตัวบอกว่าราคาของ tickers เปลี่ยนหรือยัง (ใช้เป็น key แคชของผลคำนวณ)"""
+        return tuple((t, self._manifest.get(t, {}).get("last_date"), self._manifest.get(t, {}).get("fetched_at"))
+                     for t in tickers)
+
+    def stats(self):
+        return {**self.counters, "tickers": len(self._manifest)}
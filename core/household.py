@@ -0,0 +1,68 @@
+"""ภาพรวมทั้งครอบครัวในรอบเดียว: อ่าน holdings ของทุกคนครั้งเดียว ดึงราคาทุกตัว (ไม่ซ้ำ) ในคำขอเดียว
+
+หุ้นที่หลายคนถือร่วมกันตีราคาครั้งเดียว แล้วคิดมูลค่า/P&L/ปันผล/ความเบี้ยวจากเป้าของทุกคนพร้อมกันแบบทั้งคอลัมน์
+"""
+import pandas as pd
+
+from core.quotes import get_quotes
+from core.trace import traced
+from core.valuation import dividend_per_share, fx_pairs_for, resolve_currencies, thb_multipliers, value_holdings
+
+
+def all_tickers(portfolios, holdings):
+    """หุ้นทุกตัวของครอบครัว (ตามเป้า + ที่ถืออยู่จริง) ไม่ซ้ำ"""
+    targets = [t for p in portfolios.values() for t in p['assets']]
+    return list(dict.fromkeys(targets + holdings['Ticker'].astype(str).tolist()))
+
+
+@traced("household.consolidate")
+def consolidate(holdings, portfolios, prices, currencies, multipliers, div_per_share):
+    """คำนวณภาพรวมจาก holdings ของทุกคน (User, Ticker, Shares, Total_THB) ที่ตีราคาแล้ว
+
+    คืน dict ของ DataFrame:
+        positions: ต่อ (User, Ticker) มูลค่า/P&L/ปันผล + สัดส่วนจริงเทียบเป้า (Drift_%)
+        users: ยอดรวมต่อคน, by_ticker / by_currency: ยอดรวมทั้งบ้านต่อหุ้น / ต่อสกุลเงิน
+    """
+    held = holdings[holdings['Shares'] > 0].reset_index(drop=True)
+    valued = value_holdings(held, prices, currencies, multipliers, div_per_share)
+
+    # เป้าของทุกคนเป็นตารางเดียว แล้ว outer join กับของที่ถือ (ตัวที่ยังไม่ได้ซื้อก็เห็นว่าขาดเป้า)
+    targets = pd.DataFrame([(u, t, w) for u, p in portfolios.items() for t, w in p['assets'].items()],
+                           columns=['User', 'Ticker', 'Target_%'])
+    targets['Target_%'] *= 100
+    positions = valued.merge(targets, on=['User', 'Ticker'], how='outer')
+    positions['Currency'] = positions['Currency'].fillna(positions['Ticker'].map(currencies))
+    numeric = ['Shares', 'Total_THB', 'Market_Value_THB', 'P/L_Amount', 'Expected_Div_THB', 'Target_%']
+    positions[numeric] = positions[numeric].fillna(0.0)
+    user_value = positions.groupby('User')['Market_Value_THB'].transform('sum')
+    positions['Weight_%'] = (positions['Market_Value_THB'] / user_value.where(user_value != 0) * 100).fillna(0.0)
+    positions['Drift_%'] = positions['Weight_%'] - positions['Target_%']
+
+    sums = ['Total_THB', 'Market_Value_THB', 'P/L_Amount', 'Expected_Div_THB']
+    users = positions.groupby('User')[sums].sum()
+    users['P/L_Percent'] = users['P/L_Amount'] / users['Total_THB'].where(users['Total_THB'] != 0) * 100
+    users['Max_Drift_%'] = positions.assign(d=positions['Drift_%'].abs()).groupby('User')['d'].max()
+
+    household_value = positions['Market_Value_THB'].sum()
+    by_ticker = positions.groupby('Ticker')[['Shares', *sums]].sum()
+    by_ticker['Share_%'] = by_ticker['Market_Value_THB'] / household_value * 100 if household_value else 0.0
+    by_currency = positions.groupby('Currency')[sums].sum()
+    by_currency['Share_%'] = by_currency['Market_Value_THB'] / household_value * 100 if household_value else 0.0
+    return {
+        "positions": positions.sort_values(['User', 'Ticker']).reset_index(drop=True),
+        "users": users,
+        "by_ticker": by_ticker.sort_values('Market_Value_THB', ascending=False),
+        "by_currency": by_currency.sort_values('Market_Value_THB', ascending=False),
+    }
+
+
+def household_snapshot(ledger, portfolios, metadata):
+    """อ่าน ledger ครั้งเดียว + ดึงราคาทุกตัวของทุกคนในคำขอเดียว แล้ว consolidate"""
+    holdings = ledger.holdings()
+    tickers = all_tickers(portfolios, holdings)
+    infos = metadata.get_many(tickers)
+    currencies = resolve_currencies(tickers, infos)
+    quotes = get_quotes(tickers, fx_pairs=fx_pairs_for(currencies.values()))
+    prices = {t: quotes.get(t) or 0 for t in tickers}
+    div = {t: dividend_per_share(infos.get(t) or {}, prices[t]) for t in tickers}
+    return consolidate(holdings, portfolios, prices, currencies, thb_multipliers(currencies.values(), quotes), div)
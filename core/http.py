@@ -0,0 +1,14 @@
+"""HTTP session กลาง: ใช้ connection pool ซ้ำแทนการเปิด connection ใหม่ทุก request"""
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "Mozilla/5.0"
+
+
+def make_session(pool_maxsize=16):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
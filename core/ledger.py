@@ -0,0 +1,208 @@
+"""Ledger replica: สำเนา AP_Wealth_DB ลง SQLite ในเครื่อง แล้ว sync เฉพาะแถวที่เพิ่มใหม่
+
+ชีตเป็น append-only (บันทึกต่อท้ายเสมอ) เลยจำแค่ว่า sync มาถึงแถวไหนแล้ว
+รอบถัดไปขอเฉพาะช่วง A{แถวถัดไป}:{คอลัมน์สุดท้าย} พอ
+
+ตาราง holdings เป็นยอดรวมต่อ (user, ticker) ที่อัปเดตไปพร้อมกับทุกแถวที่เข้ามา
+หน้าเว็บเลยอ่านพอร์ตได้ตามจำนวนหุ้นที่ถือ ไม่ต้อง groupby ทั้ง ledger ทุกครั้ง
+"""
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from core.trace import span
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS ledger (
+    row_num INTEGER PRIMARY KEY,   -- เลขแถวในชีต (หัวตาราง = แถว 1)
+    user TEXT, ticker TEXT, date TEXT,
+    data TEXT NOT NULL             -- ทั้งแถวเป็น JSON ตามหัวตารางของชีต
+);
+CREATE INDEX IF NOT EXISTS ix_ledger_user_ticker_date ON ledger (user, ticker, date);
+CREATE TABLE IF NOT EXISTS holdings (
+    user TEXT, ticker TEXT,
+    shares REAL NOT NULL DEFAULT 0,
+    total_thb REAL NOT NULL DEFAULT 0,   -- ต้นทุนรวม (บาท)
+    n_rows INTEGER NOT NULL DEFAULT 0,
+    last_date TEXT,
+    PRIMARY KEY (user, ticker)
+);
+"""
+
+NUMERIC_COLUMNS = ("Shares", "Price", "Total_THB")
+
+
+def _num(value):
+    """แปลงค่าจากชีตเป็น float แบบเดียวกับ to_numeric(errors='coerce').fillna(0)"""
+    try:
+        f = float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(f) else f
+
+
+def _apply_holding(db, rec, sign=1):
+    """บวก (sign=1) หรือถอน (sign=-1) ผลของแถวเดียวออกจาก holdings"""
+    db.execute(
+        """INSERT INTO holdings (user, ticker, shares, total_thb, n_rows, last_date) VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT (user, ticker) DO UPDATE SET
+               shares = shares + excluded.shares,
+               total_thb = total_thb + excluded.total_thb,
+               n_rows = n_rows + excluded.n_rows,
+               last_date = MAX(COALESCE(last_date, ''), excluded.last_date)""",
+        (str(rec.get("User", "")), str(rec.get("Ticker", "")), sign * _num(rec.get("Shares")),
+         sign * _num(rec.get("Total_THB")), sign, str(rec.get("Date", ""))))
+
+
+def _col_letter(n):
+    letters = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        letters = chr(65 + r) + letters
+    return letters
+
+
+def _updated_first_row(response):
+    """อ่านเลขแถวแรกจาก response ของ append_row(s) เช่น 'Sheet1!A12:G14' -> 12"""
+    try:
+        updated = response["updates"]["updatedRange"]
+        return int(re.search(r"![A-Z]+(\d+)", updated).group(1))
+    except Exception:
+        return None
+
+
+class LedgerReplica:
+    def __init__(self, path, open_sheet, sync_interval=30):
+        """open_sheet: ฟังก์ชันที่คืน worksheet ของ gspread (เรียกเฉพาะตอนต้องคุยกับชีตจริง)"""
+        self.path = path
+        self.open_sheet = open_sheet
+        self.sync_interval = sync_interval
+        self._last_sync = 0.0
+        self._lock = threading.RLock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            if self._meta(db, "holdings_version") != 1:
+                self._rebuild_holdings(db)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _meta(self, db, key, default=None):
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, db, key, value):
+        db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    @property
+    def header(self):
+        with self._connect() as db:
+            return self._meta(db, "header", [])
+
+    def _insert(self, db, header, first_row_num, rows):
+        records = []
+        for offset, row in enumerate(rows):
+            if not any(str(v).strip() for v in row):
+                continue  # แถวว่างในชีต ข้ามแต่ยังนับเลขแถว
+            values = list(row) + [""] * (len(header) - len(row))
+            rec = dict(zip(header, values))
+            row_num = first_row_num + offset
+            old = db.execute("SELECT data FROM ledger WHERE row_num = ?", (row_num,)).fetchone()
+            if old:  # แถวนี้เคยมีแล้ว (เช่น write-through แล้ว sync ซ้ำ) ถอนของเก่าออกก่อน
+                _apply_holding(db, json.loads(old[0]), -1)
+            _apply_holding(db, rec)
+            records.append((row_num, str(rec.get("User", "")), str(rec.get("Ticker", "")),
+                            str(rec.get("Date", "")), json.dumps(rec, ensure_ascii=False)))
+        db.executemany("INSERT OR REPLACE INTO ledger VALUES (?, ?, ?, ?, ?)", records)
+        if records:
+            self._set_meta(db, "revision", self._meta(db, "revision", 0) + 1)
+
+        # ขยับตัวชี้ "sync ถึงแถวไหนแล้ว" เฉพาะเมื่อแถวต่อกันพอดี (กันช่องโหว่จากคนอื่นเขียนแทรก)
+        synced = self._meta(db, "synced_rows", 0)
+        if rows and first_row_num <= synced + 2:
+            self._set_meta(db, "synced_rows", max(synced, first_row_num - 2 + len(rows)))
+
+    def _rebuild_holdings(self, db):
+        """คำนวณ holdings ใหม่ทั้งหมดจาก ledger (ใช้ครั้งเดียวตอนสร้าง/อัปเกรดไฟล์)"""
+        db.execute("DELETE FROM holdings")
+        for (data,) in db.execute("SELECT data FROM ledger ORDER BY row_num").fetchall():
+            _apply_holding(db, json.loads(data))
+        self._set_meta(db, "holdings_version", 1)
+
+    def sync(self, force=False):
+        """ดึงเฉพาะแถวที่ต่อท้ายมาใหม่จากชีต คืนจำนวนแถวใหม่ (เว้นช่วง sync_interval วินาทีถ้าไม่ force)"""
+        with self._lock:
+            if not force and time.monotonic() - self._last_sync < self.sync_interval:
+                return 0
+            with span("ledger.sync") as s, self._connect() as db:
+                sheet = self.open_sheet()
+                header = self._meta(db, "header")
+                synced = self._meta(db, "synced_rows", 0)
+                if not header:
+                    values = sheet.get_values()
+                    if not values:
+                        self._last_sync = time.monotonic()
+                        s.tag(outcome="empty")
+                        return 0
+                    header, new_rows = values[0], values[1:]
+                    self._set_meta(db, "header", header)
+                else:
+                    new_rows = sheet.get_values(f"A{synced + 2}:{_col_letter(len(header))}")
+                s.tag(rows=len(new_rows))
+                self._insert(db, header, synced + 2, new_rows)
+            self._last_sync = time.monotonic()
+            return len(new_rows)
+
+    def record_appended(self, response, rows):
+        """write-through: เอาแถวที่เพิ่ง append ลงชีตใส่ replica ตามเลขแถวจาก response"""
+        first = _updated_first_row(response)
+        if first is None or not rows:
+            return
+        with self._lock, self._connect() as db:
+            header = self._meta(db, "header")
+            if header:
+                self._insert(db, header, first, rows)
+
+    def version(self):
+        """เลขที่เพิ่มขึ้นทุกครั้งที่มีแถวเข้ามาใหม่หรือถูกแทนที่ (ใช้เป็น key แคชของผลที่คำนวณจาก ledger)"""
+        with self._connect() as db:
+            return self._meta(db, "revision", 0)
+
+    def load(self, user=None):
+        """อ่านประวัติจาก replica (กรอง User ด้วย index) คืน DataFrame หน้าตาเดียวกับ get_all_records"""
+        with span("ledger.load", user=user or "*") as s:
+            with self._connect() as db:
+                header = self._meta(db, "header", [])
+                if user is None:
+                    cur = db.execute("SELECT data FROM ledger ORDER BY row_num")
+                else:
+                    cur = db.execute("SELECT data FROM ledger WHERE user = ? ORDER BY row_num", (str(user),))
+                records = [json.loads(r[0]) for r in cur]
+            s.tag(rows=len(records))
+            df = pd.DataFrame.from_records(records, columns=header or None)
+            if not df.empty:
+                for col in NUMERIC_COLUMNS:
+                    if col in df.columns:
+                        df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", ""), errors='coerce').fillna(0)
+            return df
+
+    def holdings(self, user=None):
+        """ยอดถือต่อหุ้นจาก holdings index: Ticker, Shares, Total_THB, Avg_Price_THB (+ User ถ้าไม่กรอง)"""
+        with span("ledger.holdings", user=user or "*"), self._connect() as db:
+            if user is None:
+                cur = db.execute("SELECT user, ticker, shares, total_thb FROM holdings WHERE n_rows > 0 ORDER BY user, ticker")
+            else:
+                cur = db.execute("SELECT user, ticker, shares, total_thb FROM holdings WHERE user = ? AND n_rows > 0 "
+                                 "ORDER BY ticker", (str(user),))
+            df = pd.DataFrame(cur.fetchall(), columns=["User", "Ticker", "Shares", "Total_THB"])
+        if user is not None:
+            df = df.drop(columns="User")
+        shares = df["Shares"].where(df["Shares"] != 0)
+        df["Avg_Price_THB"] = (df["Total_THB"] / shares).fillna(0)
+        return df
@@ -0,0 +1,147 @@
+"""Metadata store: ข้อมูลปันผล/พื้นฐานของหุ้นจาก .info เก็บลงดิสก์ (SQLite)
+
+.info เป็น call ที่ช้าและโดน rate limit บ่อยที่สุดของ yfinance แต่ข้อมูลเปลี่ยนแค่ไตรมาสละครั้ง
+หน้าเว็บจึงอ่านจากไฟล์อย่างเดียว (ไม่ยิงเน็ตระหว่าง render) ถ้า field ไหนเก่าเกิน TTL ของมัน
+จะถูกสั่งโหลดใหม่เบื้องหลัง และมี scheduler คอยไล่ refresh ตัวที่เก่าเป็นระยะ
+"""
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.trace import span
+from core.upstream import YAHOO, load_yfinance
+
+DAY = 24 * 3600
+# TTL ราย field: ตัวเลขปันผล/PE เปลี่ยนบ่อยกว่าชื่อหรือประเภทสินทรัพย์มาก
+FIELD_TTL = {
+    "dividendRate": DAY, "trailingAnnualDividendRate": DAY,
+    "dividendYield": DAY, "yield": DAY, "trailingAnnualDividendYield": DAY,
+    "trailingPE": DAY, "totalAssets": 7 * DAY, "lastFiscalYearEnd": DAY,
+    "currency": 30 * DAY, "quoteType": 30 * DAY, "longName": 30 * DAY, "shortName": 30 * DAY,
+    "category": 30 * DAY, "longBusinessSummary": 30 * DAY,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    ticker TEXT, field TEXT, value TEXT, fetched_at REAL,
+    PRIMARY KEY (ticker, field)
+);
+"""
+
+
+def fetch_info(ticker):
+    with span("yf.info", ticker=ticker):
+        return YAHOO.call(("info", ticker), lambda: load_yfinance().Ticker(ticker).info) or {}
+
+
+class MetadataStore:
+    def __init__(self, path, fetch=fetch_info, field_ttl=None, max_workers=2):
+        self.path = path
+        self.fetch = fetch
+        self.field_ttl = field_ttl or FIELD_TTL
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="metadata")
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self.counters = {"reads": 0, "refreshes": 0, "refresh_errors": 0}
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _rows(self, tickers):
+        marks = ",".join("?" * len(tickers))
+        with self._connect() as db:
+            return db.execute(f"SELECT ticker, field, value, fetched_at FROM metadata WHERE ticker IN ({marks})",
+                              list(tickers)).fetchall()
+
+    def _stale(self, fields, now):
+        """field ที่ยังไม่มีหรือเก่าเกิน TTL ของมัน"""
+        return [f for f, ttl in self.field_ttl.items()
+                if f not in fields or now - fields[f][1] >= ttl]
+
+    def get_many(self, tickers, refresh=True):
+        """{ticker: {field: value}} จากดิสก์เท่านั้น ตัวที่มี field เก่าจะถูกสั่ง refresh เบื้องหลัง"""
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        stored = {t: {} for t in tickers}
+        for ticker, field, value, fetched_at in self._rows(tickers):
+            stored[ticker][field] = (json.loads(value), fetched_at)
+        with self._lock:
+            self.counters["reads"] += len(tickers)
+
+        if refresh:
+            now = time.time()
+            self.refresh_async([t for t in tickers if self._stale(stored[t], now)])
+        return {t: {f: v for f, (v, _) in fields.items() if v is not None} for t, fields in stored.items()}
+
+    def get(self, ticker, refresh=True, wait=False):
+        """wait=True: ถ้ายังไม่เคยมีข้อมูลของตัวนี้เลย โหลดให้เสร็จก่อนค่อยคืน (เช่นตอนกดวิเคราะห์ครั้งแรก)"""
+        if wait and not self._rows([ticker]):
+            self.refresh(ticker)
+        return self.get_many([ticker], refresh=refresh)[ticker]
+
+    def refresh(self, ticker):
+        """โหลด .info ใหม่แล้วเขียนเฉพาะ field ที่ได้มา
+
+        .info ว่าง (โดน throttle/พัง) ไม่เขียนอะไรเลย ค่าเดิมที่ดีอยู่ยังใช้ได้ต่อ
+        field ที่ไม่มีมาเก็บเป็น null กันโหลดซ้ำ ค่าเดิมที่ไม่ใช่ null ยังไม่ถูกทับจนกว่าจะเลย TTL ของ field นั้น
+        (ระหว่างนั้นอาจเป็นคำตอบไม่ครบชั่วคราว เลย TTL แล้วยังไม่มีถือว่าหายจริง เช่นบริษัทงดจ่ายปันผล)
+        """
+        try:
+            info = self.fetch(ticker)
+        except Exception:
+            info = None
+        if not info:
+            with self._lock:
+                self.counters["refresh_errors"] += 1
+            return False
+        now = time.time()
+        present = [f for f in self.field_ttl if info.get(f) is not None]
+        missing = [f for f in self.field_ttl if info.get(f) is None]
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                           [(ticker, f, json.dumps(info[f]), now) for f in present])
+            db.executemany("INSERT INTO metadata VALUES (?, ?, 'null', ?) ON CONFLICT (ticker, field) "
+                           "DO UPDATE SET value = 'null', fetched_at = excluded.fetched_at "
+                           "WHERE value = 'null' OR fetched_at <= ?",
+                           [(ticker, f, now, now - self.field_ttl[f]) for f in missing])
+        with self._lock:
+            self.counters["refreshes"] += 1
+        return True
+
+    def _refresh_task(self, ticker):
+        try:
+            self.refresh(ticker)
+        finally:
+            with self._lock:
+                self._inflight.discard(ticker)
+
+    def refresh_async(self, tickers):
+        with self._lock:
+            todo = [t for t in tickers if t not in self._inflight]
+            self._inflight.update(todo)
+        for t in todo:
+            self._pool.submit(self._refresh_task, t)
+
+    def start_scheduler(self, tickers_fn, interval=900):
+        """ไล่เช็คทุก interval วินาทีว่าหุ้นที่ tickers_fn() คืนมามี field ไหนเก่า แล้ว refresh เบื้องหลัง"""
+        def loop():
+            while True:
+                try:
+                    self.get_many(tickers_fn())
+                except Exception:
+                    pass
+                time.sleep(interval)
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=loop, name="metadata-scheduler", daemon=True)
+                self._scheduler.start()
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "inflight": len(self._inflight)}
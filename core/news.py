@@ -0,0 +1,130 @@
+"""ข่าว RSS ของหุ้น: prefetch ทุกตัวในพอร์ตพร้อมกันเบื้องหลัง แล้วหน้าเว็บอ่านจากแคช
+
+- ใช้ session เดียว (connection pool) ยิงพร้อมกันหลายฟีด
+- ส่ง If-None-Match / If-Modified-Since ฟีดไม่เปลี่ยนจะได้ 304 ไม่ต้องโหลดและ parse ใหม่
+- ข่าวที่ parse แล้วเก็บไว้ ttl วินาที เกินแล้วยังโชว์ของเดิมระหว่างโหลดใหม่
+"""
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from core.http import make_session
+from core.trace import span
+from core import upstream
+
+# เปลี่ยนปลายทางได้ด้วย AP_NEWS_RSS (เช่นชี้ไป server ปลอมตอน benchmark)
+YAHOO_RSS = os.environ.get("AP_NEWS_RSS", "https://finance.yahoo.com/rss/headline?s={ticker}")
+
+
+def parse_feed(content, limit=5):
+    root = ET.fromstring(content)
+    news_items = []
+    for item in root.findall('./channel/item')[:limit]:
+        news_items.append({
+            'title': item.find('title').text,
+            'link': item.find('link').text,
+            'published': item.find('pubDate').text if item.find('pubDate') is not None else ""
+        })
+    return news_items
+
+
+class NewsFeeds:
+    def __init__(self, url_template=YAHOO_RSS, ttl=600, timeout=5, max_workers=8, session=None):
+        self.url_template = url_template
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = session or make_session(pool_maxsize=max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="news")
+        self._entries = {}    # ticker -> {'items', 'etag', 'last_modified', 'fetched_at'}
+        self._inflight = {}   # ticker -> Future
+        self._lock = threading.Lock()
+        self.counters = {"fetches": 0, "not_modified": 0, "errors": 0, "hits": 0}
+
+    def _fetch(self, ticker):
+        try:
+            with self._lock:
+                entry = self._entries.get(ticker)
+            headers = {}
+            if entry and entry.get('etag'): headers['If-None-Match'] = entry['etag']
+            if entry and entry.get('last_modified'): headers['If-Modified-Since'] = entry['last_modified']
+
+            def get():
+                response = self.session.get(self.url_template.format(ticker=ticker), headers=headers, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    response.raise_for_status()  # ให้ scheduler นับ throttle / backoff
+                return response
+
+            with span("rss.fetch", ticker=ticker) as s:
+                response = upstream.YAHOO_RSS.call(("rss", ticker), get)
+                s.tag(status=response.status_code)
+            with self._lock:
+                self.counters["fetches"] += 1
+            if response.status_code == 304 and entry:
+                new_entry = dict(entry, fetched_at=time.monotonic())
+                with self._lock:
+                    self.counters["not_modified"] += 1
+            else:
+                response.raise_for_status()
+                new_entry = {
+                    'items': parse_feed(response.content),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': time.monotonic(),
+                }
+            with self._lock:
+                self._entries[ticker] = new_entry
+        except Exception:
+            with self._lock:
+                self.counters["errors"] += 1
+                if ticker not in self._entries:
+                    # จำไว้ว่าลองแล้วไม่ได้ จะได้ไม่รอซ้ำทุก rerun (ลองใหม่เมื่อครบ ttl)
+                    self._entries[ticker] = {'items': [], 'fetched_at': time.monotonic()}
+        finally:
+            with self._lock:
+                self._inflight.pop(ticker, None)
+
+    def prefetch(self, tickers, force=False):
+        """สั่งโหลดเบื้องหลังทุกตัวที่ยังไม่มีหรือเก่าเกิน ttl (ไม่รอผล)"""
+        now = time.monotonic()
+        with self._lock:
+            for t in tickers:
+                entry = self._entries.get(t)
+                fresh = entry is not None and now - entry['fetched_at'] < self.ttl
+                if (force or not fresh) and t not in self._inflight:
+                    self._inflight[t] = self._pool.submit(self._fetch, t)
+
+    def refresh(self, ticker, wait=5.0):
+        """บังคับโหลดใหม่ (ยังส่ง ETag ไป ถ้าไม่เปลี่ยนได้ 304) แล้วรอไม่เกิน wait วินาที"""
+        self.prefetch([ticker], force=True)
+        with self._lock:
+            future = self._inflight.get(ticker)
+        if future is not None:
+            try:
+                future.result(timeout=wait)
+            except FutureTimeout:
+                pass
+
+    def get(self, ticker, wait=0.0):
+        """ข่าวของ ticker จากแคช ถ้ายังไม่เคยโหลดจะรอไม่เกิน wait วินาที (ยังไม่ได้คืน None)"""
+        self.prefetch([ticker])
+        with self._lock:
+            entry = self._entries.get(ticker)
+            future = self._inflight.get(ticker)
+            if entry is not None:
+                self.counters["hits"] += 1
+                return entry['items']
+        if future is not None and wait > 0:
+            try:
+                future.result(timeout=wait)
+            except FutureTimeout:
+                return None
+            with self._lock:
+                entry = self._entries.get(ticker)
+            return entry['items'] if entry else None
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "cached": len(self._entries), "inflight": len(self._inflight)}
@@ -0,0 +1,229 @@
+"""ส่งแจ้งเตือน Telegram เบื้องหลัง: เข้าคิวในเครื่องก่อน แล้ว worker ค่อยส่ง ไม่ให้หน้าเว็บค้างรอ Telegram
+
+- ข้อความที่เข้ามาติดๆ กัน (ภายใน coalesce_window วินาที) รวมเป็นข้อความเดียว ไม่เกิน 4096 ตัวอักษร
+- ใช้ session กลาง (connection pool) + timeout ทุก request
+- โดน 429 รอตาม retry_after ที่ Telegram บอก, เน็ตล่ม/5xx รอแบบ exponential backoff แล้วลองใหม่
+- 4xx อื่น (เช่น token ผิด) ส่งซ้ำก็ไม่ผ่าน บันทึกเป็น failed ไว้ให้เห็นบนหน้าเว็บ
+- หลาย process ใช้ไฟล์เดียวกันได้ (หน้าเว็บหลายตัว + cli --notify) ข้อความต้อง claim ก่อนส่ง จึงไม่ถูกส่งซ้ำ
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from core.http import make_session
+from core.outbox import OutboxWorker
+from core.trace import span
+
+API_BASE = os.environ.get("AP_TELEGRAM_API", "https://api.telegram.org")  # ชี้ไป server ปลอมได้ตอน benchmark
+MAX_MESSAGE_CHARS = 4096
+SEPARATOR = "\n\n"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending / sending / sent / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_notifications_status ON notifications (status, next_attempt_at);
+"""
+# ตารางที่สร้างก่อนมีการ claim
+MIGRATIONS = {"owner": "ALTER TABLE notifications ADD COLUMN owner TEXT",
+              "lease_until": "ALTER TABLE notifications ADD COLUMN lease_until REAL NOT NULL DEFAULT 0"}
+# ข้อความที่ status = 'sending' แต่เลย lease แล้ว (process ที่ claim ไปตายกลางทาง) กลับมาส่งได้อีก
+READY = "(status = 'pending' OR (status = 'sending' AND lease_until < ?))"
+
+
+class TelegramError(Exception):
+    def __init__(self, message, retry_after=None, permanent=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+class TelegramDispatcher(OutboxWorker):
+    thread_name = "telegram"
+
+    def __init__(self, db_path, token, chat_id, api_base=API_BASE, session=None, timeout=(3.05, 10),
+                 parse_mode="Markdown", coalesce_window=2.0, max_hold=10.0, base_delay=2.0, max_delay=600.0,
+                 lease=120.0):
+        """lease: วินาทีที่ข้อความถูกจองไว้ระหว่างส่ง ถ้าเกินนี้ process อื่นหยิบไปส่งต่อได้"""
+        self.db_path = db_path
+        self.url = f"{api_base}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.session = session or make_session(pool_maxsize=2)
+        self.timeout = timeout
+        self.parse_mode = parse_mode
+        self.coalesce_window = coalesce_window
+        self.max_hold = max_hold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.requests_sent = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(notifications)")}
+            for column, ddl in MIGRATIONS.items():
+                if column not in columns:
+                    db.execute(ddl)
+        if self.status()["pending"]:
+            self.start()  # มีของค้างจากรอบก่อน ส่งต่อเลย
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def enqueue(self, text):
+        """ฝากข้อความไว้ในคิว คืน id ทันที (ไม่รอเน็ต)"""
+        with self._connect() as db:
+            msg_id = db.execute("INSERT INTO notifications (text, created_at) VALUES (?, ?)",
+                                (text, time.time())).lastrowid
+        self.start()
+        self._wake.set()
+        return msg_id
+
+    def _due(self):
+        """ข้อความที่รอส่ง เรียงตามลำดับ (id, text, attempts, created_at, next_attempt_at)"""
+        with self._connect() as db:
+            return db.execute("SELECT id, text, attempts, created_at, next_attempt_at FROM notifications "
+                              f"WHERE {READY} ORDER BY id", (time.time(),)).fetchall()
+
+    def _claim(self, ids):
+        """จองข้อความไว้ส่งเอง (atomic) คืนเฉพาะ id ที่จองได้ ที่เหลือ worker/process อื่นหยิบไปแล้ว"""
+        now = time.time()
+        marks = ",".join("?" * len(ids))
+        with self._connect() as db:
+            db.execute(f"UPDATE notifications SET status = 'sending', owner = ?, lease_until = ? "
+                       f"WHERE id IN ({marks}) AND {READY}", [self.owner, now + self.lease] + ids + [now])
+            claimed = {r[0] for r in db.execute(f"SELECT id FROM notifications WHERE id IN ({marks}) "
+                                                "AND status = 'sending' AND owner = ?", ids + [self.owner])}
+        return claimed
+
+    def _run(self):
+        while True:
+            pending = self._due()
+            if not pending:
+                with self._lock:  # เช็คซ้ำใต้ lock กันข้อความที่เพิ่งเข้าคิวตกหล่น
+                    if not self._due():
+                        self._thread = None
+                        return
+                continue
+            now = time.time()
+            # รอให้ข้อความชุดนี้นิ่งก่อน (ไม่มีอะไรใหม่เข้ามาภายใน coalesce_window แต่ไม่เกิน max_hold) และพ้นเวลา backoff
+            settled = min(max(r[3] for r in pending) + self.coalesce_window, pending[0][3] + self.max_hold)
+            send_at = max(max(r[4] for r in pending), settled)
+            if send_at > now:
+                self._wake.wait(send_at - now)
+                self._wake.clear()
+                continue
+            self.flush(pending)
+
+    def _batch(self, pending):
+        """ตัดข้อความจากต้นคิวให้รวมกันแล้วไม่เกินขีดจำกัดของ Telegram"""
+        batch, size = [], 0
+        for row in pending:
+            extra = len(row[1]) + (len(SEPARATOR) if batch else 0)
+            if batch and size + extra > MAX_MESSAGE_CHARS:
+                break
+            batch.append(row)
+            size += extra
+        return batch
+
+    def _post(self, text):
+        payload = {"chat_id": self.chat_id, "text": text[:MAX_MESSAGE_CHARS]}
+        if self.parse_mode:
+            payload["parse_mode"] = self.parse_mode
+        self.requests_sent += 1
+        try:
+            with span("telegram.send", chars=len(payload["text"])) as s:
+                r = self.session.post(self.url, json=payload, timeout=self.timeout)
+                s.tag(status=r.status_code, outcome="ok" if r.status_code == 200 else f"http:{r.status_code}")
+        except Exception as e:
+            raise TelegramError(f"{type(e).__name__}: {e}")
+        if r.status_code == 200:
+            return
+        try:
+            body = r.json()
+        except ValueError:
+            body = {}
+        detail = body.get("description") or r.text[:200]
+        if r.status_code == 429:
+            raise TelegramError(detail, retry_after=(body.get("parameters") or {}).get("retry_after", 30))
+        raise TelegramError(f"HTTP {r.status_code}: {detail}", permanent=400 <= r.status_code < 500)
+
+    def flush(self, pending=None):
+        """ส่งข้อความที่ค้างอยู่ (รวบเป็นข้อความเดียว) สำเร็จคืน True ส่งเฉพาะข้อความที่ claim ได้"""
+        batch = self._batch(pending if pending is not None else self._due())
+        if not batch:
+            return True
+        claimed = self._claim([r[0] for r in batch])
+        batch = [r for r in batch if r[0] in claimed]
+        if not batch:
+            return False
+        ids = [r[0] for r in batch]
+        attempts = max(r[2] for r in batch) + 1
+        marks = ",".join("?" * len(ids))
+        try:
+            self._post(SEPARATOR.join(r[1] for r in batch))
+        except TelegramError as e:
+            if e.permanent:
+                status, next_at = "failed", 0
+            else:
+                delay = e.retry_after if e.retry_after is not None else self.base_delay * 2 ** (attempts - 1)
+                status, next_at = "pending", time.time() + min(self.max_delay, delay)
+            with self._connect() as db:
+                db.execute(f"UPDATE notifications SET status = ?, owner = NULL, lease_until = 0, attempts = ?, "
+                           f"next_attempt_at = ?, last_error = ? WHERE id IN ({marks}) AND owner = ?",
+                           [status, attempts, next_at, str(e)[:500]] + ids + [self.owner])
+            return False
+        with self._connect() as db:
+            db.execute(f"UPDATE notifications SET status = 'sent', attempts = ?, last_error = NULL "
+                       f"WHERE id IN ({marks}) AND owner = ?", [attempts] + ids + [self.owner])
+        return True
+
+    def retry_failed(self):
+        """ส่งข้อความที่ failed ใหม่อีกรอบ (เช่นหลังแก้ token) คืนจำนวนที่ส่งเข้าคิว"""
+        with self._connect() as db:
+            n = db.execute("UPDATE notifications SET status = 'pending', next_attempt_at = 0 "
+                           "WHERE status = 'failed'").rowcount
+        if n:
+            self.start()
+            self._wake.set()
+        return n
+
+    def statuses(self, ids):
+        """{id: status} ของข้อความที่ระบุ"""
+        ids = list(ids)
+        if not ids:
+            return {}
+        with self._connect() as db:
+            return dict(db.execute(f"SELECT id, status FROM notifications WHERE id IN ({','.join('?' * len(ids))})",
+                                   ids).fetchall())
+
+    def pending(self, ids=None):
+        """จำนวนข้อความที่ยังรอส่ง (ids: นับเฉพาะข้อความเหล่านี้)"""
+        if ids is not None:
+            return sum(s in ("pending", "sending") for s in self.statuses(ids).values())
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM notifications WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+    def status(self):
+        """สถานะคิวสำหรับโชว์บนหน้าเว็บ"""
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM notifications GROUP BY status").fetchall())
+            last = db.execute("SELECT last_error, next_attempt_at FROM notifications WHERE status != 'sent' "
+                              "AND last_error IS NOT NULL ORDER BY id DESC LIMIT 1").fetchone()
+        return {"pending": counts.get("pending", 0) + counts.get("sending", 0), "sent": counts.get("sent", 0), "failed": counts.get("failed", 0),
+                "last_error": last[0] if last else None,
+                "next_retry_in": max(0.0, last[1] - time.time()) if last else None,
+                "requests_sent": self.requests_sent, "worker_alive": self._thread is not None}
@@ -0,0 +1,31 @@
+"""ส่วนที่คิวเบื้องหลังบน SQLite (SheetWriter, TelegramDispatcher) ใช้ร่วมกัน: เปิด worker และรอจนคิวว่าง
+
+คลาสลูกต้องมี self._lock, self._thread, self._wake, thread_name, _run() (วนจนคิวว่างแล้วตั้ง _thread = None)
+และ pending(ids=None) คืนจำนวนรายการที่ยังส่งไม่เสร็จ
+"""
+import threading
+import time
+
+
+class OutboxWorker:
+    thread_name = "outbox"
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def drain(self, timeout=60.0, ids=None):
+        """รอจนคิวว่าง (สำหรับงาน batch ที่ต้องรู้ผลก่อนจบ process) คืน True ถ้าส่งหมดทันเวลา
+
+        ids: รอเฉพาะรายการเหล่านี้ (เช่นที่ process นี้เพิ่งเข้าคิว) ไม่ต้องรอของค้างเก่าของคนอื่น
+        """
+        deadline = time.time() + timeout
+        while self.pending(ids):
+            if time.time() > deadline:
+                return False
+            self.start()
+            self._wake.set()
+            time.sleep(0.1)
+        return True
@@ -0,0 +1,233 @@
+"""ผลตอบแทนของพอร์ตตามเวลา: มูลค่ารายวัน, TWR (time-weighted) และ XIRR (money-weighted)
+
+เอาแถวใน ledger (Date, User, Ticker, Shares, Total_THB) มาวางบนตารางราคารายวัน + ค่าเงิน
+คำนวณทุก (user, ticker) และยอดรวมของแต่ละ user พร้อมกันเป็นเมทริกซ์เดียว ไม่วนทีละวัน
+
+- มูลค่า = จำนวนหุ้นที่ถือ ณ วันนั้น x ราคาปิด x ค่าเงินวันนั้น + ปันผลสะสมที่ได้รับ (เป็นบาท)
+- ราคา/ปันผลจาก Yahoo ปรับตามการแตกหุ้นย้อนหลังเสมอ แต่ Shares ใน ledger เป็นจำนวน ณ วันซื้อ
+  จึงคูณ Shares ของแต่ละแถวด้วยอัตราแตกหุ้นทุกครั้งที่เกิดหลังวันที่ของแถวนั้นก่อนสะสม
+- เงินเข้า (flow) = Total_THB ของแถวที่บันทึกในวันนั้น (ขายจะติดลบ)
+- TWR ตัดผลของจังหวะเติมเงินออก: ต่อกันจาก (มูลค่าวันนี้ - เงินเข้าวันนี้) / มูลค่าเมื่อวาน
+- XIRR คิดจากวันที่เติมเงินจริงทุกงวด + มูลค่าวันสุดท้าย (แก้สมการด้วย bisection ทุกคอลัมน์พร้อมกัน)
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from core.trace import traced
+from core.valuation import MINOR_UNITS, fx_symbol, resolve_currencies
+
+TOTAL = "*"   # ชื่อคอลัมน์ ticker ของยอดรวมทั้งพอร์ตของ user
+
+
+def split_factors(splits, dates):
+    """[วัน x ticker] ผลคูณอัตราแตกหุ้นที่เกิดหลังวันนั้น (ไม่มีการแตกหุ้นเป็น 1)"""
+    ratio = splits.reindex(index=dates).fillna(0.0).to_numpy(dtype=float)
+    ratio = np.where(ratio > 0, ratio, 1.0)
+    after = np.cumprod(ratio[::-1], axis=0)[::-1]          # รวมวันนั้นด้วย
+    return np.vstack([after[1:], np.ones((1, ratio.shape[1]))])
+
+
+def _ledger_positions(ledger, dates, splits=None):
+    """แปลง ledger เป็น (คอลัมน์ (user, ticker), เมทริกซ์จำนวนหุ้นที่ซื้อ/ขาย และเงินเข้าในแต่ละวัน)
+
+    splits: [วัน x ticker] อัตราแตกหุ้น (ดู HistoryStore.splits) จำนวนหุ้นจะถูกแปลงเป็นหน่วยหลังแตกหุ้นล่าสุด
+    """
+    df = ledger[["User", "Ticker", "Date", "Shares", "Total_THB"]].copy()
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce", format="mixed").dt.normalize()
+    df = df.dropna(subset=["Date"])
+    keys = pd.MultiIndex.from_frame(df[["User", "Ticker"]].astype(str)).unique().sort_values()
+    col = keys.get_indexer(pd.MultiIndex.from_frame(df[["User", "Ticker"]].astype(str)))
+    # แถวที่บันทึกวันหยุด นับเป็นวันทำการถัดไป
+    row = np.minimum(dates.searchsorted(df["Date"].to_numpy()), len(dates) - 1)
+    amount = df["Shares"].to_numpy(dtype=float)
+    if splits is not None and not splits.empty:
+        ticker = splits.columns.get_indexer(df["Ticker"].astype(str))
+        factor = split_factors(splits, dates)[row, np.maximum(ticker, 0)]
+        amount = amount * np.where(ticker >= 0, factor, 1.0)
+    shares = np.zeros((len(dates), len(keys)))
+    flows = np.zeros((len(dates), len(keys)))
+    np.add.at(shares, (row, col), amount)
+    np.add.at(flows, (row, col), df["Total_THB"].to_numpy(dtype=float))
+    return keys, shares, flows
+
+
+def twr(values, flows):
+    """time-weighted return สะสมของแต่ละคอลัมน์ (วันที่ยังไม่มีของนับผลตอบแทน 0)"""
+    prev = np.vstack([np.zeros((1, values.shape[1])), values[:-1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.where(prev > 0, (values - flows) / prev, 1.0)
+    growth = np.where(np.isfinite(growth), growth, 1.0)
+    return np.cumprod(growth, axis=0) - 1.0
+
+
+def xirr(flows, terminal, years, lo=-0.99, hi=10.0, iterations=100):
+    """XIRR ต่อปีของแต่ละคอลัมน์ (หาไม่ได้ -> NaN)
+
+    flows: [วัน x คอลัมน์] เงินที่ลงเพิ่ม (บวก = ลงเงิน), terminal: มูลค่าวันสุดท้าย, years: อายุของแต่ละวันเป็นปี
+    """
+    cash = -flows.copy()
+    cash[-1] += terminal                  # ขายทั้งหมดวันสุดท้าย
+    t = (years - years[0])[:, None]
+
+    def npv(rate):
+        return (cash / np.power(1.0 + rate[None, :], t)).sum(axis=0)
+
+    n = cash.shape[1]
+    low, high = np.full(n, lo), np.full(n, hi)
+    f_low = npv(low)
+    ok = (np.sign(f_low) != np.sign(npv(high))) & (np.abs(cash).sum(axis=0) > 0)
+    for _ in range(iterations):
+        mid = (low + high) / 2
+        f_mid = npv(mid)
+        left = np.sign(f_mid) == np.sign(f_low)
+        low = np.where(left, mid, low)
+        f_low = np.where(left, f_mid, f_low)
+        high = np.where(left, high, mid)
+    return np.where(ok, (low + high) / 2, np.nan)
+
+
+@traced("performance.compute")
+def compute(ledger, prices_thb, dividends_thb=None, splits=None):
+    """คำนวณผลตอบแทนจาก ledger และราคารายวันที่แปลงเป็นบาทแล้ว (แถว = วัน, คอลัมน์ = ticker)
+
+    splits: อัตราแตกหุ้นรายวัน (คอลัมน์ = ticker) ถ้าไม่ส่งถือว่าไม่มีการแตกหุ้น
+
+    คืน dict:
+        value / invested / dividends: DataFrame มูลค่า (รวมปันผล), เงินลงสะสม และปันผลสะสมรายวัน
+            คอลัมน์ (User, Ticker) รวม (User, "*")
+        summary: ตารางต่อ (User, Ticker) มี Value_THB, Invested_THB, Dividends_THB, P/L_THB, TWR_%, XIRR_%
+    """
+    dates = prices_thb.index
+    keys, trades, flows = _ledger_positions(ledger, dates, splits)
+    if not len(keys) or not len(dates):
+        return None
+    tickers = keys.get_level_values(1)
+    price = prices_thb.reindex(columns=tickers).to_numpy(dtype=float)
+    shares = np.cumsum(trades, axis=0)
+    values = np.nan_to_num(shares * price)
+    received = np.zeros_like(values)
+
+    if dividends_thb is not None:
+        div = np.nan_to_num(dividends_thb.reindex(index=dates, columns=tickers).to_numpy(dtype=float))
+        held_before = np.vstack([np.zeros((1, len(keys))), shares[:-1]])  # ได้ปันผลตามหุ้นที่ถือก่อนวัน XD
+        received = np.cumsum(held_before * div, axis=0)
+        values = values + received
+
+    # ยอดรวมต่อ user ต่อท้ายเป็นคอลัมน์ (User, "*") แล้วคิดทุกคอลัมน์ในรอบเดียว
+    users = keys.get_level_values(0)
+    user_names = users.unique()
+    member = (users.to_numpy()[:, None] == user_names.to_numpy()[None, :]).astype(float)
+    values = np.hstack([values, values @ member])
+    flows = np.hstack([flows, flows @ member])
+    received = np.hstack([received, received @ member])
+    columns = keys.append(pd.MultiIndex.from_arrays([user_names, [TOTAL] * len(user_names)]))
+    columns.names = ["User", "Ticker"]
+
+    # ตัดช่วงก่อนเริ่มลงทุนครั้งแรกทิ้ง
+    start = int(np.argmax(np.abs(flows).sum(axis=1) > 0))
+    dates, values, flows, received = dates[start:], values[start:], flows[start:], received[start:]
+    invested = np.cumsum(flows, axis=0)
+    returns = twr(values, flows)
+    years = (dates - dates[0]).days.to_numpy(dtype=float) / 365.0
+    irr = xirr(flows, values[-1], years)
+
+    summary = pd.DataFrame({
+        "Value_THB": values[-1], "Invested_THB": invested[-1], "Dividends_THB": received[-1],
+        "P/L_THB": values[-1] - invested[-1],
+        "TWR_%": returns[-1] * 100, "XIRR_%": irr * 100,
+    }, index=columns).sort_index()
+    return {
+        "value": pd.DataFrame(values, index=dates, columns=columns),
+        "invested": pd.DataFrame(invested, index=dates, columns=columns),
+        "dividends": pd.DataFrame(received, index=dates, columns=columns),
+        "summary": summary,
+    }
+
+
+def thb_prices(history, tickers, currencies, start=None):
+    """ราคาปิดรายวัน x ค่าเงินรายวัน (เป็นบาท), ปันผลเป็นบาท และอัตราแตกหุ้น จาก HistoryStore"""
+    pairs = {t: fx_symbol(currencies[t]) for t in tickers}
+    symbols = list(dict.fromkeys([*tickers, *(s for s in pairs.values() if s)]))
+    history.update(symbols)
+    closes = history.closes(symbols, start=start, adjusted=False, update=False)
+    dividends = history.dividends(tickers, start=start, update=False).reindex(closes.index).fillna(0.0)
+    splits = history.splits(tickers, start=start, update=False).reindex(closes.index).fillna(0.0)
+    fx = pd.DataFrame({t: closes[pairs[t]] if pairs[t] else 1.0 for t in tickers}, index=closes.index)
+    fx = fx.ffill().bfill() / [MINOR_UNITS.get(currencies[t], (None, 1.0))[1] for t in tickers]
+    return closes[tickers] * fx, dividends[tickers] * fx, splits[tickers]
+
+
+class PerformanceEngine:
+    """คำนวณผลตอบแทนของทุก user ครั้งเดียว แล้วใช้ผลเดิมจนกว่า ledger หรือราคาจะเปลี่ยน
+
+    report() รอจนได้ผล (อาจต้องโหลดราคาย้อนหลังทั้งหมดถ้าคลังยังว่าง/หมดอายุ)
+    หน้าเว็บใช้ latest() แทน: คืนผลล่าสุดทันทีแล้วให้ thread เบื้องหลังคำนวณใหม่
+    """
+
+    def __init__(self, ledger, history, metadata=None):
+        """metadata: MetadataStore ไว้หาสกุลเงินของหุ้นที่ดูจาก suffix ไม่ออก (อ่านจากดิสก์อย่างเดียว)"""
+        self.ledger = ledger
+        self.history = history
+        self.metadata = metadata
+        self._lock = threading.Lock()
+        self._key = None
+        self._result = None
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.last_error = None
+        self.counters = {"computes": 0, "hits": 0, "errors": 0}
+
+    def report(self, metadata=None):
+        """ผลของทุก user (ดู compute) ไม่มีข้อมูลคืน None
+
+        metadata: {ticker: info} ใช้หาสกุลเงินของหุ้นที่ดูจาก suffix ไม่ออก (ไม่ส่งมาจะอ่านจาก self.metadata)
+        """
+        with self._lock:
+            tickers = sorted(self.ledger.holdings()["Ticker"].astype(str).unique())
+            if not tickers:
+                return None
+            if metadata is None and self.metadata is not None:
+                metadata = self.metadata.get_many(tickers, refresh=False)
+            currencies = resolve_currencies(tickers, metadata)
+            pairs = [fx_symbol(c) for c in currencies.values()]
+            self.history.update(tickers + [p for p in pairs if p])
+            key = (self.ledger.version(), self.history.version(tickers + [p for p in pairs if p]),
+                   tuple(sorted(currencies.items())))
+            if key == self._key:
+                self.counters["hits"] += 1
+                return self._result
+            df = self.ledger.load()
+            prices, dividends, splits = thb_prices(self.history, tickers, currencies)
+            self._result = compute(df, prices, dividends, splits) if "Date" in df.columns else None
+            self._key = key
+            self.counters["computes"] += 1
+            return self._result
+
+    def _refresh(self):
+        try:
+            self.report()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)[:500]
+            self.counters["errors"] += 1
+        finally:
+            with self._worker_lock:
+                self._worker = None
+
+    def refresh_async(self):
+        """สั่งคำนวณใหม่เบื้องหลัง (มีงานวิ่งอยู่แล้วไม่สั่งซ้ำ) ราคาที่ยังไม่หมดอายุ HistoryStore จะข้ามเอง"""
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._refresh, name="performance", daemon=True)
+                self._worker.start()
+
+    @property
+    def refreshing(self):
+        return self._worker is not None
+
+    def latest(self):
+        """ผลล่าสุดที่คำนวณเสร็จแล้ว (ยังไม่เคยมีคืน None) ไม่รอ พร้อมสั่งคำนวณใหม่เบื้องหลัง"""
+        self.refresh_async()
+        return self._result
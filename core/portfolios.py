@@ -0,0 +1,15 @@
+"""พอร์ตเป้าหมายของแต่ละคนในครอบครัว (ใช้ทั้งหน้าเว็บและ cli.py)"""
+FAMILY_PORTFOLIOS = {
+    "มินทร์": {
+        "currency": "USD",
+        "assets": {"SCHD": 0.40, "MSFT": 0.30, "AVGO": 0.30}
+    },
+    "ฟิวส์": {
+        "currency": "USD",
+        "assets": {"VOO": 0.50, "QQQ": 0.30, "VNM": 0.20}
+    },
+    "Test": {
+        "currency": "THB",
+        "assets": {"TDEX.BK": 0.60, "PTT.BK": 0.40}
+    }
+}
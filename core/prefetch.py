@@ -0,0 +1,65 @@
+"""Prefetch: เริ่มดึงข้อมูลภายนอกทุกอย่างที่หน้าเว็บต้องใช้พร้อมกันตั้งแต่ต้นสคริปต์
+
+แต่ละแท็บค่อยมารอผลของตัวเองด้วย result() เวลาทั้งหน้าจึงใกล้กับตัวที่ช้าที่สุด
+แทนที่จะเป็นผลรวมของทุกตัว และแต่ละแหล่งมี timeout ของตัวเอง (นับจากตอนเริ่ม)
+ตัวไหนช้า/พังก็แค่แผงของตัวนั้นได้ค่า default ไป ส่วนอื่นยังแสดงได้ปกติ
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# pool กลางทั้ง process จำกัดจำนวนงานพร้อมกัน (ทุก session ใช้ร่วมกัน)
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prefetch")
+
+DEFAULT_TIMEOUTS = {"holdings": 10.0, "quotes": 8.0, "news": 3.0}
+
+
+class Prefetch:
+    def __init__(self, timeouts=None, default_timeout=10.0, pool=None):
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+        self.pool = pool or _POOL
+        self.started = time.monotonic()
+        self._futures = {}
+        self._outcome = {}
+        self._lock = threading.Lock()
+
+    def _timeout_for(self, name):
+        # ชื่อแบบ "quotes:SCHD" ใช้ timeout ของกลุ่ม "quotes"
+        return self.timeouts.get(name, self.timeouts.get(name.split(":")[0], self.default_timeout))
+
+    def submit(self, name, fn, *args, **kwargs):
+        def run():
+            t0 = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._outcome.setdefault(name, {})["seconds"] = time.monotonic() - t0
+        context = contextvars.copy_context()  # span ใน worker ผูกกับ rerun ที่สั่งงาน (core.trace)
+        with self._lock:
+            self._futures[name] = self.pool.submit(context.run, run)
+        return self
+
+    def result(self, name, default=None):
+        """รอผลของ name จนถึง deadline ของมัน (เริ่มนับตอนสร้าง Prefetch) ไม่ทัน/พังคืน default"""
+        future = self._futures.get(name)
+        if future is None:
+            return default
+        remaining = self.started + self._timeout_for(name) - time.monotonic()
+        try:
+            value = future.result(timeout=max(0.0, remaining))
+            status = "ok"
+        except FutureTimeout:
+            value, status = default, "timeout"
+        except Exception as e:
+            value, status = default, f"error: {e}"
+        with self._lock:
+            self._outcome.setdefault(name, {})["status"] = status
+        return value
+
+    def status(self):
+        """{name: {'status', 'seconds'}} ของงานที่ถูกขอผลแล้ว"""
+        with self._lock:
+            return {k: dict(v) for k, v in self._outcome.items()}
@@ -0,0 +1,97 @@
+"""Quote engine: ดึงราคาหลายตัว + ค่าเงินในคำขอเดียว แล้ว fallback ทีละตัวเฉพาะตัวที่หลุด"""
+import math
+
+from core.cache import TTLCache, ttl_from_env
+from core.trace import span
+from core.upstream import YAHOO, load_yfinance
+
+FX_THB = "THB=X"
+
+# แคชราคา/ค่าเงินใช้ร่วมกันทั้ง process: ราคาสดพอสำหรับ 60 วิ (ราคาย้อนหลังอยู่ใน core.history)
+QUOTE_CACHE = TTLCache("quotes", ttl=ttl_from_env("AP_QUOTE_TTL", 60), maxsize=512)
+
+
+def _valid(price):
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 and not math.isnan(price) else None
+
+
+def _bulk_closes(symbols):
+    """ยิง yf.download ครั้งเดียวสำหรับทุกตัว คืน {symbol: ราคาปิดล่าสุด}"""
+    with span("yf.download", symbols=len(symbols)):
+        data = YAHOO.call(("quotes", tuple(symbols)), load_yfinance().download, symbols, period="5d", interval="1d",
+                          group_by="column", auto_adjust=False, progress=False, threads=True)
+    if data is None or data.empty or "Close" not in data.columns.get_level_values(0):
+        return {}
+
+    close = data["Close"]
+    if close.ndim == 1:  # yfinance รุ่นเก่า: ตัวเดียวจะได้ Series กลับมา
+        close = close.to_frame(symbols[0])
+
+    closes = {}
+    for symbol in symbols:
+        if symbol not in close.columns:
+            continue
+        series = close[symbol].dropna()
+        if not series.empty:
+            price = _valid(series.iloc[-1])
+            if price: closes[symbol] = price
+    return closes
+
+
+def _last_price(symbol):
+    """fast_info ก่อน ถ้าไม่ได้ค่อยดู history 1 วัน"""
+    stock = load_yfinance().Ticker(symbol)
+    price = _valid(stock.fast_info['last_price'])
+    if price: return price
+    hist = stock.history(period="1d")
+    return _valid(hist['Close'].iloc[-1]) if not hist.empty else None
+
+
+def _single_quote(symbol):
+    """ทางสำรองแบบเดิม ทีละตัว (ผ่าน scheduler: หลาย session ขอตัวเดียวกันพร้อมกันยิงครั้งเดียว)"""
+    with span("yf.quote", symbol=symbol) as s:
+        try:
+            price = YAHOO.call(("quote", symbol), _last_price, symbol)
+            if price is None: s.tag(outcome="empty")
+            return price
+        except Exception as e:
+            s.tag(outcome=f"error:{type(e).__name__}")
+            return None
+
+
+def fetch_quotes(tickers, fx_pairs=(FX_THB,)):
+    """ดึงราคาของ tickers + คู่เงิน fx_pairs ทั้งหมดในคำขอเดียว
+
+    คืนค่าเป็น dict {symbol: ราคา} ตัวที่ดึงไม่ได้จะเป็น None
+    """
+    symbols = list(dict.fromkeys([*tickers, *fx_pairs]))  # ตัดตัวซ้ำ แต่คงลำดับเดิม
+    if not symbols:
+        return {}
+
+    with span("quotes.fetch", symbols=len(symbols), fx=len(fx_pairs)) as s:
+        try:
+            quotes = dict(_bulk_closes(symbols))  # ผลจาก scheduler อาจแชร์กับ session อื่น อย่าแก้ของเดิม
+        except Exception as e:
+            s.tag(bulk=f"error:{type(e).__name__}")
+            quotes = {}
+
+        # ยิงทีละตัวเฉพาะตัวที่ bulk ไม่ได้ราคามา
+        missing = [symbol for symbol in symbols if symbol not in quotes]
+        for symbol in missing:
+            quotes[symbol] = _single_quote(symbol)
+        s.tag(fallback=len(missing))
+        return {sym: quotes[sym] for sym in symbols}
+
+
+def get_quotes(tickers, fx_pairs=(FX_THB,)):
+    """เหมือน fetch_quotes แต่ผ่านแคช: ตัวที่ยังสดไม่ยิงเน็ตเลย ตัวที่เก่าตอบค่าเดิมก่อนแล้ว refresh เบื้องหลัง
+
+    ถ้าดึงไม่ได้จะคืนราคาดีล่าสุดที่เคยได้ (None ถ้าไม่เคยได้เลย)
+    """
+    symbols = list(dict.fromkeys([*tickers, *fx_pairs]))
+    with span("quotes", symbols=len(symbols), fx=len(fx_pairs)):
+        return QUOTE_CACHE.get_many(symbols, lambda missing: fetch_quotes(missing, fx_pairs=()))
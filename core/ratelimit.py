@@ -0,0 +1,52 @@
+"""Token bucket: จำกัดอัตราเรียกบริการภายนอก (ใช้ร่วมกันได้หลาย thread)"""
+import threading
+import time
+
+from core.cache import ttl_from_env
+
+
+def rate_from_env(name, default):
+    """อัตรา (ต่อวินาที/ต่อนาที ตามที่ผู้เรียกใช้) จาก environment อ่านไม่ออก หรือ <= 0 ซึ่ง TokenBucket ใช้ไม่ได้ ใช้ default"""
+    rate = ttl_from_env(name, default)
+    return rate if rate > 0 else float(default)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """rate: token ต่อวินาที, capacity: ยิงติดกันได้สูงสุดกี่ครั้ง (default = max(1, rate))"""
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1.0):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1.0, timeout=None):
+        """รอจนได้ token (คืน False ถ้าเกิน timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    if waited: self.waits += 1
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            waited = True
+            time.sleep(wait)
@@ -0,0 +1,139 @@
+"""Smart Rebalancing แบบเวกเตอร์ (NumPy): เติมเงินใหม่ให้ตัวที่ขาดเป้า โดยไม่ขายตัวที่เกิน
+
+1. เป้ามูลค่า = (มูลค่าพอร์ตเดิม + งบใหม่) x สัดส่วนเป้าหมาย
+2. แบ่งงบแบบ water-filling: เติมตัวที่ขาดมากสุดก่อนจนระดับ "ขาด" เท่ากัน
+   (คำตอบที่ทำให้ drift รวมน้อยสุดเมื่อซื้ออย่างเดียว และไม่ขึ้นกับลำดับใน dict)
+3. ตลาดที่ซื้อได้ทีละหุ้นเต็ม (.BK) ปัดลงเป็นจำนวนเต็มแล้วเอาเศษเงินที่เหลือ
+   ไปซื้อเพิ่มทีละหุ้นให้ตัวที่ลด drift ได้มากที่สุดเท่าที่งบยังพอ
+"""
+from datetime import datetime
+
+import numpy as np
+
+STATUS_BUY = "🟢 ซื้อเพิ่ม"
+
+
+def water_fill(shortfall, budget):
+    """กระจาย budget ให้ shortfall (>= 0) แบบ buy_i = max(shortfall_i - λ, 0) โดย sum(buy) = budget"""
+    s = np.maximum(shortfall, 0.0)
+    if budget <= 0 or s.sum() == 0:
+        return np.zeros_like(s)
+    if s.sum() <= budget:
+        return s
+    srt = np.sort(s)[::-1]
+    levels = (np.cumsum(srt) - budget) / np.arange(1, len(srt) + 1)
+    lam = levels[np.nonzero(levels < srt)[0][-1]]
+    return np.maximum(s - lam, 0.0)
+
+
+def _fill_whole_shares(shares, prices, deficit, cash, valid):
+    """ใช้เศษเงินซื้อเพิ่มทีละหุ้น เลือกตัวที่ลด drift^2 ได้มากที่สุดเท่าที่ยังขาดเป้าและงบพอ"""
+    deficit = deficit.copy()
+    while True:
+        ok = valid & (prices <= cash + 1e-9) & (deficit > 0)
+        if not ok.any():
+            return shares, cash
+        gain = np.where(ok, 2 * deficit * prices - prices ** 2, -np.inf)
+        i = int(np.argmax(gain))
+        shares[i] += 1
+        cash -= prices[i]
+        deficit[i] -= prices[i]
+
+
+def compute_buys(prices, holdings, targets, budget, whole_shares=False, min_fraction=0.1):
+    """คำนวณจำนวนหุ้นที่ต้องซื้อ (array) จากเวกเตอร์ราคา/จำนวนที่ถือ/สัดส่วนเป้า
+
+    ราคา <= 0 (ดึงราคาไม่ได้) จะไม่ถูกซื้อ, คืน (shares_to_buy, shortfall)
+    """
+    prices = np.asarray(prices, dtype=float)
+    holdings = np.asarray(holdings, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    valid = prices > 0
+
+    value = np.where(valid, holdings * prices, 0.0)
+    target_value = (value.sum() + budget) * targets
+    shortfall = np.where(valid, target_value - value, 0.0)
+
+    alloc = water_fill(shortfall, budget)
+    safe_prices = np.where(valid, prices, 1.0)
+
+    if whole_shares:
+        shares = np.floor(alloc / safe_prices + 1e-9)
+        cash = budget - (shares * prices).sum()
+        shares, _ = _fill_whole_shares(shares, prices, shortfall - shares * prices, cash, valid)
+    else:
+        # ตัดทศนิยม 4 ตำแหน่ง (ปัดลงกันงบเกิน) และข้ามรายการเล็กกว่า 10% ของราคาหุ้นเหมือนเดิม
+        shares = np.floor(alloc / safe_prices * 1e4) / 1e4
+        shares = np.where(alloc > prices * min_fraction, shares, 0.0)
+    return np.where(valid, shares, 0.0), shortfall
+
+
+def plan_rebalance(assets, prices, holdings, budget, exchange_rate, currency, whole_shares=False):
+    """สร้าง plan_data (list ของ dict แบบเดียวกับที่หน้าเว็บใช้) และยอดใช้จริงในสกุล currency
+
+    assets: {ticker: สัดส่วนเป้า}, prices/holdings: {ticker: ค่า}
+    """
+    tickers = list(assets)
+    p = np.array([prices.get(t, 0) or 0 for t in tickers], dtype=float)
+    h = np.array([holdings.get(t, 0) or 0 for t in tickers], dtype=float)
+    w = np.array([assets[t] for t in tickers], dtype=float)
+
+    shares, _ = compute_buys(p, h, w, budget, whole_shares=whole_shares)
+    cost = shares * p
+
+    plan_data = []
+    for i in np.nonzero(shares > 0)[0]:
+        qty = int(shares[i]) if whole_shares else round(float(shares[i]), 4)
+        plan_data.append({
+            "หุ้น": tickers[i],
+            "สถานะ": STATUS_BUY,
+            "ราคา": float(p[i]),
+            "จำนวน": qty,
+            f"รวม ({currency})": float(cost[i]),
+            "รวม (บาท)": float(cost[i] * exchange_rate),
+        })
+    return plan_data, float(cost.sum())
+
+
+def build_plan(user_name, portfolio, budget_thb, prices, exchange_rate, holdings):
+    """แผนลงทุนเดือนนี้ของ user หนึ่งคน (dict เดียวกับที่หน้าเว็บเก็บใน session_state)
+
+    portfolio: {'currency', 'assets'} จาก FAMILY_PORTFOLIOS, holdings: {ticker: จำนวนหุ้นที่ถืออยู่}
+    """
+    currency = portfolio['currency']
+    rate = exchange_rate if currency == "USD" else 1.0
+    # พอร์ตหุ้นไทยซื้อได้ทีละหุ้นเต็ม -> ใช้เศษเงินที่เหลือซื้อเพิ่มให้ตัวที่ยังขาดเป้ามากสุด
+    plan_data, total_spent_currency = plan_rebalance(
+        portfolio['assets'], prices, holdings, budget_thb / rate, rate, currency, whole_shares=currency != "USD")
+
+    line_summary = f"📢 *แผนลงทุน {user_name} (Smart Rebalance)*\n🗓 {datetime.now().strftime('%d/%m/%Y')}\n💰 งบ: {budget_thb:,.0f} บาท\n"
+    for item in plan_data:
+        line_summary += f"\n- {item['หุ้น']}: {item['จำนวน']} หุ้น ({item['สถานะ']}) | 💸 {item['รวม (บาท)']:,.2f} บาท"
+
+    total_spent_thb = total_spent_currency * rate
+    remaining_thb = budget_thb - total_spent_thb
+    return {
+        'plan_data': plan_data, 'currency': currency, 'exchange_rate': rate,
+        'total_spent': total_spent_thb, 'remaining': remaining_thb,
+        'line_summary': line_summary + f"\n\n💡 เงินเหลือ: {remaining_thb:,.2f} บาท",
+        'user_name': user_name,
+    }
+
+
+def ledger_rows(plan, now=None):
+    """แถวที่จะต่อท้ายชีต AP_Wealth_DB (Date, User, Ticker, Shares, Price, Total_THB, Note)"""
+    stamp = (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    return [[stamp, plan['user_name'], i['หุ้น'], float(i['จำนวน']), float(i['ราคา']), float(i['รวม (บาท)']),
+             f"V3-Rebalance ({i.get('สถานะ', '')})"] for i in plan['plan_data']]
+
+
+def telegram_message(plan, now=None):
+    """ข้อความแจ้งเตือนหลังบันทึกแผน (เฉพาะตัวที่ได้ซื้อจริง)"""
+    msg = f"📢 *อัปเดตพอร์ต {plan['user_name']}*\n"
+    msg += f"📅 {(now or datetime.now()).strftime('%d/%m/%Y')}\n"
+    msg += f"💰 ยอดซื้อ: `{plan['total_spent']:,.0f}` บาท\n\n"
+    msg += "🛒 *สรุปรายการ:*\n"
+    for item in plan['plan_data']:
+        if item['จำนวน'] > 0:
+            msg += f"• {item['หุ้น']}: {item['จำนวน']} หุ้น ({item['สถานะ']}) | 💸 {item['รวม (บาท)']:,.2f} บาท\n"
+    return msg + "\n✅ *บันทึกเข้าระบบเรียบร้อย*"
@@ -0,0 +1,147 @@
+"""Write-behind สำหรับบันทึกแผนลงชีต: เข้าคิวในเครื่องก่อน แล้ว worker ค่อยส่งทีละแผนด้วย append_rows ครั้งเดียว
+
+คิวเก็บใน SQLite ไฟล์เดียวกับ ledger replica ปิดแอปไปแล้วเปิดใหม่ก็ยังส่งต่อได้
+ส่งไม่ผ่าน (เช่นโดน quota 429) จะรอแบบ exponential backoff แล้วลองใหม่ ไม่ทิ้งแผน
+หลาย process ใช้ไฟล์เดียวกันได้ (หน้าเว็บหลายตัว + cli --save) แต่ละแผนต้อง claim ก่อนส่ง จึงไม่ถูกต่อท้ายซ้ำ
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from core.outbox import OutboxWorker
+from core.trace import span
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rows TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending / sending / sent
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_status ON outbox (status, next_attempt_at);
+"""
+# outbox ที่สร้างก่อนมีการ claim
+MIGRATIONS = {"owner": "ALTER TABLE outbox ADD COLUMN owner TEXT",
+              "lease_until": "ALTER TABLE outbox ADD COLUMN lease_until REAL NOT NULL DEFAULT 0"}
+# แผนที่ status = 'sending' แต่เลย lease แล้ว (process ที่ claim ไปตายกลางทาง) กลับมาส่งได้อีก
+READY = "(status = 'pending' OR (status = 'sending' AND lease_until < ?))"
+
+
+class SheetWriter(OutboxWorker):
+    thread_name = "sheet-writer"
+
+    def __init__(self, ledger, base_delay=2.0, max_delay=600.0, lease=120.0):
+        """lease: วินาทีที่แผนถูกจองไว้ระหว่างส่ง ถ้าเกินนี้ process อื่นหยิบไปส่งต่อได้"""
+        self.ledger = ledger
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(outbox)")}
+            for column, ddl in MIGRATIONS.items():
+                if column not in columns:
+                    db.execute(ddl)
+        if self.status()["pending"]:
+            self.start()  # มีของค้างจากรอบก่อน ส่งต่อเลย
+
+    def _connect(self):
+        return sqlite3.connect(self.ledger.path, timeout=30)
+
+    def enqueue(self, rows):
+        """ฝากแถวของแผน 1 แผนไว้ในคิว คืน id ทันที (ไม่รอเน็ต)"""
+        with self._connect() as db:
+            cur = db.execute("INSERT INTO outbox (rows, created_at) VALUES (?, ?)",
+                             (json.dumps(rows, ensure_ascii=False), time.time()))
+            job_id = cur.lastrowid
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def _next_job(self):
+        with self._connect() as db:
+            return db.execute(f"SELECT id, rows, attempts, next_attempt_at FROM outbox WHERE {READY} "
+                              "ORDER BY next_attempt_at, id LIMIT 1", (time.time(),)).fetchone()
+
+    def _claim(self, job_id):
+        """จองแผนไว้ส่งเอง (atomic) คืน False ถ้า worker/process อื่นหยิบไปก่อนแล้ว"""
+        now = time.time()
+        with self._connect() as db:
+            return db.execute(f"UPDATE outbox SET status = 'sending', owner = ?, lease_until = ? WHERE id = ? AND {READY}",
+                              (self.owner, now + self.lease, job_id, now)).rowcount == 1
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                with self._lock:  # เช็คซ้ำใต้ lock กันงานที่เพิ่งเข้าคิวตกหล่น
+                    if self._next_job() is None:
+                        self._thread = None
+                        return  # คิวว่าง ปิด worker (enqueue ครั้งหน้าจะเปิดใหม่)
+                continue
+            job_id, rows, attempts, next_at = job
+            wait = next_at - time.time()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            self.flush_one(job_id, json.loads(rows), attempts)
+
+    def flush_one(self, job_id, rows, attempts=0):
+        """ส่งแผนเดียวด้วย append_rows ครั้งเดียว สำเร็จคืน True (claim ไม่ได้เพราะคนอื่นส่งอยู่ก็คืน False)"""
+        if not self._claim(job_id):
+            return False
+        try:
+            with span("sheets.append", rows=len(rows), attempt=attempts + 1):
+                sheet = self.ledger.open_sheet()
+                response = sheet.append_rows(rows)  # RAW เหมือน append_row เดิม วันที่จะไม่ถูกแปลงเป็นเลข serial
+        except Exception as e:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempts)
+            with self._connect() as db:
+                db.execute("UPDATE outbox SET status = 'pending', owner = NULL, lease_until = 0, attempts = ?, "
+                           "next_attempt_at = ?, last_error = ? WHERE id = ? AND owner = ?",
+                           (attempts + 1, time.time() + delay, str(e)[:500], job_id, self.owner))
+            return False
+
+        with self._connect() as db:
+            db.execute("UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL WHERE id = ? AND owner = ?",
+                       (attempts + 1, job_id, self.owner))
+        try:
+            self.ledger.record_appended(response, rows)
+        except Exception:
+            pass  # replica ไม่ทัน เดี๋ยวรอบ sync ถัดไปก็ดึงมาเอง
+        return True
+
+    def pending(self, ids=None):
+        """จำนวนแผนที่ยังส่งไม่เสร็จ (ids: นับเฉพาะแผนเหล่านี้)"""
+        query, params = "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')", []
+        if ids is not None:
+            query += f" AND id IN ({','.join('?' * len(ids))})"
+            params = list(ids)
+        with self._connect() as db:
+            return db.execute(query, params).fetchone()[0]
+
+    def status(self):
+        """สถานะคิวสำหรับโชว์บนหน้าเว็บ"""
+        with self._connect() as db:
+            pending, retrying = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(attempts > 0), 0) FROM outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()
+            last = db.execute("SELECT last_error, next_attempt_at FROM outbox WHERE status = 'pending' "
+                              "AND last_error IS NOT NULL ORDER BY id DESC LIMIT 1").fetchone()
+            sent = db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'sent'").fetchone()[0]
+        return {"pending": pending, "retrying": retrying, "sent": sent,
+                "last_error": last[0] if last else None,
+                "next_retry_in": max(0.0, last[1] - time.time()) if last else None,
+                "worker_alive": self._thread is not None}
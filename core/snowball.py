@@ -0,0 +1,53 @@
+"""Snowball Effect: จำลอง DCA รายเดือน
+
+- deterministic(): สูตรปิด future value ของเงินออมรายเดือน (ไม่ต้องวนลูปทีละเดือน)
+- monte_carlo(): จำลองหลายหมื่นเส้นทางพร้อมกันเป็น array (paths x months)
+  สุ่มผลตอบแทนรายเดือนจากประวัติจริง (bootstrap) หรือจาก normal ถ้าไม่มีประวัติ
+"""
+import numpy as np
+
+PERCENTILES = (10, 50, 90)
+
+
+def real_monthly_rate(annual_return, inflation):
+    """ผลตอบแทนแท้จริงต่อเดือน (หักเงินเฟ้อ) แบบเดียวกับสูตรเดิมในหน้าเว็บ"""
+    return (((1 + annual_return) / (1 + inflation)) - 1) / 12
+
+
+def deterministic(monthly_invest, years, monthly_rate):
+    """มูลค่าพอร์ต ณ สิ้นแต่ละปี เมื่อเติมเงินต้นเดือนแล้วทบต้นรายเดือน (สูตรปิด)
+
+    W_n = c(1+r)((1+r)^n - 1)/r  ซึ่งตรงกับลูป W = (W + c)(1 + r)
+    """
+    n = np.arange(1, years + 1) * 12
+    if monthly_rate == 0:
+        return monthly_invest * n.astype(float)
+    growth = (1 + monthly_rate) ** n
+    return monthly_invest * (1 + monthly_rate) * (growth - 1) / monthly_rate
+
+
+def monte_carlo(monthly_invest, years, monthly_returns=None, mean=0.0, vol=0.0,
+                n_paths=10_000, inflation=0.0, percentiles=PERCENTILES, seed=None):
+    """คืน array (len(percentiles), years) ของมูลค่าพอร์ตสิ้นปีที่ percentile ต่างๆ
+
+    monthly_returns: ผลตอบแทนรายเดือนในอดีต (nominal) ใช้ bootstrap ถ้าให้มา
+    ไม่งั้นสุ่มจาก normal(mean, vol) ต่อเดือน, inflation (ต่อปี) ใช้ปรับเป็นมูลค่าแท้จริง
+    """
+    rng = np.random.default_rng(seed)
+    months = years * 12
+    if monthly_returns is not None and len(monthly_returns):
+        hist = np.asarray(monthly_returns, dtype=np.float64)
+        r = hist[rng.integers(0, len(hist), size=(n_paths, months))]
+    else:
+        r = rng.normal(mean, vol, size=(n_paths, months))
+
+    # log ของการเติบโตสะสม (หักเงินเฟ้อรายเดือน)
+    log_g = np.log1p(np.maximum(r, -0.99)) - np.log1p(inflation) / 12
+    np.cumsum(log_g, axis=1, out=log_g)
+
+    # W_m = c * G_m * sum_{j<m} 1/G_j  (G_0 = 1) -> เงินทุกงวดโตตามช่วงเวลาที่ถือ
+    inv = np.exp(-log_g)
+    inv_prev_sum = np.cumsum(inv, axis=1) - inv + 1.0
+    year_end = slice(11, None, 12)
+    wealth = monthly_invest * np.exp(log_g[:, year_end]) * inv_prev_sum[:, year_end]
+    return np.percentile(wealth, percentiles, axis=0)
@@ -0,0 +1,177 @@
+"""แคชงบการเงินบนดิสก์: เก็บงบดิบเป็น Parquet แยกตาม ticker / งวดล่าสุด และจำข้อความสรุปที่ render แล้ว
+
+งบเปลี่ยนก็ต่อเมื่อบริษัทรายงานงวดใหม่ เลยโหลดใหม่เฉพาะเมื่อ lastFiscalYearEnd ใน metadata
+ใหม่กว่างวดที่เก็บไว้ (ถ้าไม่รู้ ใช้อายุไฟล์ไม่เกิน max_age แทน)
+
+    .ap_data/statements/MSFT/manifest.json
+    .ap_data/statements/MSFT/2025-06-30/{balance,income,cashflow}.parquet, summary.md
+"""
+import datetime
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from core.trace import span
+from core.upstream import YAHOO, load_yfinance
+
+DAY = 24 * 3600
+FRAMES = ("balance", "income", "cashflow")
+
+
+def _download_statements(ticker):
+    stock = load_yfinance().Ticker(ticker)
+    balance = stock.balance_sheet
+    if balance is None or balance.empty:
+        return None
+    return {"balance": balance, "income": stock.income_stmt, "cashflow": stock.cashflow}
+
+
+def fetch_statements(ticker):
+    with span("yf.statements", ticker=ticker) as s:
+        frames = YAHOO.call(("statements", ticker), _download_statements, ticker)
+        if frames is None:
+            s.tag(outcome="empty")
+        return frames
+
+
+def render_summary(ticker_symbol, frames):
+    """ข้อความสรุปงบสำหรับส่งให้ AI (3 งวดล่าสุด)"""
+    balance, income, cashflow = (frames[k] for k in FRAMES)
+    return f"""
+            Data Type: Individual Stock
+            Company: {ticker_symbol}
+            
+            --- Balance Sheet ---
+            {balance.iloc[:, :3].to_markdown()}
+            
+            --- Income Statement ---
+            {income.iloc[:, :3].to_markdown()}
+            
+            --- Cash Flow ---
+            {cashflow.iloc[:, :3].to_markdown()}
+            """
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).date()
+    return pd.Timestamp(value).date()
+
+
+class StatementsCache:
+    def __init__(self, root, fetch=fetch_statements, max_age=30 * DAY):
+        self.root = root
+        self.fetch = fetch
+        self.max_age = max_age
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.counters = {"hits": 0, "downloads": 0, "no_statements": 0}
+
+    def _lock_for(self, ticker):
+        with self._guard:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _dir(self, ticker, *parts):
+        return os.path.join(self.root, ticker.replace("/", "_"), *parts)
+
+    def _manifest(self, ticker):
+        try:
+            with open(self._dir(ticker, "manifest.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_current(self, manifest, latest_period):
+        if manifest is None:
+            return False
+        if time.time() - manifest.get("fetched_at", 0) < DAY:
+            return True  # เพิ่งโหลดมา (metadata อาจรู้งวดใหม่ก่อน Yahoo จะมีงบให้)
+        if latest_period is not None and manifest.get("period_end"):
+            # metadata บอกงวดล่าสุดมา: ยังใช้ได้ถ้างวดที่เก็บไว้ไม่เก่ากว่า (เผื่อวันคลาดกันนิดหน่อย)
+            stored = _to_date(manifest["period_end"])
+            return _to_date(latest_period) <= stored + datetime.timedelta(days=7)
+        return time.time() - manifest.get("fetched_at", 0) < self.max_age
+
+    def _save(self, ticker, frames):
+        period_end = max(pd.Timestamp(c) for c in frames["balance"].columns).date().isoformat()
+        folder = self._dir(ticker, period_end)
+        os.makedirs(folder, exist_ok=True)
+        for name in FRAMES:
+            df = frames[name].copy()
+            df.columns = [pd.Timestamp(c).date().isoformat() for c in df.columns]
+            df.to_parquet(os.path.join(folder, f"{name}.parquet"))
+        return period_end
+
+    def _write_manifest(self, ticker, **fields):
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        path = self._dir(ticker, "manifest.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({**fields, "fetched_at": time.time()}, f)
+        os.replace(path + ".tmp", path)
+
+    def load_frames(self, ticker):
+        """งบดิบงวดล่าสุดที่เก็บไว้ {balance, income, cashflow} (ไม่มีคืน None)"""
+        manifest = self._manifest(ticker)
+        if not manifest or not manifest.get("period_end"):
+            return None
+        folder = self._dir(ticker, manifest["period_end"])
+        return {name: pd.read_parquet(os.path.join(folder, f"{name}.parquet")) for name in FRAMES}
+
+    def summary(self, ticker, latest_period=None):
+        """ข้อความสรุปงบของ ticker: ใช้ของเดิมถ้างวดยังไม่เปลี่ยน ไม่งั้นโหลดงบใหม่ 3 ตัวแล้ว render
+
+        คืน None ถ้าหุ้นตัวนี้ไม่มีงบ (เช่น ETF)
+        """
+        with self._lock_for(ticker):
+            manifest = self._manifest(ticker)
+            if self._is_current(manifest, latest_period):
+                self.counters["hits"] += 1
+                if not manifest.get("period_end"):
+                    return None
+                with open(self._dir(ticker, manifest["period_end"], "summary.md"), encoding="utf-8") as f:
+                    return f.read()
+
+            frames = self.fetch(ticker)
+            self.counters["downloads"] += 1
+            if frames is None:
+                self.counters["no_statements"] += 1
+                self._write_manifest(ticker, period_end=None)
+                return None
+            period_end = self._save(ticker, frames)
+            text = render_summary(ticker, frames)
+            with open(self._dir(ticker, period_end, "summary.md"), "w", encoding="utf-8") as f:
+                f.write(text)
+            self._write_manifest(ticker, period_end=period_end)
+            return text
+
+
+def financial_summary(ticker_symbol, metadata, statements):
+    """ข้อความสรุปงบ (หุ้น) หรือข้อมูลกองทุน (ETF) จาก MetadataStore + StatementsCache ไม่มีข้อมูลคืน None"""
+    info = metadata.get(ticker_symbol, wait=True)  # ครั้งแรกที่ยังไม่มีข้อมูล รอโหลดเลยจะได้ไม่ตอบว่า "ไม่มีข้อมูล"
+
+    # 1. ลองใช้งบการเงินก่อน (สำหรับหุ้นรายตัว) ถ้ารู้อยู่แล้วว่าเป็น ETF ไม่ต้องเสียเวลาดึงงบ
+    # งบเก็บบนดิสก์ตามงวด จะโหลดใหม่ก็ต่อเมื่อ metadata บอกว่ามีงวดใหม่แล้ว
+    is_fund = info.get('quoteType') in ("ETF", "MUTUALFUND")
+    stock_summary = None if is_fund else statements.summary(ticker_symbol, info.get('lastFiscalYearEnd'))
+    if stock_summary:
+        return stock_summary
+
+    # --- กรณีเป็นกองทุน (ETF) หรือไม่มีงบ: ใช้ข้อมูลสรุปจาก metadata store ---
+    if not info:
+        return None
+    etf_yield = info.get('dividendYield', 0) * 100 if info.get('dividendYield') else "N/A"
+    return f"""
+            Data Type: ETF / Fund
+            Ticker: {ticker_symbol}
+            Fund Name: {info.get('longName', ticker_symbol)}
+            Category: {info.get('category', 'N/A')}
+            Dividend Yield: {etf_yield}%
+            
+            --- Fund Summary ---
+            {info.get('longBusinessSummary', 'No summary available')}
+            """
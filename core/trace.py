@@ -0,0 +1,241 @@
+"""Tracing แบบเบา: จับเวลาทุก call ภายนอกและขั้นคำนวณเป็น span แล้วรวมเป็นสถิติต่อชื่อ
+
+    with span("yf.download", symbols=12) as s:
+        ...
+        s.tag(status=304)
+
+- ปิดอยู่ (ค่าเริ่มต้น) span() คืน object ว่างตัวเดียวกันทุกครั้ง ต้นทุนแค่เช็ค bool หนึ่งครั้ง
+  เปิดด้วย AP_TRACE=1 หรือ TRACER.enabled = True (เช่นจากแผง debug ของแอดมิน)
+- span ที่เกิดระหว่าง rerun (รวมงานที่ Prefetch ส่งไป worker) ผูกกับ run นั้นผ่าน contextvars
+  fragment ที่ rerun เดี่ยวๆ ครอบด้วย @TRACER.run("ชื่อ") จะได้ run ของตัวเอง (run ล่าสุดเก็บไว้ใน TRACER.runs)
+- สถิติสะสม: histogram แบบ Prometheus (bucket คงที่) + หน้าต่างล่าสุด window ค่าไว้หา p50/p95
+- export เป็น JSON หรือ Prometheus text format
+"""
+import contextvars
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+_current_run = contextvars.ContextVar("ap_trace_run", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def tag(self, **tags):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "tags", "start", "duration", "outcome")
+
+    def __init__(self, tracer, name, tags):
+        self.tracer = tracer
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def tag(self, **tags):
+        """ติดป้ายเพิ่ม เช่น cache="hit" หรือ outcome="empty" (outcome แทนค่า ok)"""
+        self.tags.update(tags)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        self.outcome = f"error:{exc_type.__name__}" if exc_type else self.tags.pop("outcome", "ok")
+        self.tracer._record(self)
+        return False
+
+
+class Run:
+    """span ทั้งหมดของ rerun หนึ่งรอบ"""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.last_mark = self.started
+        self.spans = []
+        self.duration = None
+        self.token = None
+
+    def breakdown(self):
+        """[{name, ms, outcome, tags, offset_ms}] เรียงตามเวลาเริ่ม"""
+        return [{"name": s.name, "ms": round(s.duration * 1000, 2), "outcome": s.outcome,
+                 "offset_ms": round((s.start - self.started) * 1000, 2), "tags": dict(s.tags)}
+                for s in sorted(self.spans, key=lambda s: s.start)]
+
+
+class _Stats:
+    __slots__ = ("buckets", "count", "total", "errors", "recent", "max")
+
+    def __init__(self, window):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+
+class Tracer:
+    def __init__(self, enabled=False, window=512, keep_runs=20):
+        self.enabled = enabled
+        self.window = window
+        self.runs = deque(maxlen=keep_runs)   # run ที่จบแล้ว ใหม่สุดอยู่ท้าย
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, **tags):
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, tags)
+
+    def traced(self, name):
+        """decorator: ครอบทั้งฟังก์ชันเป็น span ชื่อ name"""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, name, {}):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def run(self, label):
+        """decorator: ครอบฟังก์ชัน (เช่น st.fragment) ให้ได้ run ของตัวเองเมื่อถูกเรียกนอก run อื่น
+
+        ตอน full rerun ที่มี run ของทั้งหน้าอยู่แล้ว span ในฟังก์ชันนี้เข้า run ของหน้านั้นตามปกติ
+        """
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                if not self.enabled or _current_run.get() is not None:
+                    return fn(*args, **kwargs)
+                run = self.begin_run(label)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.end_run(run)
+            return inner
+        return wrap
+
+    # ---------- ต่อ rerun ----------
+    def begin_run(self, label=""):
+        """เริ่มเก็บ span ของ rerun นี้ (ปิด tracing อยู่คืน None)"""
+        if not self.enabled:
+            return None
+        run = Run(label)
+        run.token = _current_run.set(run)
+        return run
+
+    def checkpoint(self, name, **tags):
+        """บันทึกช่วงเวลาตั้งแต่ checkpoint ก่อนหน้าของ run นี้เป็น span ชื่อ name (ไว้แบ่งขั้นของสคริปต์ยาวๆ)"""
+        run = _current_run.get() if self.enabled else None
+        if run is None:
+            return
+        now = time.perf_counter()
+        s = Span(self, name, tags)
+        s.start, s.duration, s.outcome = run.last_mark, now - run.last_mark, "ok"
+        run.last_mark = now
+        self._record(s)
+
+    def end_run(self, run):
+        if run is None:
+            return None
+        run.duration = time.perf_counter() - run.started
+        try:
+            _current_run.reset(run.token)
+        except ValueError:
+            _current_run.set(None)  # คนละ context กับตอนเริ่ม
+        with self._lock:
+            self.runs.append(run)
+        return run
+
+    # ---------- สถิติ ----------
+    def _record(self, span):
+        run = _current_run.get()
+        if run is not None:
+            run.spans.append(span)
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _Stats(self.window)
+            d = span.duration
+            for i, upper in enumerate(BUCKETS):
+                if d <= upper:
+                    stats.buckets[i] += 1
+                    break
+            stats.count += 1
+            stats.total += d
+            stats.max = max(stats.max, d)
+            stats.recent.append(d)
+            if span.outcome.startswith("error"):
+                stats.errors += 1
+
+    def summary(self):
+        """[{name, count, errors, mean_ms, p50_ms, p95_ms, max_ms}] เรียงตามเวลารวมมากสุด"""
+        with self._lock:
+            items = [(name, s.count, s.errors, s.total, s.max, sorted(s.recent)) for name, s in self._stats.items()]
+        out = []
+        for name, count, errors, total, peak, recent in sorted(items, key=lambda x: -x[3]):
+            pick = lambda q: recent[min(len(recent) - 1, int(q * len(recent)))] * 1000 if recent else 0.0
+            out.append({"name": name, "count": count, "errors": errors, "total_ms": round(total * 1000, 1),
+                        "mean_ms": round(total / count * 1000, 2), "p50_ms": round(pick(0.5), 2),
+                        "p95_ms": round(pick(0.95), 2), "max_ms": round(peak * 1000, 2)})
+        return out
+
+    def to_json(self, run=None):
+        data = {"enabled": self.enabled, "spans": self.summary()}
+        if run is not None:
+            data["run"] = {"label": run.label, "started_at": run.started_at,
+                           "ms": round((run.duration or 0) * 1000, 1), "spans": run.breakdown()}
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix="ap"):
+        """histogram ของทุก span ในรูป Prometheus text exposition format"""
+        lines = [f"# HELP {prefix}_span_duration_seconds Duration of traced spans",
+                 f"# TYPE {prefix}_span_duration_seconds histogram"]
+        errors = [f"# HELP {prefix}_span_errors_total Spans that ended with an exception",
+                  f"# TYPE {prefix}_span_errors_total counter"]
+        with self._lock:
+            for name, s in sorted(self._stats.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                cumulative = 0
+                for upper, n in zip(BUCKETS, s.buckets):
+                    cumulative += n
+                    le = "+Inf" if math.isinf(upper) else repr(upper)
+                    lines.append(f'{prefix}_span_duration_seconds_bucket{{span="{label}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_span_duration_seconds_sum{{span="{label}"}} {s.total:.6f}')
+                lines.append(f'{prefix}_span_duration_seconds_count{{span="{label}"}} {s.count}')
+                errors.append(f'{prefix}_span_errors_total{{span="{label}"}} {s.errors}')
+        return "\n".join(lines + errors) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.runs.clear()
+
+
+TRACER = Tracer(enabled=os.environ.get("AP_TRACE", "0") == "1")
+span = TRACER.span
+traced = TRACER.traced
+checkpoint = TRACER.checkpoint
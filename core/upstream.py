@@ -0,0 +1,145 @@
+"""Scheduler กลางของการเรียกบริการข้อมูลตลาด (Yahoo) ใช้ร่วมกันทุก session ใน process
+
+- singleflight: key เดียวกันที่กำลังวิ่งอยู่ (เช่น .info ของ SCHD ที่สองคนเปิดพร้อมกัน) รอผลของตัวแรกแทนการยิงซ้ำ
+- token bucket ต่อ upstream: จำกัดจำนวนครั้งต่อวินาที (AP_YAHOO_RPS / AP_RSS_RPS)
+- backoff: โดน 429 หรือเน็ต/เซิร์ฟเวอร์พัง จะพักทั้ง upstream นานขึ้นเป็นเท่าตัว สำเร็จครั้งเดียวก็กลับปกติ
+  ระหว่างพักหรือรอ token เกิน max_wait วินาที จะ raise Throttled ทันที (ผู้เรียกใช้ค่าในแคชไปก่อน)
+- stats(): คิวที่รออยู่, กำลังวิ่ง, จำนวนครั้งที่ถูก throttle / ปัดตก / รวมคำขอ
+"""
+import threading
+import time
+
+from core.ratelimit import TokenBucket, rate_from_env
+
+
+def load_yfinance():
+    """import yfinance ตอนจะยิง Yahoo จริงครั้งแรก (import core เพื่อคำนวณพอร์ตเฉยๆ ไม่ต้องพ่วงมา)"""
+    import yfinance
+    return yfinance
+
+
+class Throttled(Exception):
+    """upstream อยู่ในช่วง backoff หรือรอ token นานเกินไป (ลองใหม่ภายหลัง)"""
+
+
+def _status_code(exc):
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def is_rate_limited(exc):
+    """429 จาก requests หรือ YFRateLimitError ของ yfinance"""
+    return _status_code(exc) == 429 or "RateLimit" in type(exc).__name__ or "Too Many Requests" in str(exc)
+
+
+def is_transient(exc):
+    """เน็ต/timeout/5xx ควร backoff ส่วน 4xx หรือข้อมูลไม่มี (KeyError ฯลฯ) เป็นปัญหาของ key นั้นเอง"""
+    status = _status_code(exc)
+    if status is not None:
+        return status >= 500
+    return isinstance(exc, (OSError, TimeoutError))  # requests.RequestException เป็น OSError
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Upstream:
+    def __init__(self, name, rate, capacity=None, base_delay=2.0, max_delay=300.0, max_wait=5.0):
+        """rate: ครั้งต่อวินาที, max_wait: รอ backoff/token ได้นานสุดกี่วินาทีก่อน raise Throttled"""
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._queued = 0
+        self._failures = 0
+        self._cooldown_until = 0.0
+        self.counters = {"calls": 0, "coalesced": 0, "throttled": 0, "errors": 0, "rejected": 0}
+
+    def call(self, key, fn, *args, **kwargs):
+        """fn(*args, **kwargs) ผ่าน scheduler ถ้า key เดียวกันกำลังวิ่งอยู่จะรอผลของตัวนั้นแทน
+
+        ผลลัพธ์ถูกแชร์ให้ทุกคนที่รอ key เดียวกัน ผู้เรียกห้ามแก้ object ที่ได้กลับไป
+        """
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = self._run(fn, args, kwargs)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def _reject(self, reason):
+        with self._lock:
+            self.counters["rejected"] += 1
+        raise Throttled(f"{self.name}: {reason}")
+
+    def _run(self, fn, args, kwargs):
+        deadline = time.monotonic() + self.max_wait
+        with self._lock:
+            self._queued += 1
+        try:
+            pause = self._cooldown_until - time.monotonic()
+            if pause > 0:
+                if time.monotonic() + pause > deadline:
+                    self._reject(f"backing off for {pause:.1f}s")
+                time.sleep(pause)
+            if not self.bucket.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                self._reject("rate limit queue is full")
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+        with self._lock:
+            self.counters["calls"] += 1
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            throttled = is_rate_limited(e)
+            with self._lock:
+                self.counters["throttled" if throttled else "errors"] += 1
+                if throttled or is_transient(e):
+                    self._failures += 1
+                    delay = min(self.max_delay, self.base_delay * 2 ** (self._failures - 1))
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+            raise
+        with self._lock:
+            self._failures = 0
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"name": self.name, "queued": self._queued, "inflight": len(self._inflight),
+                    "backoff_s": round(max(0.0, self._cooldown_until - time.monotonic()), 1),
+                    "rate_waits": self.bucket.waits, **self.counters}
+
+
+YAHOO = Upstream("yahoo", rate=rate_from_env("AP_YAHOO_RPS", 5), capacity=10)
+YAHOO_RSS = Upstream("yahoo-rss", rate=rate_from_env("AP_RSS_RPS", 5), capacity=10)
+UPSTREAMS = {u.name: u for u in (YAHOO, YAHOO_RSS)}
+
+
+def stats():
+    return [u.stats() for u in UPSTREAMS.values()]
@@ -0,0 +1,107 @@
+"""ตีมูลค่าพอร์ตหลายสกุลเงินเป็นบาทแบบทั้งคอลัมน์ (ไม่มี apply ทีละแถว)
+
+สกุลเงินของแต่ละหุ้นหาครั้งเดียวแล้วจำไว้: ดูจาก suffix ของตลาดก่อน (ไม่ต้องยิงเน็ต)
+ถ้าไม่รู้ค่อยดู currency ใน metadata store ไม่เจอเลยถือว่าเป็น USD เหมือนเดิม
+(ค่าที่เดาว่า USD ไม่จำไว้ เผื่อ metadata โหลดเสร็จทีหลัง)
+"""
+import threading
+
+import numpy as np
+
+from core.quotes import FX_THB
+from core.trace import traced
+
+BASE_CURRENCY = "THB"
+SUFFIX_CURRENCY = {
+    ".BK": "THB", ".T": "JPY", ".HK": "HKD", ".L": "GBp", ".TO": "CAD", ".AX": "AUD",
+    ".SI": "SGD", ".DE": "EUR", ".PA": "EUR", ".AS": "EUR", ".SS": "CNY", ".SZ": "CNY",
+    ".KS": "KRW", ".TW": "TWD",
+}
+# หน่วยย่อยที่ Yahoo รายงานราคา (เช่นหุ้นลอนดอนเป็นเพนนี) -> (สกุลหลัก, ตัวหาร)
+MINOR_UNITS = {"GBp": ("GBP", 100.0), "GBX": ("GBP", 100.0), "ZAc": ("ZAR", 100.0), "ILA": ("ILS", 100.0)}
+# เรทสำรองเมื่อดึงไม่ได้ (เดิมใช้ 34.50 สำหรับ USD)
+FALLBACK_FX = {"USD": 34.50}
+
+_currency_cache = {}
+_lock = threading.Lock()
+
+
+def _from_suffix(ticker):
+    for suffix, cur in SUFFIX_CURRENCY.items():
+        if ticker.upper().endswith(suffix.upper()):
+            return cur
+    return None
+
+
+def resolve_currencies(tickers, metadata=None):
+    """{ticker: สกุลเงินที่ Yahoo รายงานราคา} (จำไว้ทั้ง process ไม่ต้องหาซ้ำ)
+
+    metadata: {ticker: {field: value}} จาก MetadataStore
+    """
+    out = {}
+    for t in tickers:
+        with _lock:
+            cur = _currency_cache.get(t)
+        if cur is None:
+            cur = _from_suffix(t) or (metadata or {}).get(t, {}).get("currency")
+            if cur:
+                with _lock:
+                    _currency_cache[t] = cur
+        out[t] = cur or "USD"
+    return out
+
+
+def fx_symbol(currency):
+    """สัญลักษณ์ Yahoo ของคู่เงิน -> บาท (USD ใช้ THB=X ตัวเดิม), บาทคืน None"""
+    major = MINOR_UNITS.get(currency, (currency, 1.0))[0]
+    if major == BASE_CURRENCY:
+        return None
+    return FX_THB if major == "USD" else f"{major}{BASE_CURRENCY}=X"
+
+
+def fx_pairs_for(currencies):
+    """คู่เงินที่ต้องดึง (ไม่ซ้ำ) สำหรับชุดสกุลเงินนี้"""
+    return tuple(dict.fromkeys(s for s in map(fx_symbol, currencies) if s))
+
+
+def thb_multipliers(currencies, quotes):
+    """{สกุลเงิน: ตัวคูณเป็นบาท} จากราคาคู่เงินใน quotes (ไม่มีราคา -> FALLBACK_FX หรือ NaN)"""
+    out = {}
+    for cur in set(currencies):
+        major, divisor = MINOR_UNITS.get(cur, (cur, 1.0))
+        symbol = fx_symbol(cur)
+        rate = 1.0 if symbol is None else (quotes.get(symbol) or FALLBACK_FX.get(major, np.nan))
+        out[cur] = rate / divisor
+    return out
+
+
+def dividend_per_share(info, price):
+    """เงินปันผลต่อหุ้นต่อปี (สกุลเงินเดียวกับราคา) จาก metadata
+
+    ใช้ dividendRate ก่อน ไม่มีค่อยเอา % yield คูณราคา (กันกรณี API ส่ง 3.5 แทน 0.035)
+    """
+    div_rate = info.get('dividendRate') or info.get('trailingAnnualDividendRate')
+    if div_rate is None:
+        dy = info.get('dividendYield') or info.get('yield') or info.get('trailingAnnualDividendYield') or 0.0
+        if dy > 1: dy = dy / 100
+        div_rate = price * dy
+    return float(div_rate or 0.0)
+
+
+@traced("valuation.value_holdings")
+def value_holdings(summary, prices, currencies, multipliers, div_per_share):
+    """เติมคอลัมน์มูลค่าตลาด/ปันผล/YoC/P&L เป็นบาทให้ summary (Ticker, Shares, Total_THB) แบบเวกเตอร์"""
+    df = summary.copy()
+    tickers = df['Ticker']
+    fx = tickers.map(currencies).map(multipliers).astype(float)
+    df['Currency'] = tickers.map(currencies)
+    df['Current_Price'] = tickers.map(prices).fillna(0.0).astype(float)
+    df['Div_Per_Share_THB'] = tickers.map(div_per_share).fillna(0.0).astype(float) * fx
+    df['Market_Value_THB'] = df['Shares'] * df['Current_Price'] * fx
+    df['Expected_Div_THB'] = df['Shares'] * df['Div_Per_Share_THB']
+
+    cost = df['Total_THB'].where(df['Total_THB'] != 0)
+    df['YoC_%'] = df['Expected_Div_THB'] / cost * 100
+    df['P/L_Amount'] = df['Market_Value_THB'] - df['Total_THB']
+    df['P/L_Percent'] = df['P/L_Amount'] / cost * 100
+    return df
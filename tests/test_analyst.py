@@ -0,0 +1,104 @@
+"""GeminiAnalyst กับ model ปลอม (bench.fake_gemini): แคชตาม hash, TTL, force และลำดับ chunk ตอน stream"""
+import os
+import time
+
+import pytest
+
+from bench.fake_gemini import FakeModel
+from core.analyst import GeminiAnalyst
+
+DATA = "Revenue 100 / Net Income 10"
+
+
+@pytest.fixture
+def model():
+    return FakeModel(first_token=0, per_chunk=0, chunks=5)
+
+
+@pytest.fixture
+def make_analyst(model, tmp_path):
+    def make(**kwargs):
+        return GeminiAnalyst(lambda name: model, str(tmp_path / "responses"), **kwargs)
+    return make
+
+
+def test_same_model_prompt_and_data_hits_cache(model, make_analyst):
+    analyst = make_analyst()
+    first = analyst.analyze("MSFT", DATA)
+    assert analyst.analyze("MSFT", DATA) == first
+    assert model.calls == 1
+    assert analyst.counters["cache_hits"] == 1
+
+
+@pytest.mark.parametrize("change", [
+    {"ticker": "AAPL"},
+    {"data": DATA + " (restated)"},
+    {"model_name": "gemini-other"},
+    {"template": "วิเคราะห์ {ticker}: {financial_data}"},
+])
+def test_any_part_of_the_key_changing_misses(model, make_analyst, change):
+    make_analyst().analyze("MSFT", DATA)
+    analyst = make_analyst(**{k: v for k, v in change.items() if k in ("model_name", "template")})
+    analyst.analyze(change.get("ticker", "MSFT"), change.get("data", DATA))
+    assert model.calls == 2
+    assert analyst.counters["cache_hits"] == 0
+
+
+def test_cache_shared_across_instances_on_disk(model, make_analyst):
+    make_analyst().analyze("MSFT", DATA)
+    again = make_analyst()
+    again.analyze("MSFT", DATA)
+    assert model.calls == 1
+    assert again.counters["cache_hits"] == 1
+
+
+def test_expired_answer_is_regenerated(model, make_analyst, monkeypatch):
+    analyst = make_analyst(ttl=60)
+    analyst.analyze("MSFT", DATA)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert analyst.cached("MSFT", DATA) is None
+    analyst.analyze("MSFT", DATA)
+    assert model.calls == 2
+
+
+def test_force_bypasses_and_overwrites_cache(model, make_analyst):
+    analyst = make_analyst()
+    analyst.analyze("MSFT", DATA)
+    model.chunks = 2  # คำตอบรอบใหม่ต่างจากเดิม
+    fresh = analyst.analyze("MSFT", DATA, force=True)
+    assert model.calls == 2
+    assert analyst.cached("MSFT", DATA) == fresh
+
+
+def test_stream_yields_chunks_in_order_then_caches(model, make_analyst):
+    analyst = make_analyst()
+    pieces = list(analyst.stream("MSFT", DATA))
+    assert pieces == model._pieces(analyst.prompt("MSFT", DATA))
+    assert analyst.counters["streams"] == 1
+    # ครั้งต่อไปได้ก้อนเดียวจากแคช ไม่เรียก model
+    assert list(analyst.stream("MSFT", DATA)) == ["".join(pieces)]
+    assert analyst.analyze("MSFT", DATA) == "".join(pieces)
+    assert model.calls == 1
+
+
+def test_prune_removes_only_expired_files(make_analyst):
+    analyst = make_analyst(ttl=60)
+    analyst.analyze("OLD", DATA)
+    analyst.analyze("NEW", DATA)
+    old = analyst._path(analyst.cache_key("OLD", DATA))
+    past = time.time() - 120
+    os.utime(old, (past, past))
+    assert analyst.prune() == 1
+    assert not os.path.exists(old)
+    assert analyst.cached("NEW", DATA) is not None
+
+
+def test_expired_files_are_pruned_on_startup(make_analyst):
+    analyst = make_analyst(ttl=60)
+    analyst.analyze("OLD", DATA)
+    path = analyst._path(analyst.cache_key("OLD", DATA))
+    past = time.time() - 120
+    os.utime(path, (past, past))
+    make_analyst(ttl=60)
+    assert not os.path.exists(path)
@@ -0,0 +1,67 @@
+"""core.performance.compute: จำนวนหุ้นใน ledger (ณ วันซื้อ) ต้องแปลงตามการแตกหุ้นที่เกิดทีหลัง"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.performance import TOTAL, compute, split_factors
+
+DATES = pd.bdate_range("2024-01-01", periods=20)
+SPLIT_DAY = DATES[10]
+
+
+def _ledger(*rows):
+    return pd.DataFrame(rows, columns=["User", "Ticker", "Date", "Shares", "Total_THB"])
+
+
+@pytest.fixture
+def flat_prices():
+    # Yahoo ปรับราคาย้อนหลังตามการแตกหุ้น 10:1 แล้ว ราคาเลยเรียบที่ 10 ตลอดช่วง
+    return pd.DataFrame({"SPLT": 10.0, "FLAT": 10.0}, index=DATES)
+
+
+@pytest.fixture
+def splits():
+    table = pd.DataFrame({"SPLT": 0.0, "FLAT": 0.0}, index=DATES)
+    table.loc[SPLIT_DAY, "SPLT"] = 10.0
+    return table
+
+
+def test_split_factors_apply_only_to_days_before_the_split(splits):
+    factor = split_factors(splits, DATES)
+    assert factor[: DATES.get_loc(SPLIT_DAY), 0] == pytest.approx(10.0)
+    assert factor[DATES.get_loc(SPLIT_DAY):, 0] == pytest.approx(1.0)
+    assert np.all(factor[:, 1] == 1.0)
+
+
+def test_buy_before_split_keeps_its_value(flat_prices, splits):
+    # ซื้อ 40 หุ้นที่ราคาก่อนแตก 100 บาท = 4,000 บาท แล้วแตกหุ้น 10:1 -> ถือ 400 หุ้น x 10 บาท
+    ledger = _ledger(("u", "SPLT", "2024-01-02", 40, 4000))
+    row = compute(ledger, flat_prices, splits=splits)["summary"].loc[("u", TOTAL)]
+    assert row["Value_THB"] == pytest.approx(4000)
+    assert row["Invested_THB"] == pytest.approx(4000)
+    assert row["P/L_THB"] == pytest.approx(0, abs=1e-6)
+    assert row["TWR_%"] == pytest.approx(0, abs=1e-6)
+    assert row["XIRR_%"] == pytest.approx(0, abs=1e-3)
+
+
+def test_buy_after_split_is_not_adjusted(flat_prices, splits):
+    ledger = _ledger(("u", "SPLT", "2024-01-02", 40, 4000),
+                     ("u", "SPLT", str(DATES[15].date()), 100, 1000))
+    result = compute(ledger, flat_prices, splits=splits)
+    assert result["summary"].loc[("u", "SPLT"), "Value_THB"] == pytest.approx(5000)
+    assert result["value"][("u", TOTAL)].iloc[-1] == pytest.approx(5000)
+
+
+def test_dividends_use_post_split_share_count(flat_prices, splits):
+    dividends = pd.DataFrame({"SPLT": 0.0, "FLAT": 0.0}, index=DATES)
+    dividends.loc[DATES[5], "SPLT"] = 0.1    # ต่อหุ้นหลังแตกแล้ว (Yahoo ปรับย้อนหลัง)
+    ledger = _ledger(("u", "SPLT", "2024-01-01", 40, 4000))
+    row = compute(ledger, flat_prices, dividends, splits)["summary"].loc[("u", TOTAL)]
+    assert row["Dividends_THB"] == pytest.approx(40)   # 400 หุ้น x 0.1
+    assert row["Value_THB"] == pytest.approx(4040)
+
+
+def test_without_splits_shares_are_taken_as_is(flat_prices):
+    ledger = _ledger(("u", "FLAT", "2024-01-02", 100, 1000))
+    row = compute(ledger, flat_prices)["summary"].loc[("u", TOTAL)]
+    assert row["Value_THB"] == pytest.approx(1000)